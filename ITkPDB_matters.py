@@ -1,30 +1,170 @@
 import itkdb
+import requests
+import time
 import pprint
 import numpy as np
 import getpass as gp
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from common_functions import *
+from db_cache import DBCache, CachedClient
+import profiler
+
+#The most database requests sent at once
+DB_THREADS = 8
+#The most test runs asked for in a single getTestRunBulk request
+TEST_RUN_BATCH_SIZE = 20
+#How many times a failed request is tried again, and how long to wait before the
+#first retry, in seconds (doubled for every retry after that)
+DB_RETRIES = 4
+DB_BACKOFF = 1
+#Failures which are worth trying again (dropped connections, timeouts, and server
+#errors), rather than mistakes in the request
+RETRY_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout, itkdb.exceptions.ServerError)
+#Tests uploaded to the module itself, rather than to a hybrid
+MODULE_TEST_CODES = {'MODULE_IV_AMAC_TC': 'IV', 'HVSTABILITY': 'HVS', 'MODULE_TC': 'TC'}
+#What each kind of file is called when exported, after the component serial number,
+#so fetch_files() sorts it the same way
+EXPORT_NAMES = {'IV': 'MODULE_IV_AMAC_TC', 'PT': 'PEDESTAL_TRIM_TC', 'SD': 'STROBE_DELAY_TC', '3PG': '3PG_TC', '10PG': 'RESPONSE_CURVE_TC', 'NO': 'NO_TC', 'OCS': 'OPEN_CHANNEL_SEARCH_TC', 'HVS': 'HVSTABILITY', 'TC': 'ColdJigRun'}
+
+#Every value the database mode may need, as {key: (environment variable, prompt,
+#secret)}. Each is taken from the command line, a job file, or the environment, in
+#that order, and only asked for if none of them have it.
+DB_OPTIONS = {"access_code1"       : ("ITKDB_ACCESS_CODE1", "Access Code 1:", True),
+              "access_code2"       : ("ITKDB_ACCESS_CODE2", "Access Code 2:", True),
+              "module_sn"          : ("TC_PLOTS_MODULE_SN", "Module Serial Number (ie. 20USEM40000080):", False),
+              "institute"          : ("TC_PLOTS_INSTITUTE", "Institute code tests were run at (ie. UBC):", False),
+              "itsdaq_run_number"  : ("TC_PLOTS_ITSDAQ_RUN_NUMBER", "ITSDAQ runNumber(s):", False),
+              "coldjig_run_number" : ("TC_PLOTS_COLDJIG_RUN_NUMBER", "ColdJig runNumber:", False)}
+
+def load_db_options(cli_options=None, job_file=None, prompt=True, refresh=False, batch_size=TEST_RUN_BATCH_SIZE):
+    '''
+    Gather every database mode value that was given ahead of time, so the database
+    can be queried without anyone at the keyboard.
+
+    Arguments:
+    cli_options - Type = dict. Values from the command line, by DB_OPTIONS key (None
+                  if not given).
+    job_file    - Type = string. Path to a JSON job file, with any of the DB_OPTIONS
+                  keys (ie. {"module_sn": "20USEM40000080", "institute": "UBC"}).
+    prompt      - Type = boolean. Whether or not to ask for anything missing. If False,
+                  a missing value is an error instead.
+    refresh     - Type = boolean. Whether or not to fetch everything from the database
+                  again, instead of using the local cache.
+    batch_size  - Type = int. The most test runs to ask for in a single request (at
+                  least 1).
+
+    Returns:
+    options - Type = dict. Every DB_OPTIONS key (None if not given), "prompt",
+              "refresh", and "batch_size".
+    '''
+
+    check_batch_size(batch_size)
+
+    job = {} #initialize
+    if job_file is not None:
+        with open(job_file, 'r') as f:
+            job = json.load(f)
+
+        unknown = [key for key in job if key not in DB_OPTIONS]
+        if unknown != []:
+            print(f"{YELLOW}Ignoring unknown job file entries {unknown}.{RESET}")
 
-def establish_db_client():
+    cli_options = cli_options or {}
+    options     = {"prompt": prompt, "refresh": refresh, "batch_size": batch_size}
+
+    for key in DB_OPTIONS:
+        env_var = DB_OPTIONS[key][0]
+
+        if cli_options.get(key) is not None:
+            options[key] = str(cli_options[key])
+        elif job.get(key) is not None:
+            options[key] = str(job[key])
+        else:
+            options[key] = os.environ.get(env_var) or None
+
+    return options
+
+def get_db_value(options, key):
     '''
-    Establishes client to permit access to the ATLAS ITk Production Database.
+    Get a single database mode value, asking for it only if it wasn't given ahead of
+    time (and asking is allowed).
+
+    Arguments:
+    options - Type = dict. From load_db_options(). None to always ask.
+    key     - Type = string. A DB_OPTIONS key.
+
+    Returns:
+    value - Type = string. The value.
+    '''
+
+    options = options or {"prompt": True}
+    env_var, prompt, secret = DB_OPTIONS[key]
+
+    if options.get(key) is not None:
+        value = options[key]
+
+    elif options["prompt"]:
+        if secret:
+            value = gp.getpass(prompt)
+        else:
+            value = input(prompt)
+        options[key] = value #only ask once
+
+    else:
+        raise ValueError(f"No {prompt[:-1]} given! Pass it on the command line, in a job file, or as the environment variable {env_var}.")
+
+    return value
+
+def establish_db_client(options=None, cache=True):
+    '''
+    Establishes client to permit access to the ATLAS ITk Production Database. Responses
+    are kept in a local cache (see db_cache.py), so re-plotting a module doesn't fetch
+    everything again. If $TC_PLOTS_FAKE_DB is set to a fixture file, the stand-in
+    database in fake_db.py is used instead (with $TC_PLOTS_FAKE_DB_LATENCY and
+    $TC_PLOTS_FAKE_DB_ERROR_RATE, if set), for benchmarking and testing offline.
+
+    Arguments:
+    options - Type = dict. From load_db_options(). Access codes not given there are
+              asked for.
+    cache   - Type = boolean. Whether or not to use the local cache.
 
     Returns:
     client - type = class. Allows DB access.
     '''
-    print(f"{BLUE}\nPlease provide your ATLAS ITk Production Database Access Codes.{RESET}")
-    access_code1 = gp.getpass("Access Code 1:")
-    access_code2 = gp.getpass("Access Code 2:")
+    fixture_file = os.environ.get("TC_PLOTS_FAKE_DB")
+
+    if fixture_file:
+        import fake_db
+        client = fake_db.FakeClient(fixture_file, latency=float(os.environ.get("TC_PLOTS_FAKE_DB_LATENCY", 0)), error_rate=float(os.environ.get("TC_PLOTS_FAKE_DB_ERROR_RATE", 0)))
+        print(f"{YELLOW}\nUsing the stand-in database in {fixture_file}.{RESET}")
+
+    else:
+        if options is None or options.get("access_code1") is None or options.get("access_code2") is None:
+            print(f"{BLUE}\nPlease provide your ATLAS ITk Production Database Access Codes.{RESET}")
+        access_code1 = get_db_value(options, "access_code1")
+        access_code2 = get_db_value(options, "access_code2")
 
-    user = itkdb.core.User(access_code1, access_code2)
-    client = itkdb.Client(user=user)
+        user = itkdb.core.User(access_code1, access_code2)
+        client = itkdb.Client(user=user)
+
+    if cache:
+        client = CachedClient(client, DBCache(refresh=bool(options and options.get("refresh"))))
 
     return client
 
-def get_files():
+def get_files(options=None, client=None):
     '''
     Creates "files" -- data dictionaries in a similar format to the merged data files,
     for use in the pre-existing plotting software.
 
+    Arguments:
+    options - Type = dict. From load_db_options(). Anything not given there is asked
+              for.
+    client - type = class. The client to query the database with. If None, one is
+             made with establish_db_client().
+
     Returns:
     IV_file, HVS_file, TC_file - type = dict. A dictionary containing all the
                                  requisite information from the database, formatted.
@@ -32,17 +172,178 @@ def get_files():
     PT_file, SD_file, TPG_file, RC_file, NO_file OCS_file - type = list of dict.
                                  A list of data dictionaries, one per hybrid.
     '''
-    client = establish_db_client() #get DB access
-    module_sn = input("Module Serial Number (ie. 20USEM40000080):")
+    options = options or {"prompt": True}
+    client = client or establish_db_client(options) #get DB access
+    module_sn = get_db_value(options, "module_sn")
 
     module = get_db_module(client, module_sn) #get module object from DB
     hybrids = get_db_hybrids(client, module) #get hybrid objects from DB
-    test_IDs = get_test_IDs(client, module, hybrids)
-    test_runs = client.get("getTestRunBulk", json={"testRun": test_IDs})
+    test_IDs = get_test_IDs(client, module, hybrids, options)
+    test_runs = get_test_runs(client, test_IDs, options.get("batch_size", TEST_RUN_BATCH_SIZE)) #fetched and formatted
     IV_file, PT_file, SD_file, TPG_file, RC_file, NO_file, OCS_file, HVS_file, TC_file = make_data_dicts(test_runs) #assemble the data into dictionaries
 
     return IV_file, PT_file, SD_file, TPG_file, RC_file, NO_file, OCS_file, HVS_file, TC_file
 
+def get_files_by_type(options=None, client=None):
+    '''
+    As for get_files(), but with the files sorted by type in a dictionary.
+
+    Arguments:
+    As for get_files().
+
+    Returns:
+    files - type = dict. {"IV": IV_file, "PT": PT_files, "SD": SD_files, "3PG":
+            TPG_files, "10PG": RC_files, "NO": NO_files, "OCS": OCS_files, "HVS":
+            HVS_file, "TC": TC_file}.
+    '''
+
+    IV_file, PT_files, SD_files, TPG_files, RC_files, NO_files, OCS_files, HVS_file, TC_file = get_files(options, client)
+    files = {'IV': IV_file, 'PT': PT_files, 'SD': SD_files, '3PG': TPG_files, '10PG': RC_files, 'NO': NO_files, 'OCS': OCS_files, 'HVS': HVS_file, 'TC': TC_file}
+
+    return files
+
+def check_batch_size(batch_size):
+    '''
+    Make sure a batch size is a whole number, at least 1. (Anything less would ask
+    for no test runs at all.)
+
+    Arguments:
+    batch_size - type = int. The most test runs to ask for in a single request.
+    '''
+
+    if type(batch_size) is not int or batch_size < 1:
+        raise ValueError(f"The batch size must be a whole number, at least 1, not {batch_size!r}.")
+
+def get_test_runs(client, test_IDs, batch_size=TEST_RUN_BATCH_SIZE):
+    '''
+    Retrieves test runs from the database, in batches. Batches are requested
+    concurrently (at most DB_THREADS at once), and each is formatted (see
+    format_data()) as soon as it arrives, so formatting overlaps with waiting on the
+    rest. A batch which fails for a passing reason (see RETRY_ERRORS) is tried again,
+    so one dropped connection doesn't lose everything.
+
+    Arguments:
+    client - type = class. Enables database access.
+    test_IDs - type = list of string. The test IDs of the runs to retrieve.
+    batch_size - type = int. The most test runs to ask for in a single request (at
+                 least 1).
+
+    Returns:
+    test_runs - type = list of dict. The formatted test runs, in the order of test_IDs.
+    '''
+
+    check_batch_size(batch_size)
+
+    batches = [test_IDs[n:n + batch_size] for n in range(0, len(test_IDs), batch_size)]
+    results = [None] * len(batches) #initialize, one list of test runs per batch
+
+    if batches == []:
+        return []
+
+    with ThreadPoolExecutor(max_workers=min(DB_THREADS, len(batches))) as pool:
+        futures = {pool.submit(get_test_run_batch, client, batch): n for n, batch in enumerate(batches)}
+
+        for future in as_completed(futures):
+            test_runs = future.result()
+
+            for run in test_runs:
+                format_run(run, MODULE_TEST_CODES.get(run['testType']['code'], 'hybrid'))
+
+            results[futures[future]] = test_runs
+
+    test_runs = make_one_list(results)
+
+    return test_runs
+
+def get_test_run_batch(client, test_IDs):
+    '''
+    Retrieves a single batch of test runs from the database.
+
+    Arguments:
+    client - type = class. Enables database access.
+    test_IDs - type = list of string. The test IDs in the batch.
+
+    Returns:
+    test_runs - type = list of dict. The (unformatted) test runs.
+    '''
+
+    test_runs = list(get_with_retries(client, "getTestRunBulk", {"testRun": test_IDs}))
+
+    return test_runs
+
+def get_with_retries(client, endpoint, payload):
+    '''
+    Send a single request to the database, waiting and trying again (up to DB_RETRIES
+    times, backing off exponentially) if it fails for a passing reason (see
+    RETRY_ERRORS).
+
+    Arguments:
+    client - type = class. Enables database access.
+    endpoint - type = string. The database command (ie. getComponent).
+    payload - type = dict. The request's JSON.
+
+    Returns:
+    response - The database's response.
+    '''
+
+    for attempt in range(DB_RETRIES + 1):
+        try:
+            with profiler.span(endpoint, "database"):
+                response = client.get(endpoint, json=payload)
+            return response
+
+        except RETRY_ERRORS as error:
+            if attempt == DB_RETRIES: #out of retries
+                raise
+
+            delay = DB_BACKOFF * 2**attempt
+            print(f"{YELLOW}\n{endpoint} failed ({type(error).__name__}), trying again in {delay} s...{RESET}")
+            time.sleep(delay)
+
+def export_files(files, directory, cache=False):
+    '''
+    Write the data dictionaries made from the database to a directory, as merged
+    files, named the way fetch_files() expects. The directory can then be plotted with
+    -d, without querying the database again.
+
+    Arguments:
+    files - type = dict. The data dictionaries, sorted by type (IV, PT, SD, 3PG, 10PG,
+            NO, OCS, HVS, TC), as from get_files().
+    directory - type = string. Where to write them (made if needed).
+    cache - type = boolean. Whether or not to write a columnar cache next to each
+            file as well.
+
+    Returns:
+    file_names - type = list of string. The files written.
+    '''
+
+    os.makedirs(directory, exist_ok=True)
+    file_names = [] #initialize
+
+    for file_type in files:
+        data_files = files[file_type] if type(files[file_type]) is list else [files[file_type]]
+
+        for data in data_files:
+            component = data['component']
+            if 'H4' in component and file_type not in ['IV', 'HVS', 'TC']: #R2, so name it
+                component = fix_R2_hybrid_sn(data)                          #for the logical hybrid
+
+            file_name = f"{component}_{EXPORT_NAMES[file_type]}.json"
+            path      = f"{directory}/{file_name}"
+
+            with open(f"{path}.tmp", 'w') as f: #written in full before it can be found
+                json.dump(data, f)
+            os.replace(f"{path}.tmp", path)
+
+            if cache:
+                columnar_cache.write_cache(path, data)
+
+            file_names.append(file_name)
+
+    print(f"{GREEN}\nExported {len(file_names)} files to {directory}.{RESET}")
+
+    return file_names
+
 def get_db_module(client, module_sn):
     '''
     Retrieves the module object from the database.
@@ -55,43 +356,68 @@ def get_db_module(client, module_sn):
     module - type = dict. The module object.
     '''
     try:
-        module = client.get("getComponent", json={"component": f'{module_sn}'})
+        module = get_with_retries(client, "getComponent", {"component": f'{module_sn}'})
         print(f"{GREEN}\nFound module {module['serialNumber']}!{RESET}")
         return module
     except:
         print(f"{RED}\nCould not find module {module_sn} in database!{RESET}")
 
 
+def get_db_components(client, serial_numbers):
+    '''
+    Retrieves several component objects from the database at once. The requests are
+    sent concurrently, from a small pool of threads, so fetching them all takes about
+    as long as fetching one.
+
+    Arguments:
+    client - type = class. Enables database access.
+    serial_numbers - type = list of string. The component serial numbers.
+
+    Returns:
+    components - type = list of dict. The component objects, in the same order as
+                 serial_numbers.
+    '''
+
+    if serial_numbers == []:
+        return []
+
+    def fetch(serial_number):
+        return get_with_retries(client, "getComponent", {"component": f'{serial_number}'})
+
+    with ThreadPoolExecutor(max_workers=min(DB_THREADS, len(serial_numbers))) as pool:
+        components = list(pool.map(fetch, serial_numbers))
+
+    return components
+
 def get_db_hybrids(client, module):
     '''
-    Retrieves the hybrid objects associated with the module of interest.
+    Retrieves the hybrid objects associated with the module of interest. The
+    half-modules (for split modules), and then the hybrids, are each fetched all at
+    once.
 
     Arguments:
     client - type = class. Enables database access.
     module - type = dict. Module object from database.
     '''
 
-    hybrids = [] #initialize
+    hybrid_sns = [] #initialize
     children = module['children'] #all module children
 
     if 'M4' in module['serialNumber'] or 'M5' in module['serialNumber']: #if it's a split module, children are half-modules
 
-        for child in children:
-            half_module_sn = child['component']['serialNumber']
-            half_module = client.get("getComponent", json={"component": f'{half_module_sn}'}) #retrieve half-module object
+        half_module_sns = [child['component']['serialNumber'] for child in children]
+        half_modules    = get_db_components(client, half_module_sns) #retrieve half-module objects
+
+        for half_module in half_modules:
             grandchildren = half_module['children'] #children of the half-module
 
             for grandchild in grandchildren:
                 if grandchild['component'] is None: #this happens sometimes
                     continue
- 
+
                 #if the module grandchild is a hybrid
                 elif '20USEH' in grandchild['component']['serialNumber']:
-
-                    hybrid_sn = grandchild['component']['serialNumber']
-                    hybrid = client.get("getComponent", json={"component": f'{hybrid_sn}'})
-                    print(f"{GREEN}\nFound hybrid {hybrid_sn}!{RESET}")
-                    hybrids.append(hybrid)
+                    hybrid_sns.append(grandchild['component']['serialNumber'])
 
 
     elif 'M0' in module['serialNumber'] or 'M1' in module['serialNumber'] or 'M2' in module['serialNumber'] or '3L' in module['serialNumber'] or '3R' in module['serialNumber'] or 'MS' in module['serialNumber'] or 'ML' in module['serialNumber']: #if it isn't a split-module, hybrids will be children
@@ -101,14 +427,16 @@ def get_db_hybrids(client, module):
                 continue
 
             elif '20USEH' in child['component']['serialNumber'] or '20USBH' in child['component']['serialNumber']: #if the child is a hybrid
-                hybrid_sn = child['component']['serialNumber']
-                hybrid = client.get("getComponent", json={"component": f'{hybrid_sn}'})
-                print(f"{GREEN}\nFound hybrid {hybrid_sn}!{RESET}")
-                hybrids.append(hybrid)
+                hybrid_sns.append(child['component']['serialNumber'])
+
+    hybrids = get_db_components(client, hybrid_sns)
+
+    for hybrid_sn in hybrid_sns:
+        print(f"{GREEN}\nFound hybrid {hybrid_sn}!{RESET}")
 
     return hybrids
 
-def get_test_IDs(client, module, hybrids):
+def get_test_IDs(client, module, hybrids, options=None):
     '''
     Get the test ID (unique identifying string for a given test) for the relevant TC
     tests.
@@ -117,6 +445,7 @@ def get_test_IDs(client, module, hybrids):
     client - type = class. Enables DB access.
     module - type = dict. Module object from DB.
     hybrids - type = list of dict. List of hybrid objects from DB.
+    options - type = dict. From load_db_options(), for picking between TC rounds.
 
     Returns:
     test_IDs - type = list of string. The relevant test IDs.
@@ -140,33 +469,34 @@ def get_test_IDs(client, module, hybrids):
                 TC_overview_tests.append(TC_test['testRuns'])
 
     if len(make_one_list(test_runs)) > (3 + len(hybrids) * 6) and "M2" not in module['serialNumber']:
-        valid_runs = get_valid_tests(make_one_list(test_runs))
+        valid_runs = get_valid_tests(make_one_list(test_runs), options)
     elif len(make_one_list(test_runs)) > (3 + (2 * 6)) and "M2" in module['serialNumber']:
-        valid_runs = get_valid_tests(make_one_list(test_runs))
+        valid_runs = get_valid_tests(make_one_list(test_runs), options)
 
     else:
         valid_runs = make_one_list(test_runs)
     test_IDs = [run['id'] for run in valid_runs] #get the test IDs
-    overview_ID = get_correct_overview(client, make_one_list(TC_overview_tests), valid_runs) #MODULE_TC tests get uploaded with ColdJig runNumber
+    overview_ID = get_correct_overview(client, make_one_list(TC_overview_tests), valid_runs, options) #MODULE_TC tests get uploaded with ColdJig runNumber
     test_IDs.append(overview_ID)
 
     return test_IDs
 
 
-def get_correct_overview(client, TC_overview_tests, all_runs):
+def get_correct_overview(client, TC_overview_tests, all_runs, options=None):
     '''
     All electrical tests during TC are uploaded to the DB with the ITSDAQ runNumber in
     the runNumber field, except for MODULE_TC test, which contains a summary of TC.
     This is uploaded with the ColdJig runNumber. To find the correct MODULE_TC test,
     this function compares the dates electrical tests were done with the MODULE_TC
     test date. If it finds more than one valid option, it asks the user for the
-    ColdJig runNumber directly.
+    ColdJig runNumber directly (unless it was given in options).
 
     Arguments:
     client - type = class. Enables DB access.
     TC_overview_tests - type = list of dict. All MODULE_TC tests uploaded to that
                         module in the DB.
     all_runs - type = list of dict. All relevant electrical tests.
+    options - type = dict. From load_db_options().
 
     Returns:
     overview_ID - type = string. The test ID for the MODULE_TC test.
@@ -188,8 +518,9 @@ def get_correct_overview(client, TC_overview_tests, all_runs):
         overview_ID = potential_tests[0]['id']
 
     elif len(potential_tests) > 1: #if there's multiple options, get ColdJig runNumber
-        print(f"{YELLOW}Sorry, multiple MODULE_TC tests found on the same dates from the same institute. Please provide the ColdJig runNumber.{RESET}")
-        coldjig_rn = input("ColdJig runNumber:")
+        if options is None or options.get("coldjig_run_number") is None:
+            print(f"{YELLOW}Sorry, multiple MODULE_TC tests found on the same dates from the same institute. Please provide the ColdJig runNumber.{RESET}")
+        coldjig_rn = get_db_value(options, "coldjig_run_number")
 
         for potential_test in potential_tests:
 
@@ -299,62 +630,77 @@ def sort_RCs(all_RC_runs):
 
 def format_data(runs, test_type):
     '''
-    Format a test run into a similar format as the merged JSONs, for use in the
+    Format test runs into a similar format as the merged JSONs, for use in the
     pre-existing plotting script.
 
     Arguments:
     runs - type = list of dict. The test runs to be formatted.
     test_type - type = string. The type of test (IV, PT, etc.).
     '''
-    formatted_runs = [] #initialize
+    formatted_runs = [format_run(run, test_type) for run in runs]
+
+    return formatted_runs
+
+def format_run(run, test_type):
+    '''
+    Format a single test run into a similar format as the merged JSONs, in place. Runs
+    which have already been formatted are left as they are.
+
+    Arguments:
+    run - type = dict. The test run to be formatted.
+    test_type - type = string. The type of test (IV, PT, etc.).
+
+    Returns:
+    run - type = dict. The same test run, formatted.
+    '''
+    if type(run["results"]) is dict: #already formatted
+        return run
 
-    for run in runs:
-        #if it's a module-level test
-        if test_type == 'IV' or test_type == 'TC' or test_type == 'HVS':
+    #if it's a module-level test
+    if test_type == 'IV' or test_type == 'TC' or test_type == 'HVS':
 
-            component_sn = [run["components"][n]["serialNumber"] for n in range(len(run["components"])) if "20USEM" in run["components"][n]["serialNumber"] or "20USBM" in run["components"][n]["serialNumber"] or "20USE3" in run["components"][n]["serialNumber"]][0] #module serial number
-        else: #if it's a hybrid-level test
-            component_sn = [run["components"][n]["serialNumber"] for n in range(len(run["components"])) if "20USEH" in run["components"][n]["serialNumber"] or "20USBH" in run["components"][n]["serialNumber"]][0] #hybrid serial number
+        component_sn = [run["components"][n]["serialNumber"] for n in range(len(run["components"])) if "20USEM" in run["components"][n]["serialNumber"] or "20USBM" in run["components"][n]["serialNumber"] or "20USE3" in run["components"][n]["serialNumber"]][0] #module serial number
+    else: #if it's a hybrid-level test
+        component_sn = [run["components"][n]["serialNumber"] for n in range(len(run["components"])) if "20USEH" in run["components"][n]["serialNumber"] or "20USBH" in run["components"][n]["serialNumber"]][0] #hybrid serial number
 
-        run["component"] = component_sn #put component serial number in run dict
-        results          = {} #initialize
+    run["component"] = component_sn #put component serial number in run dict
+    results          = {} #initialize
 
-        for result_category in run["results"]:
+    for result_category in run["results"]:
 
-            data_name          = result_category['code'] #name of the data category
-            data               = result_category['value'] #data in that category
-            results[data_name] = data #add it to a results dict
+        data_name          = result_category['code'] #name of the data category
+        data               = result_category['value'] #data in that category
+        results[data_name] = data #add it to a results dict
 
 
-        run["results"] = results #add reformattd results to run dict
+    run["results"] = results #add reformattd results to run dict
 
-        itsdaq_info  = {} #initialize
-        coldjig_info = {}
-        ft_code      = None
-        det_info     = {}
+    itsdaq_info  = {} #initialize
+    coldjig_info = {}
+    ft_code      = None
+    det_info     = {}
 
-        for property_category in run["properties"]:
-            #if test has itsdaq_test_info property
-            if property_category["code"] == "itsdaq_test_info":
-                itsdaq_info = property_category['value']
-            #if test has ColdJig_History property
-            elif property_category['code'] == 'ColdJig_History':
-                coldjig_info = property_category['value']
-            #if test has fit_type_code property
-            elif property_category['code'] == 'fit_type_code':
-                ft_code = property_category['value']
-            #if test has det_info property
-            elif property_category['code'] == 'det_info':
-                det_info = property_category['value']
+    for property_category in run["properties"]:
+        #if test has itsdaq_test_info property
+        if property_category["code"] == "itsdaq_test_info":
+            itsdaq_info = property_category['value']
+        #if test has ColdJig_History property
+        elif property_category['code'] == 'ColdJig_History':
+            coldjig_info = property_category['value']
+        #if test has fit_type_code property
+        elif property_category['code'] == 'fit_type_code':
+            ft_code = property_category['value']
+        #if test has det_info property
+        elif property_category['code'] == 'det_info':
+            det_info = property_category['value']
 
-        run['properties']                     = {} #clear out the properties, reformat
-        run['properties']['itsdaq_test_info'] = itsdaq_info
-        run['properties']['ColdJig_History']  = coldjig_info
-        run['properties']['fit_type_code']    = ft_code
-        run['properties']['det_info']         = det_info
-        formatted_runs.append(run)
+    run['properties']                     = {} #clear out the properties, reformat
+    run['properties']['itsdaq_test_info'] = itsdaq_info
+    run['properties']['ColdJig_History']  = coldjig_info
+    run['properties']['fit_type_code']    = ft_code
+    run['properties']['det_info']         = det_info
 
-    return formatted_runs
+    return run
 
 def fix_R2_hybrid_sn(test_run):
     '''
@@ -365,11 +711,14 @@ def fix_R2_hybrid_sn(test_run):
     physical hybrid it's attached to in the DB.
 
     Arguments:
-    test_run - type = dict. A database test run.
+    test_run - type = dict. A database test run (formatted or not).
 
     Returns:
     hybrid_sn - type = string. The logical hybrid the test is associated with.
     '''
+    if type(test_run["properties"]) is dict: #already formatted
+        return test_run["properties"]["det_info"]["name"]
+
     for property in test_run["properties"]: #iterate through the test properties
         if property['code'] == 'det_info': #find the det_info property
             hybrid_sn = property['value']['name'] #get the logical hybrid SN
@@ -377,11 +726,24 @@ def fix_R2_hybrid_sn(test_run):
     return hybrid_sn
 
 
-def get_valid_tests(test_runs):
+def get_valid_tests(test_runs, options=None):
+    '''
+    When more than one round of TC has been uploaded for a module, pick out the tests
+    from the round of interest, using the institute and ITSDAQ runNumber (from
+    options, or asked for).
+
+    Arguments:
+    test_runs - type = list of dict. All TC test runs for the module and its hybrids.
+    options   - type = dict. From load_db_options().
+
+    Returns:
+    valid_runs - type = list of dict. The test runs from the round of interest.
+    '''
 
-    print(f"{BLUE}\nMultiple TC rounds found. Please provide some more information.{RESET}")
-    institute = input("Institute code tests were run at (ie. UBC):")
-    itsdaq_rn = input("ITSDAQ runNumber(s):")
+    if options is None or options.get("institute") is None or options.get("itsdaq_run_number") is None:
+        print(f"{BLUE}\nMultiple TC rounds found. Please provide some more information.{RESET}")
+    institute = get_db_value(options, "institute")
+    itsdaq_rn = get_db_value(options, "itsdaq_run_number")
     valid_runs = [run for run in test_runs if run['institution']['code'] == institute and itsdaq_rn in run['runNumber']] #filter out irrelevant tests
 
     return valid_runs
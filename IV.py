@@ -158,11 +158,9 @@ def get_VBDs(IV_data):
     VBDs - Type = list of float. A list of the breakdown voltages, one per IV.
     '''
 
-    VBDs = IV_data["results"]["VBD"]
-
-    for n in range(len(VBDs)):
-        if VBDs[n] > 550:    #replace VBD with nan if VBD > 550V
-            VBDs[n] = np.nan
+#Replace VBD with nan if VBD > 550V. Make a new list rather than editing the file
+#contents, since those are shared with the other plotting scripts.
+    VBDs = [np.nan if VBD > 550 else VBD for VBD in IV_data["results"]["VBD"]]
 
     return VBDs
 
@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 from common_functions import *
+from scan_scatter import scatter_scans
 
 def make_plots(NO_data, TC_data):
     '''
@@ -59,38 +60,39 @@ def all_occupancy_plots(NO_data, TC_data, stream):
 
     w = -1 #initialize temp-specific counters
     c = -1
+    series = [] #points, colour, and labels for each scan
 
-#Plot each scan, colour-coded by temperature, and mark defective chips
+#Colour-code each scan by temperature, and mark defective chips
     for scan in scans:
         #sort chips and data by whether or not they're associated with a defect
         good_chips, good_data, bad_chips, bad_data = analyze_NO(NO_data, stream, scan)
 
         if scan in warm_scans:
             w = w + 1 #increment warm scan counter
-            plt.scatter(good_chips, good_data, color=(red_warm, green_warm[w], blue_warm), label=f"Warm NO {w}", s=6) #plot good warm data
 
             if w == 0: #have exactly one defect label in legend
                 label = "Defect Chip"
             else:
                 label = None
 
-            plt.scatter(bad_chips, bad_data, color=(red_warm, green_warm[w], blue_warm), s=20, marker="^", label=label) #plot bad warm data
+            series.append((good_chips, good_data, bad_chips, bad_data, (red_warm, green_warm[w], blue_warm), f"Warm NO {w}", label)) #warm data
 
         elif scan in cold_scans:
             c = c + 1 #increment cold scan counter
-            plt.scatter(good_chips, good_data, color=(red_cold, green_cold[c], blue_cold), label=f"Cold NO {c}", s=6) #plot good cold data
-            plt.scatter(bad_chips, bad_data, color=(red_cold, green_cold[c], blue_cold), s=20, marker="^") #plot bad cold data
+            series.append((good_chips, good_data, bad_chips, bad_data, (red_cold, green_cold[c], blue_cold), f"Cold NO {c}", None)) #cold data
 
         else:
             print(f"{YELLOW}Scan {scan} could not be labelled warm or cold!{RESET}")
 
+    proxies = scatter_scans(plt.gca(), series, 6, 20) #plot every scan at once
+
     plt.xlabel("Chip Number")
     plt.ylabel("Occupancy")
     plt.xlim(-0.5, len(chips) - 0.5)
     plt.title(f"{component} Occupancy Throughout TC, {stream} Stream")
     plt.grid(axis='x')
     if stream == 'Away':
-        plt.legend(ncol=2, fontsize=5, bbox_to_anchor=(-0.1,1))
+        plt.legend(handles=proxies, ncol=2, fontsize=5, bbox_to_anchor=(-0.1,1))
 
 def average_occupancy_plots(NO_data, TC_data, stream):
     '''
@@ -142,40 +144,23 @@ def analyze_NO(NO_data, stream, scan):
               the NO JSON file.
 
     Returns:
-    good_chips - Type = list of int. List of chips not associated with a defect.
-    good_data  - Type = list of float. List of data associated with non-defective
-                 chips.
-    bad_chips  - Type = list of int. List of chips associated with a defect.
-    bad_data   - Type = list of float. List of data associated with defective chips.
+    good_chips - Type = numpy array of int. Chips not associated with a defect.
+    good_data  - Type = numpy array. Data associated with non-defective chips.
+    bad_chips  - Type = numpy array of int. Chips associated with a defect.
+    bad_data   - Type = numpy array. Data associated with defective chips.
     '''
 
-    defects = get_defects(NO_data) #list of all NO defects from TC
     chips   = get_channels(NO_data)
     scans   = get_scans(NO_data) #list of all NO scans from TC
     scan_number = get_index(scan, scans) #get scans index associated with scan
 
     data = NO_data["results"][f"occupancy_mean_{stream.lower()}"][scan_number]
 
-    good_chips = [] #initialize
-    good_data  = []
-    bad_chips  = []
-    bad_data   = []
-
-#If a defect matches the stream and scan given, append the associated chip to
-#bad_chips, and append that chip's data to bad_data
-    for defect in defects:
-        defect_stream = defect["properties"]["chip_bank"]
-        defect_scan   = defect["properties"]["runNumber"]
-        defect_chip   = defect["properties"]["chip_in_histo"]
+#Which chips are defective in this scan and stream (the runNumber is scan[:-7])
+    defect_mask = get_defect_mask(NO_data, 7, len(chips), chip_level=True)
+    bad         = defect_mask[scan_number, STREAMS.index(stream.lower())]
 
-        if defect_stream == stream.lower() and defect_scan == scan[:-7]:
-            bad_chips.append(defect["properties"]["chip_in_histo"])
-            bad_data.append(data[defect_chip])
-
-    for chip in chips: #If the chip isn't bad, it's good
-        if chip not in bad_chips:
-            good_chips.append(chip)
-            good_data.append(data[chip])
+    good_chips, good_data, bad_chips, bad_data = split_by_mask(data, bad)
 
     return good_chips, good_data, bad_chips, bad_data
 
@@ -199,22 +184,26 @@ def get_data(NO_data, TC_data, stream):
     scans                  = get_scans(NO_data) #list of all NO scans during TC
     warm_scans, cold_scans = sort_scan_temp(scans, TC_data) #sort scans by temp
 
-    data = NO_data["results"][f"occupancy_mean_{stream.lower()}"] #data for stream
+    field = f"occupancy_mean_{stream.lower()}" #data for stream
 
-    warm_data = [] #initialize
-    cold_data = []
+    warm_numbers = [] #initialize
+    cold_numbers = []
 
-#If a scan is warm, append its data to warm_data, if it's cold, append its data
-#to cold_data
+#If a scan is warm, keep its index for warm_data, if it's cold, keep its index for
+#cold_data
     for n,scan in enumerate(scans):
 
         if scan in warm_scans:
-            warm_data.append(data[n])
+            warm_numbers.append(n)
 
         elif scan in cold_scans:
-            cold_data.append(data[n])
+            cold_numbers.append(n)
 
         else:
             print(f"{YELLOW}Scan {scan} could not be labelled warm or cold!{RESET}")
 
+#Only read the scans needed (views, if the data is memory-mapped)
+    warm_data = get_scan_results(NO_data, field, warm_numbers)
+    cold_data = get_scan_results(NO_data, field, cold_numbers)
+
     return warm_data, cold_data
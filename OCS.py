@@ -2,6 +2,7 @@
 import numpy as np
 import matplotlib.pyplot as plt
 from common_functions import *
+from scan_scatter import scatter_scans
 from matplotlib.ticker import MultipleLocator
 import matplotlib
 
@@ -64,26 +65,28 @@ def all_OCS_plot(OCS_data, TC_data, stream):
     red_cold, red_warm, blue_cold, blue_warm, green_cold, green_warm = get_colours(warm_scans, cold_scans)
 
     w = -1 #warm-scan-specific counter
+    series = [] #points, colour, and labels for each scan
 
 #For each OCS scan, sort channels and respective data into good and bad based on
-#whether or not they are associated with a defect, and plot.
+#whether or not they are associated with a defect.
     for scan in scans:
 
         good_channels, good_data, bad_channels, bad_data = analyze_OCS(OCS_data, scan, stream)
 
         if scan in warm_scans:
             w = w + 1 #increment warm scan counter
-            plt.scatter(good_channels, good_data, s=0.5, color=(red_warm, green_warm[w], blue_warm), label=f"Warm OCS {w}") #plot good data
             if w == 0: #have exactly one defect label in legend
                 label = "Defect Channel"
             else:
                 label = None
 
-            plt.scatter(bad_channels, bad_data, s=5, marker="^", color=(red_warm, green_warm[w], blue_warm), label=label) #plot bad data
+            series.append((good_channels, good_data, bad_channels, bad_data, (red_warm, green_warm[w], blue_warm), f"Warm OCS {w}", label))
 
         else:
             print(f"{YELLOW}Scan {scan} could not be labelled warm!{RESET}")
 
+    proxies = scatter_scans(plt.gca(), series, 0.5, 5) #plot good and bad data for every scan
+
     plt.xlabel("Channel Number")
     plt.xlim(0, len(channels))
     plt.ylim(0,)
@@ -92,7 +95,7 @@ def all_OCS_plot(OCS_data, TC_data, stream):
     plt.grid(axis='x')
     plt.gca().xaxis.set_major_locator(MultipleLocator(128))
     if stream == 'Away':
-        plt.legend(markerscale=2, bbox_to_anchor=(-0.08,1))
+        plt.legend(handles=proxies, markerscale=2, bbox_to_anchor=(-0.08,1))
 
 def OCS_histo(OCS_data, TC_data, stream):
     '''
@@ -105,42 +108,13 @@ def OCS_histo(OCS_data, TC_data, stream):
     stream   - Type = string, "Under" or "Away". The stream to be plotted.
     '''
 
-    component = get_component(OCS_data) #hybrid serial number
-    defects   = get_defects(OCS_data) #list of all OCS defects found in TC
-    channels  = get_channels(OCS_data)
-    scans     = get_scans(OCS_data) #list of all OCS scans from TC
-
-    all_defect_scans = [] #initialize
-
-#For every defect append the associated scan to all_defect_scans
-    for defect in defects:
-        defect_stream = defect["properties"]["chip_bank"]
-        if defect["name"] == "Open channel" and stream.lower() == defect_stream:
-            defect_scan = defect["properties"]["runNumber"]
-            all_defect_scans.append(defect_scan)
+    component    = get_component(OCS_data) #hybrid serial number
+    defect_index = get_defect_index(OCS_data) #all OCS defects found in TC, indexed
+    channels     = get_channels(OCS_data)
+    scans        = get_scans(OCS_data) #list of all OCS scans from TC
 
-#Create a list, defect_scans, which has all scans with defects, without duplicates
-    defect_scans = [] #initialize
-    for scan in all_defect_scans:
-        if scan not in defect_scans:
-            defect_scans.append(scan)
-
-#Make a list of defective chips, with duplicates
-    all_defect_chips = [] #initialize
-
-    for scan in scans:
-        defect_chips = []
-
-        for defect in defects:
-            defect_scan = defect["properties"]["runNumber"]
-            defect_stream = defect["properties"]["chip_bank"]
-
-            #If the defect matches desired scan and stream, append chip
-            if defect_scan == scan[:-24] and defect_stream == stream.lower():
-                defect_chip = defect["properties"]["chip_in_histo"]
-                defect_chips.append(defect_chip)
-
-        all_defect_chips.append(defect_chips)
+#Make a list of defective chips for each scan, with duplicates
+    all_defect_chips = [defect_index.chips(run_number=scan[:-24], stream=stream.lower()) for scan in scans]
 
     red_cold, red_warm, blue_cold, blue_warm, green_cold, green_warm = get_colours(scans, [])
     hist_range = (0, int(len(channels)/128)) #range of histogram
@@ -167,15 +141,12 @@ def analyze_OCS(OCS_data, scan, stream):
     stream   - Type = string, "Under" or "Away". The stream to be analyzed.
 
     Returns:
-    good_channels - Type = list of int. List of channels not associated with a defect.
-    good_data     - Type = list of float. List of data associated with non-defective
-                    channels.
-    bad_channels  - Type = list of int. List of channels associated with a defect.
-    bad_data      - Type = list of float. List of data associated with defective
-                    channels.
+    good_channels - Type = numpy array of int. Channels not associated with a defect.
+    good_data     - Type = numpy array. Data associated with non-defective channels.
+    bad_channels  - Type = numpy array of int. Channels associated with a defect.
+    bad_data      - Type = numpy array. Data associated with defective channels.
     '''
 
-    defects  = get_defects(OCS_data) #list of all OCS defects during TC
     channels = get_channels(OCS_data)
     scans    = get_scans(OCS_data) #list of all OCS scans from TC
 
@@ -184,26 +155,13 @@ def analyze_OCS(OCS_data, scan, stream):
         if single_scan == scan:
             scan_number = n
 
-    data          = OCS_data["results"][f"noise_{stream.lower()}"][scan_number]
-    good_channels = [] #initialize
-    good_data     = []
-    bad_channels  = []
-    bad_data      = []
+    data = get_scan_results(OCS_data, f"noise_{stream.lower()}", [scan_number])[0]
 
-#If defect matches scan and stream of interest, append channel and data to lists.
-    for defect in defects:
-        defect_stream = defect["properties"]["chip_bank"]
-        defect_scan   = defect["properties"]["runNumber"]
-        defect_channel = defect["properties"]["channel"]
+#Which channels are defective in this scan and stream (the runNumber is scan[:-24])
+    defect_mask = get_defect_mask(OCS_data, 24, len(channels))
+    bad         = defect_mask[scan_number, STREAMS.index(stream.lower())]
 
-        if defect_stream == stream.lower() and defect_scan == scan[:-24]:
-            bad_channels.append(defect_channel)
-            bad_data.append(data[defect_channel])
-
-    for channel in channels: #if the channel isn't bad, it's good
-        if channel not in bad_channels:
-            good_channels.append(channel)
-            good_data.append(data[channel])
+    good_channels, good_data, bad_channels, bad_data = split_by_mask(data, bad)
 
     return good_channels, good_data, bad_channels, bad_data
 
@@ -226,16 +184,19 @@ def get_noise(OCS_data, TC_data, stream):
 
     scans                  = get_scans(OCS_data)
     warm_scans, cold_scans = sort_scan_temp(scans, TC_data)
-    data                   = OCS_data["results"][f"noise_{stream.lower()}"]
+    field                  = f"noise_{stream.lower()}"
 
-    warm_noise = []
+    warm_numbers = [] #initialize
 
     for n,scan in enumerate(scans):
 
         if scan in warm_scans:
-            warm_noise.append(data[n])
+            warm_numbers.append(n)
 
         else:
             print(f"{YELLOW}Scan {scan} could not be labelled as warm!{RESET}")
 
+#Only read the scans needed (views, if the data is memory-mapped)
+    warm_noise = get_scan_results(OCS_data, field, warm_numbers)
+
     return warm_noise
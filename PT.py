@@ -5,6 +5,7 @@ import matplotlib.pyplot as plt
 import matplotlib
 from matplotlib.ticker import MultipleLocator
 from common_functions import *
+from scan_scatter import scatter_scans
 
 def make_plots(PT_data, TC_data):
     '''
@@ -57,31 +58,31 @@ def all_scans_plot(PT_data, TC_data, stream):
 
     w = -1 #initialize
     c = -1
+    series = [] #points, colour, and labels for each scan
     for scan in scans:
         good_trims, good_channels, bad_trims, bad_channels = analyze_trims(PT_data, TC_data, scan, stream) #sort trims and their channels by whether or not they are marked defective for a given scan.
 
         if scan in warm_scans:
             w = w + 1 #increment number of warm scans
-            plt.scatter(good_channels, good_trims, color=(red_warm, green_warm[w], blue_warm), label=f"Warm PT {w}", s=0.5) #plot good warm channels
 
             if w == 0:
                 name = "Bad Trim" #put exactly one 'Bad Trim' indicator in legend
             else:
                 name = None
 
-            plt.scatter(bad_channels, bad_trims, color=(red_warm, green_warm[w], blue_warm), label=name, s=5, marker='^') #plot defective warm channels
+            series.append((good_channels, good_trims, bad_channels, bad_trims, (red_warm, green_warm[w], blue_warm), f"Warm PT {w}", name)) #warm channels
 
 
         elif scan in cold_scans:
             c = c + 1 #increment number of cold scans
-            plt.scatter(good_channels, good_trims, color=(red_cold, green_cold[c], blue_cold), label=f"Cold PT {c}", s=0.5) #plot good cold channels
-            plt.scatter(bad_channels, bad_trims, color=(red_cold, green_cold[c], blue_cold), s=5, marker="^") #plot defective cold channels
+            series.append((good_channels, good_trims, bad_channels, bad_trims, (red_cold, green_cold[c], blue_cold), f"Cold PT {c}", None)) #cold channels
 
         else:
         #If the scan isn't being flagged by temperature correctly, inform user and
         #continue. This should not happen, but may if file structure is changed.
             print(f"{YELLOW}PT Scan {scan} could not be flagged as warm or cold!{RESET}")
 
+    proxies = scatter_scans(plt.gca(), series, 0.5, 5) #good channels as dots, defective as triangles
 
 
     plt.xlabel("Channel Number")
@@ -90,7 +91,7 @@ def all_scans_plot(PT_data, TC_data, stream):
     plt.xlim(0, len(channels))
     plt.grid(axis='x')
     if stream == 'Away':
-        plt.legend(ncol=2, markerscale=3, fontsize=5, framealpha=0.6, bbox_to_anchor=(-0.12, 1))
+        plt.legend(handles=proxies, ncol=2, markerscale=3, fontsize=5, framealpha=0.6, bbox_to_anchor=(-0.12, 1))
     plt.gca().xaxis.set_major_locator(MultipleLocator(128))
 
 def average_trim_plot(PT_data, TC_data, stream):
@@ -149,10 +150,10 @@ def analyze_trims(PT_data, TC_data, scan, stream):
     stream  - Type = string, "Under" or "Away". The stream to analyze trims for.
 
     Returns:
-    good_trims    - Type = list of int. Trims not associated with defective channels.
-    good_channels - Type = list of int. Channels not associated with a defect.
-    bad_trims     - Type = list of int. Trims associated with defective channels.
-    bad_channels  - Type = list of int. Channels associated with a defect.
+    good_trims    - Type = numpy array. Trims not associated with defective channels.
+    good_channels - Type = numpy array of int. Channels not associated with a defect.
+    bad_trims     - Type = numpy array. Trims associated with defective channels.
+    bad_channels  - Type = numpy array of int. Channels associated with a defect.
     '''
 
 #Retrieve desired data based on stream
@@ -170,32 +171,13 @@ def analyze_trims(PT_data, TC_data, scan, stream):
 
 #results is list of list, where index corresponds to test number.
     trims    = results[index] #get results for specific scan
-    defects  = get_defects(PT_data) #get a list of all PT defects during TC
     channels = get_channels(PT_data)
 
-    good_channels = [] #initialize
-    bad_channels  = []
-    good_trims    = []
-    bad_trims     = []
+#Which channels are defective in this scan and stream (the runNumber is scan[:-18])
+    defect_mask = get_defect_mask(PT_data, 18, len(channels))
+    bad         = defect_mask[index, STREAMS.index(stream.lower())]
 
-#Determine which defects were for this specific stream and scan
-    for defect in defects:
-
-        defect_stream  = defect["properties"]["chip_bank"]
-        defect_scan    = defect["properties"]["runNumber"]
-        defect_channel = defect["properties"]["channel"]
-
-#If defect is for given stream and scan, append the defect channel and corresponding
-#trim value to bad_channels and bad_trims, respectively.
-        if defect_stream == stream.lower() and defect_scan == scan[:-18]:
-            bad_channels.append(defect_channel)
-            bad_trims.append(trims[defect_channel])
-
-#If a channel isn't a bad channel, it must be a good channel.
-    for channel in channels:
-        if channel not in bad_channels:
-            good_channels.append(channel)
-            good_trims.append(trims[channel])
+    good_channels, good_trims, bad_channels, bad_trims = split_by_mask(trims, bad)
 
     return good_trims, good_channels, bad_trims, bad_channels
 
@@ -219,10 +201,10 @@ def get_trims(PT_data, TC_data, stream):
 
 #Get data based on stream
     if stream == "Away":
-        results = PT_data["results"]["trim_away"]
+        field = "trim_away"
 
     elif stream == "Under":
-        results = PT_data["results"]["trim_under"]
+        field = "trim_under"
 
     else:
         print(f"{YELLOW}Invalid stream type {stream} given! Must be 'Away' or 'Under'.{RESET}")
@@ -230,17 +212,20 @@ def get_trims(PT_data, TC_data, stream):
     scans                  = get_scans(PT_data) #retrieve all PT scans
     warm_scans, cold_scans = sort_scan_temp(scans, TC_data) #sort scans by temp
 
-    warm_trims = [] #initialize
-    cold_trims = []
+    warm_numbers = [] #initialize
+    cold_numbers = []
 
-#If a scan is done warm, append the corresponding list of trims to warm_trims.
-#Do the same for cold.
+#If a scan is done warm, keep its index for warm_trims. Do the same for cold.
     for n,scan in enumerate(scans):
         if scan in warm_scans:
-            warm_trims.append(results[n])
+            warm_numbers.append(n)
         elif scan in cold_scans:
-            cold_trims.append(results[n])
+            cold_numbers.append(n)
         else:
             print(f"{YELLOW}Scan {scan} could not be identified as warm or cold!{RESET}")
 
+#Only read the scans needed (views, if the data is memory-mapped)
+    warm_trims = get_scan_results(PT_data, field, warm_numbers)
+    cold_trims = get_scan_results(PT_data, field, cold_numbers)
+
     return warm_trims, cold_trims
@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import matplotlib
 from matplotlib.ticker import MultipleLocator
 from common_functions import *
+from scan_scatter import scatter_scans
 
 def make_plots(RC_data, TC_data, noise_only):
     '''
@@ -128,36 +129,39 @@ def all_RC_plots(RC_data, TC_data, stream, field):
 
     w = -1 #initialize temperature-specfic counters
     c = -1
+    series = [] #points, colour, and labels for each scan
 
 #For each scan, determine which channels are defective and sort data accordingly.
-#Then, plot it based on temperature.
+#Then, colour it based on temperature.
     for n,scan in enumerate(scans):
 
         good_channels, bad_channels, good_data, bad_data = analyze_RC(RC_data, stream, scan, field) #sorted channels and data for scan, based on defectiveness
 
         if scan in warm_scans:
             w = w + 1 #increment warm scan counter
-            plt.scatter(good_channels, good_data, s=0.05, color=(red_warm, green_warm[w], blue_warm), label=f"Warm Test {w}") #plot non-defective warm data
             if w == 0:
                 label = "Defect Channel" #have exactly one entry in legend for defects
             else:
                 label = None
-            plt.scatter(bad_channels, bad_data, s=5, color=(red_warm, green_warm[w], blue_warm), marker="^", label=label) #plot defective warm data
+            series.append((good_channels, good_data, bad_channels, bad_data, (red_warm, green_warm[w], blue_warm), f"Warm Test {w}", label)) #warm data
 
         elif scan in cold_scans:
             c = c + 1 #increment cold scan counter
-            plt.scatter(good_channels, good_data, s=0.05, color=(red_cold, green_cold[c], blue_cold), label=f"Cold Test {c}") #plot non-defective cold data
-            plt.scatter(bad_channels, bad_data, s=5, color=(red_cold, green_cold[c], blue_cold), marker="^") #plot defective cold data
+            series.append((good_channels, good_data, bad_channels, bad_data, (red_cold, green_cold[c], blue_cold), f"Cold Test {c}", None)) #cold data
 
         else:
             print(f"{YELLOW}Scan {scan} could not be labelled as warm or cold!{RESET}")
 
+#Plot every scan at once, non-defective data as dots and defective data as triangles
+    proxies = scatter_scans(plt.gca(), series, 0.05, 5)
+
     plt.xlabel("Channel Number")
     plt.ylabel(f"{title}")
     plt.xlim(0,len(channels))
     plt.title(f"{component} {title}, {stream} Stream, {test_type}")
     if stream == 'Away':
-        legend = plt.legend(ncol=2, markerscale=10, fontsize=5, bbox_to_anchor=(-0.17, 1))
+        handles = plt.gca().get_legend_handles_labels()[0] + proxies #lines, then scans
+        legend = plt.legend(handles=handles, ncol=2, markerscale=10, fontsize=5, bbox_to_anchor=(-0.17, 1))
         if field == "innse":
             legend.legend_handles[3]._sizes = [50]
         else:
@@ -182,12 +186,8 @@ def average_RC_plots(RC_data, TC_data, stream, field):
 
     scans                     = get_scans(RC_data) #get all RC scans
     warm_scans, cold_scans    = sort_scan_temp(scans, TC_data) #sort scans by temp
-#Get all data for stream and field from TC
-    data                      = get_data(RC_data, stream, field)
     channels                  = get_channels(RC_data)
     component                 = get_component(RC_data) #hybrid serial number
-    warm_data = [] #initialize
-    cold_data = []
 
 #If plotting noise, also plot the expected and maximum noise for the hybrid type and
 #stream.
@@ -209,18 +209,18 @@ def average_RC_plots(RC_data, TC_data, stream, field):
     else:
         print(f"{YELLOW}Invalid field type {field}{RESET}!")
 
-#If a scan is warm, append it's corresponding data to warm_data. Same for cold.
-    for n, scan in enumerate(scans):
-
-        if scan in warm_scans:
-            warm_data.append(make_one_list(data[n]))
-
-        elif scan in cold_scans:
-            cold_data.append(make_one_list(data[n]))
+#If a scan is warm, keep its index for warm_data. Same for cold.
+    warm_numbers = [n for n,scan in enumerate(scans) if scan in warm_scans]
+    cold_numbers = [n for n,scan in enumerate(scans) if scan in cold_scans]
 
-        else:
+    for scan in scans:
+        if scan not in warm_scans and scan not in cold_scans:
             print(f"{YELLOW}Scan {scan} could not be labelled as warm or cold!{RESET}")
 
+#Get data for stream and field for only those scans
+    warm_data = [make_one_list(scan_data) for scan_data in get_data(RC_data, stream, field, warm_numbers)]
+    cold_data = [make_one_list(scan_data) for scan_data in get_data(RC_data, stream, field, cold_numbers)]
+
 #Reformat so each list corresponds to all warm or cold data for a single channel
     warm_data_by_channel = np.swapaxes(warm_data, 0, 1)
     cold_data_by_channel = np.swapaxes(cold_data, 0, 1)
@@ -380,21 +380,28 @@ def get_noise_info(component, stream):
 
     return expected_noise, noise_max
 
-def get_data(RC_data, stream, field):
+def get_data(RC_data, stream, field, scan_numbers=None):
     '''
-    Retrieve all data for a given field (noise, gain, or VT50) and stream.
+    Retrieve data for a given field (noise, gain, or VT50) and stream, either for all
+    scans, or for only the scans asked for.
 
     Arguments:
-    RC_data - the contents of a pre-opened RESPONSE_CURVE JSON file.
-    stream  - Type = string, "Under" or "Away". Stream to get data for.
-    field   - Type = string, "innse", "gain", or "vt50". Field to get data for.
+    RC_data      - the contents of a pre-opened RESPONSE_CURVE JSON file.
+    stream       - Type = string, "Under" or "Away". Stream to get data for.
+    field        - Type = string, "innse", "gain", or "vt50". Field to get data for.
+    scan_numbers - Type = list of int. Indices of the scans to get data for. If not
+                   given, get data for every scan.
 
     Returns:
     data - Type = list of list of float. Each sublist corresponds to the results from
            a single test.
     '''
 
-    data = RC_data["results"][f"{field}_{stream.lower()}"] #get the data
+    if scan_numbers is None:
+        data = RC_data["results"][f"{field}_{stream.lower()}"] #get the data
+
+    else: #only read the scans needed (views, if the data is memory-mapped)
+        data = get_scan_results(RC_data, f"{field}_{stream.lower()}", scan_numbers)
 
     return data
 
@@ -413,22 +420,13 @@ def analyze_RC(RC_data, stream, scan, field):
     field   - Type = string, "innse", "gain", or "vt50". The field to be analyzed.
 
     Returns:
-    good_channels - Type = list of int. A list of channels not associated with a
-                    defect.
-    bad_channels  - Type = list of int. A list of channels associated with a defect.
-    good_data     - Type = list of float. A list of data not associated with defective
-                    channels.
-    bad_data      - Type = list of float. A list of data associated with defective
-                    channels.
+    good_channels - Type = numpy array of int. Channels not associated with a defect.
+    bad_channels  - Type = numpy array of int. Channels associated with a defect.
+    good_data     - Type = numpy array. Data not associated with defective channels.
+    bad_data      - Type = numpy array. Data associated with defective channels.
     '''
 
-    defects       = get_defects(RC_data)
-    data          = get_data(RC_data, stream, field)
     channels      = get_channels(RC_data)
-    bad_channels  = [] #initialize
-    good_channels = []
-    good_data     = []
-    bad_data      = []
     scans         = get_scans(RC_data) #list of all RC scans during TC
 
 #Determine the ordinal number associated with the scan of interest (0 is first, etc.)
@@ -436,42 +434,13 @@ def analyze_RC(RC_data, stream, scan, field):
         if single_scan == scan:
             scan_number = n
 
-    scan_data = make_one_list(data[scan_number]) #minor reformatting
-
-#Figure out which channels are defective, and their assiociated data values
-    for defect in defects:
-
-        if defect["properties"]["chip_bank"] == stream.lower() and defect["properties"]["runNumber"] == scan[:-19]: #does the defect match stream and scan of interest?
-
-            try: #append bad channels and associated data to respective list
-                #this won't work if >1 channel is affected by the defect
-                channel = defect["properties"]["channel"]
-                bad_channels.append(channel)
-                bad_data.append(scan_data[channel])
-            except:
-                pass
-            try: #for when >1 channel is affected by the defect
-                first_channel = defect["properties"]["channel_from"]
-                last_channel  = defect["properties"]["channel_to"]
-                defect_channels = np.linspace(first_channel, last_channel, last_channel - first_channel + 1) #make a list of affected by the defect
-                for channel in defect_channels:
-                    channel = int(channel) #np.linspace produces floats
-                    bad_channels.append(channel)
-                    bad_data.append(scan_data[channel])
-            except:
-                 if "channel_from" not in defect["properties"] and "channel" not in defect["properties"]:
-                    defect_chip = defect["properties"]["chip_in_histo"]
-                    first_channel = defect_chip * 128
-                    last_channel = (defect_chip + 1) * 128 - 1
-                    defect_channels = np.linspace(first_channel, last_channel, last_channel - first_channel + 1)
-                    for channel in defect_channels:
-                        channel = int(channel)
-                        bad_channels.append(channel)
-                        bad_data.append(scan_data[channel])
-
-    for channel in channels: #if it isn't a bad channel, call it a good channel
-        if channel not in bad_channels:
-            good_channels.append(channel)
-            good_data.append(scan_data[channel])
+    scan_data = make_one_list(get_data(RC_data, stream, field, [scan_number])[0]) #minor reformatting
+
+#Which channels are defective in this scan and stream (the runNumber is scan[:-19]).
+#Single channels, channel ranges, and whole chips are all covered by the mask.
+    defect_mask = get_defect_mask(RC_data, 19, len(channels))
+    bad         = defect_mask[scan_number, STREAMS.index(stream.lower())]
+
+    good_channels, good_data, bad_channels, bad_data = split_by_mask(scan_data, bad)
 
     return good_channels, bad_channels, good_data, bad_data
@@ -4,6 +4,7 @@ import matplotlib.pyplot as plt
 import matplotlib
 from matplotlib.ticker import MultipleLocator
 from common_functions import *
+from scan_scatter import scatter_scans
 
 def make_plots(SD_data, TC_data):
     '''
@@ -60,9 +61,10 @@ def all_strobes_plot(SD_data, TC_data, stream):
 
     w = -1 #initialize temp-specific counters
     c = -1
+    series = [] #points, colour, and labels for each scan
 
-#For each SD scan, sort chips by whether or not they're defective, and plot based on
-#test temperature.
+#For each SD scan, sort chips by whether or not they're defective, and colour based
+#on test temperature.
     for scan in scans:
 
 #For this scan, sort  chips and their respective strobe delays based on whether
@@ -72,30 +74,30 @@ def all_strobes_plot(SD_data, TC_data, stream):
 
         if scan in warm_scans:
             w = w + 1 #increment warm scan counter
-            plt.scatter(good_chips, good_strobes, color=(red_warm, green_warm[w], blue_warm), label=f"Warm SD {w}", s=6) #plot
             if w == 0:
 #Ensure there is exactly one item in the legend displaying a bad strobe marker.
                 label = "Bad Strobe"
             else:
                 label = None
 
-            plt.scatter(bad_chips, bad_strobes, color=(red_warm, green_warm[w], blue_warm), marker='^', label=label, s=20)
+            series.append((good_chips, good_strobes, bad_chips, bad_strobes, (red_warm, green_warm[w], blue_warm), f"Warm SD {w}", label))
 
         elif scan in cold_scans:
             c = c + 1 #increment cold scan counter
-            plt.scatter(good_chips, good_strobes, color=(red_cold, green_cold[c], blue_cold), label=f"Cold SD {c}", s=6) #plot
-            plt.scatter(bad_chips, bad_strobes, color=(red_cold, green_cold[c], blue_cold), marker='^', s=20)
+            series.append((good_chips, good_strobes, bad_chips, bad_strobes, (red_cold, green_cold[c], blue_cold), f"Cold SD {c}", None))
 
         else:
             print(f"{YELLOW}Scan {scan} can not be labelled as warm or cold!{RESET}")
 
+    proxies = scatter_scans(plt.gca(), series, 6, 20) #plot every scan at once
+
     plt.xlabel("Chip Number")
     plt.ylabel("Strobe Delay")
     plt.title(f"{component} Strobe Delay, {stream} Stream")
     plt.xlim(-0.5, len(chips) - 0.5)
     plt.grid(axis='x')
     if stream == 'Away':
-        plt.legend(ncol=2, fontsize=5, bbox_to_anchor=(-0.1, 1))
+        plt.legend(handles=proxies, ncol=2, fontsize=5, bbox_to_anchor=(-0.1, 1))
 
 def average_strobes_plot(SD_data, TC_data, stream):
     '''
@@ -148,42 +150,26 @@ def analyze_strobes(SD_data, scan, stream):
     stream  - Type = string, "Under" or "Away". The stream to be analyzed.
 
     Returns:
-    good_strobes - Type = list of int. List of strobe delay values not associated with
-                   a defective chip.
-    bad_strobes  - Type = list of int. List of strobe delay values associated with a
+    good_strobes - Type = numpy array. Strobe delay values not associated with a
                    defective chip.
-    good_chips   - Type = list of int. List of chips that are not associated with a
+    bad_strobes  - Type = numpy array. Strobe delay values associated with a defective
+                   chip.
+    good_chips   - Type = numpy array of int. Chips that are not associated with a
                    defect.
-    bad_chips    - Type = list of int. List of chips that are associated with a defect
+    bad_chips    - Type = numpy array of int. Chips that are associated with a defect
     '''
 
-    defects      = SD_data["defects"] #get a list of all SD defects
-    good_strobes = [] #intialize
-    bad_strobes  = []
-    good_chips   = []
-    bad_chips    = []
     scans        = get_scans(SD_data) #get a list of all scans
     chips        = get_chips(SD_data) #get a list of chip numbers
     index        = get_index(scan, scans) #get the index of scans associated with scan
+    strobes      = SD_data["results"][f"StrobeDelay_{stream.lower()}"][index]
+
+#Which chips are defective in this scan and stream (the runNumber is scan[:-17]).
+#Only the real chips are kept, not the -1 entries after them.
+    defect_mask = get_defect_mask(SD_data, 17, len(strobes), chip_level=True)
+    bad         = defect_mask[index, STREAMS.index(stream.lower()), :len(chips)]
 
-#For each defect, if it is associated with the given scan and stream, append the chip
-#and corresponding SD value to bad_chips and bad_strobes.
-    for defect in defects:
-        defect_stream = defect["properties"]["chip_bank"]
-        defect_chip   = defect["properties"]["chip_in_histo"]
-        defect_scan   = defect["properties"]["runNumber"]
-
-        if defect_stream == stream.lower() and defect_scan == scan[:-17]:
-            bad_chips.append(defect_chip)
-            bad_strobe = SD_data["results"][f"StrobeDelay_{stream.lower()}"][index][defect_chip]
-            bad_strobes.append(bad_strobe)
-
-#If the chip isn't bad, it must be good
-    for chip in chips:
-        if chip not in bad_chips:
-            good_chips.append(chip)
-            good_strobe = SD_data["results"][f"StrobeDelay_{stream.lower()}"][index][chip]
-            good_strobes.append(good_strobe)
+    good_chips, good_strobes, bad_chips, bad_strobes = split_by_mask(strobes, bad)
 
     return good_strobes, bad_strobes, good_chips, bad_chips
 
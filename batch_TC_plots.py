@@ -0,0 +1,353 @@
+#Import standard libraries
+import os
+import sys
+import json
+import time
+import argparse
+import traceback
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+#Import TC plotting scripts
+import make_TC_plots
+from common_functions import *
+
+def find_module_directories(parent_directory):
+    '''
+    Find every module directory under a parent directory: any directory (at any depth)
+    with a ColdJigRun file in it.
+
+    Arguments:
+    parent_directory - Type = string. The directory to search.
+
+    Returns:
+    directories - Type = list of string. The module directories, sorted.
+    '''
+
+    directories = [] #initialize
+
+    for directory, subdirectories, files in os.walk(parent_directory):
+        subdirectories[:] = [subdirectory for subdirectory in subdirectories if not subdirectory.endswith(columnar_cache.CACHE_SUFFIX)]
+
+        if any("ColdJigRun" in file and file.endswith(".json") for file in files):
+            directories.append(directory)
+
+    return sorted(directories)
+
+def read_list_file(list_file):
+    '''
+    Read a list of module directories, one per line. Blank lines, and anything after a
+    #, are ignored.
+
+    Arguments:
+    list_file - Type = string. Path to the list file.
+
+    Returns:
+    directories - Type = list of string. The module directories, in order.
+    '''
+
+    with open(list_file, 'r') as f:
+        lines = [line.split("#")[0].strip() for line in f]
+
+    directories = [line for line in lines if line != ""]
+
+    return directories
+
+def get_log_name(directory, root):
+    '''
+    Get the name of a module's log file, from its directory.
+
+    Arguments:
+    directory - Type = string. The module directory.
+    root      - Type = string. The directory all module directories are under.
+
+    Returns:
+    log_name - Type = string. ie. week_12_20USEM40000080.log for
+               [root]/week_12/20USEM40000080.
+    '''
+
+    relative_path = os.path.relpath(os.path.abspath(directory), root)
+    if relative_path == ".": #the root itself
+        relative_path = os.path.basename(os.path.abspath(directory))
+
+    log_name = relative_path.replace(os.sep, "_") + ".log"
+
+    return log_name
+
+def plot_module(directory, settings):
+    '''
+    Make the plots for a single module, with all of its printout going to its own log
+    file. Anything that goes wrong is caught and reported, rather than stopping the
+    batch.
+
+    Arguments:
+    directory - Type = string. The module directory.
+    settings  - Type = dict. "test_types", "noise_only", "histos", "caching",
+                "page_cache", "output_dir", and "log_name".
+
+    Returns:
+    status - Type = dict. "directory", "status" ("ok" or "failed"), "seconds", "pdf"
+             (None if failed), "error" (None if ok), and "log".
+    '''
+
+    log_file = os.path.join(settings["output_dir"], "logs", settings["log_name"])
+    status   = {"directory": directory, "status": "ok", "seconds": None, "pdf": None, "error": None, "log": log_file}
+    start    = time.perf_counter()
+
+    with open(log_file, 'w') as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        try:
+            status["pdf"] = make_TC_plots.make_module_plots(directory, settings["test_types"], settings["noise_only"], settings["histos"], settings["caching"], output_dir=settings["output_dir"], page_cache=settings["page_cache"])
+
+        except Exception as error:
+            traceback.print_exc() #into the log
+            status["status"] = "failed"
+            status["error"]  = f"{type(error).__name__}: {error}"
+
+        finally:
+            import matplotlib.pyplot as plt #already imported by the plotting scripts
+
+            plt.close('all')
+            clear_document_registry() #so memory use doesn't build up over the batch
+
+    status["seconds"] = time.perf_counter() - start
+
+    return status
+
+#Where a worker process says which module it's started on, so the main process knows
+#which ones were being plotted if a worker dies (None outside of a pool)
+started_queue = None
+
+def get_failed_status(directory, log_file, error):
+    '''
+    Get the status of a module which never got to report its own (see plot_module()).
+
+    Arguments:
+    directory - Type = string. The module directory.
+    log_file  - Type = string. Path to the module's log file.
+    error     - Type = string. What went wrong.
+
+    Returns:
+    status - Type = dict. As from plot_module().
+    '''
+
+    status = {"directory": directory, "status": "failed", "seconds": 0.0, "pdf": None, "error": error, "log": log_file}
+
+    return status
+
+def init_worker(caching, started=None):
+    '''
+    Set up a worker process the same way as the main one. The plotting scripts are
+    imported once per worker, and kept for every module it makes.
+
+    Arguments:
+    caching - Type = boolean. Whether or not to write columnar caches.
+    started - Type = multiprocessing.SimpleQueue. Where to say which module has been
+              started on (None if not in a pool).
+    '''
+
+    global started_queue
+
+    set_columnar_caching(caching)
+    started_queue = started
+
+def plot_module_in_worker(n, directory, settings):
+    '''
+    plot_module(), in a worker process, saying which module it's started on first.
+
+    Arguments:
+    n         - Type = int. The module's place in the batch.
+    directory - Type = string. The module directory.
+    settings  - Type = dict. As for plot_module().
+
+    Returns:
+    status - Type = dict. From plot_module().
+    '''
+
+    started_queue.put(n)
+
+    return plot_module(directory, settings)
+
+def run_pool(indices, directories, settings_by_module, workers, caching, statuses):
+    '''
+    Plot some of the modules across a pool of worker processes, filling in (and
+    printing) their statuses as they finish. If a worker dies (ie. out of memory), the
+    pool is broken, and every module it hadn't finished is left for the caller to
+    plot again.
+
+    Arguments:
+    indices            - Type = list of int. Which modules to plot, by their place in
+                         directories.
+    directories        - Type = list of string. Every module directory in the batch.
+    settings_by_module - Type = list of dict. The settings for each module, as for
+                         plot_module().
+    workers            - Type = int. The number of worker processes.
+    caching            - Type = boolean. Whether or not to write columnar caches.
+    statuses           - Type = list of dict. Every module's status (None until it's
+                         finished), filled in here.
+
+    Returns:
+    unfinished - Type = list of int. The modules not plotted, as the pool broke.
+    suspects   - Type = list of int. Those of unfinished which were being plotted
+                 when it broke, one of which killed its worker.
+    '''
+
+    started = multiprocessing.SimpleQueue()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(caching, started)) as pool:
+        futures = {pool.submit(plot_module_in_worker, n, directories[n], settings_by_module[n]): n for n in indices}
+
+        for future in as_completed(futures):
+            n = futures[future]
+            try:
+                statuses[n] = future.result()
+            except BrokenProcessPool: #a worker died, taking every unfinished module with it
+                continue
+            except Exception as error: #ie. the status couldn't be sent back
+                log_file    = os.path.join(settings_by_module[n]["output_dir"], "logs", settings_by_module[n]["log_name"])
+                statuses[n] = get_failed_status(directories[n], log_file, f"{type(error).__name__}: {error}")
+
+            print_status(statuses[n], sum(status is not None for status in statuses), len(statuses))
+
+    started_modules = set() #initialize
+    while not started.empty():
+        started_modules.add(started.get())
+
+    unfinished = [n for n in indices if statuses[n] is None]
+    suspects   = [n for n in unfinished if n in started_modules]
+
+    return unfinished, suspects
+
+def plot_in_parallel(directories, settings_by_module, workers, caching):
+    '''
+    Plot every module across a pool of worker processes. If a worker dies, the modules
+    it could have been plotting are tried again on their own, each in a pool of one,
+    and the rest carry on in a new pool. Only a module which kills its worker on its
+    own as well is marked as failed.
+
+    Arguments:
+    directories        - Type = list of string. The module directories.
+    settings_by_module - Type = list of dict. The settings for each module, as for
+                         plot_module().
+    workers            - Type = int. The number of worker processes.
+    caching            - Type = boolean. Whether or not to write columnar caches.
+
+    Returns:
+    statuses - Type = list of dict. From plot_module(), in the order of directories.
+    '''
+
+    statuses = [None] * len(directories) #initialize
+    pending  = list(range(len(directories)))
+
+    while pending != []:
+        unfinished, suspects = run_pool(pending, directories, settings_by_module, workers, caching, statuses)
+        if unfinished == []:
+            break
+
+        suspects = suspects or unfinished #if no module had been started, the pool itself is to blame
+        print(f"{YELLOW}A worker process died. Retrying the {len(suspects)} module(s) it could have been plotting one at a time, then the other {len(unfinished) - len(suspects)} module(s) in a new pool.{RESET}")
+
+        for n in suspects:
+            if run_pool([n], directories, settings_by_module, 1, caching, statuses)[0] != []: #killed its worker again
+                log_file    = os.path.join(settings_by_module[n]["output_dir"], "logs", settings_by_module[n]["log_name"])
+                statuses[n] = get_failed_status(directories[n], log_file, "BrokenProcessPool: the worker process plotting this module died (ie. out of memory), twice.")
+                print_status(statuses[n], sum(status is not None for status in statuses), len(statuses))
+
+        pending = [n for n in unfinished if n not in suspects]
+
+    return statuses
+
+def print_status(status, done, total):
+    '''
+    Print a single module's result as soon as it's finished.
+
+    Arguments:
+    status - Type = dict. From plot_module().
+    done   - Type = int. How many modules have finished.
+    total  - Type = int. How many modules there are.
+    '''
+
+    if status["status"] == "ok":
+        print(f"{GREEN}[{done}/{total}] {status['directory']} done in {status['seconds']:.1f} s.{RESET}")
+    else:
+        print(f"{RED}[{done}/{total}] {status['directory']} failed after {status['seconds']:.1f} s ({status['error']}). See {status['log']}.{RESET}")
+
+def main():
+    '''
+    Make the TC plots for many modules at once, across a pool of worker processes, and
+    write a summary of how each one went.
+    '''
+
+    use_headless_backend() #before anything imports matplotlib, here or in the workers
+
+    #Parse arguments
+    parser = argparse.ArgumentParser(
+      description="Create TC summary plots for many modules at once.")
+    parser.add_argument("parent_directory", nargs="?",
+      help="Directory to search (at any depth) for module directories, ie. any directory with a ColdJigRun file.")
+    parser.add_argument("-l", "--list_file",
+      help="File listing module directories to plot, one per line, instead of searching a parent directory.")
+    parser.add_argument("-w", "--workers", help="Number of modules to plot at once, each in its own worker process. Default is 1.", type=int, default=1)
+    parser.add_argument("-o", "--output_dir", help="Where to write the PDFs, the logs (in logs/), and the summary. Default is the current directory.", default=".")
+    parser.add_argument("-t", "--tests",
+      help="Test types to be plotted (IV, PT, SD, 3PG, 10PG, NO, OCS). If not specified, all will be plotted.", nargs="+", default=make_TC_plots.ALL_TESTS)
+    parser.add_argument("-n", "--noise_only", help="When making the 3PG/10PG plots, only make plots for the noise, not the gain or VT50", action='store_true')
+    parser.add_argument("-hg", "--histograms", help="Make histograms with module defect information", action='store_true')
+    parser.add_argument("-c", "--cache", help="Write a columnar numpy cache next to each merged file, so re-plotting the modules skips JSON parsing", action='store_true')
+    parser.add_argument("-pc", "--page_cache", help="Keep each set of plots' pages in a cache (see make_TC_plots.py), so re-plotting the modules only remakes the pages whose inputs changed. Needs pypdf.", action='store_true')
+    args = parser.parse_args()
+
+    if (args.parent_directory is None) == (args.list_file is None):
+        parser.error("Give either a parent directory or a list file (-l), not both.")
+
+    if args.parent_directory is not None:
+        directories = find_module_directories(args.parent_directory)
+        root        = os.path.abspath(args.parent_directory)
+    else:
+        directories = read_list_file(args.list_file)
+        root        = os.path.commonpath([os.path.abspath(directory) for directory in directories]) if directories != [] else "."
+
+    os.makedirs(os.path.join(args.output_dir, "logs"), exist_ok=True)
+
+    settings = {"test_types" : args.tests,
+                "noise_only" : args.noise_only,
+                "histos"     : args.histograms,
+                "caching"    : args.cache,
+                "page_cache" : args.page_cache,
+                "output_dir" : args.output_dir}
+    settings_by_module = [dict(settings, log_name=get_log_name(directory, root)) for directory in directories]
+
+    print(f"\nPlotting {len(directories)} modules with {args.workers} worker(s)...\n")
+
+    start = time.perf_counter()
+
+    if args.workers > 1: #plot the modules in parallel, in worker processes
+        statuses = plot_in_parallel(directories, settings_by_module, args.workers, args.cache)
+
+    else: #plot them one after another
+        statuses = [None] * len(directories) #initialize, in the order of directories
+        init_worker(args.cache)
+
+        for n, directory in enumerate(directories):
+            statuses[n] = plot_module(directory, settings_by_module[n])
+            print_status(statuses[n], n + 1, len(directories))
+
+    total_seconds = time.perf_counter() - start
+    failed        = [status for status in statuses if status["status"] != "ok"]
+
+    #Write the summary
+    summary_file = os.path.join(args.output_dir, "batch_summary.json")
+    with open(summary_file, 'w') as f:
+        json.dump({"workers": args.workers, "seconds": total_seconds, "modules": statuses}, f, indent=2)
+
+    print(f"\n{'Status':<8}{'Time (s)':>10}  Module directory")
+    for status in statuses:
+        print(f"{status['status']:<8}{status['seconds']:>10.1f}  {status['directory']}")
+
+    colour = GREEN if failed == [] else RED
+    print(f"\n{colour}{len(statuses) - len(failed)} of {len(statuses)} modules plotted in {total_seconds:.1f} s. Summary written to {summary_file}.{RESET}")
+
+    sys.exit(1 if failed != [] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,616 @@
+#import libraries
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+import contextlib
+import tracemalloc
+from common_functions import *
+
+#Where this script (and make_TC_plots.py) lives
+PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def get_fixture_module(fixture):
+    '''
+    Find the module in a fixture: the component which isn't a child of any other.
+
+    Arguments:
+    fixture - Type = dict. From fake_db.read_fixture().
+
+    Returns:
+    module_sn - Type = string. The module serial number.
+    '''
+
+    children   = {child["component"]["serialNumber"] for component in fixture["components"].values() for child in component["children"] if child["component"] is not None}
+    module_sns = [serial_number for serial_number in fixture["components"] if serial_number not in children]
+
+    return module_sns[0]
+
+def time_db_fetch(fixture_file, module_sn, cache_dir, refresh, latency, error_rate, batch_size):
+    '''
+    Time a single database fetch (everything db.get_files() does) against the stand-in
+    database.
+
+    Arguments:
+    fixture_file - Type = string. The stand-in database's fixture file.
+    module_sn    - Type = string. The module to fetch.
+    cache_dir    - Type = string. The local response cache to use.
+    refresh      - Type = boolean. Whether or not to skip reading the cache.
+    latency      - Type = float. How long every request takes, in seconds.
+    error_rate   - Type = float. The chance that any request fails.
+    batch_size   - Type = int. The most test runs asked for in a single request.
+
+    Returns:
+    seconds  - Type = float. Wall time taken.
+    requests - Type = dict. {endpoint: number of requests sent to the database}.
+    '''
+
+    import fake_db
+    import ITkPDB_matters as db
+
+    fake    = fake_db.FakeClient(fixture_file, latency=latency, error_rate=error_rate, seed=0)
+    client  = db.CachedClient(fake, db.DBCache(cache_dir, refresh=refresh))
+    options = db.load_db_options({"module_sn": module_sn}, prompt=False, batch_size=batch_size)
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()): #no printout
+        db.get_files(options, client=client)
+    seconds = time.perf_counter() - start
+
+    return seconds, fake.requests
+
+def time_db_plots(fixture_file, module_sn, cache_dir, refresh, latency, error_rate, plot_args):
+    '''
+    Time a whole database mode run of make_TC_plots.py against the stand-in database,
+    in a fresh interpreter.
+
+    Arguments:
+    As for time_db_fetch(), and
+    plot_args - Type = list of string. Any other make_TC_plots.py arguments.
+
+    Returns:
+    seconds - Type = float. Wall time taken.
+    '''
+
+    env = dict(os.environ, TC_PLOTS_FAKE_DB=os.path.abspath(fixture_file), TC_PLOTS_FAKE_DB_LATENCY=str(latency), TC_PLOTS_FAKE_DB_ERROR_RATE=str(error_rate), TC_PLOTS_DB_CACHE=cache_dir)
+    command = [sys.executable, f"{PACKAGE_DIR}/make_TC_plots.py", "-db", "--no_prompt", "-sn", module_sn] + plot_args + (["--refresh"] if refresh else [])
+
+    with tempfile.TemporaryDirectory() as work_dir: #the PDF goes here
+        start = time.perf_counter()
+        subprocess.run(command, cwd=work_dir, env=env, stdout=subprocess.DEVNULL, check=True)
+        seconds = time.perf_counter() - start
+
+    return seconds
+
+def benchmark_db(args):
+    '''
+    Time the database mode against the stand-in database, with an empty local cache
+    ("cold") and a full one ("warm"), and print (and optionally save) the results.
+
+    Arguments:
+    args - Type = argparse namespace. From main().
+    '''
+
+    import fake_db
+
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        if args.fixture is not None:
+            fixture_file = args.fixture
+            module_sn    = args.serial_number or get_fixture_module(fake_db.read_fixture(fixture_file))
+        else:
+            with contextlib.redirect_stdout(io.StringIO()):
+                fixture, module_sn = fake_db.make_fixture(args.TC_directory)
+            fixture_file = f"{work_dir}/fixture.json"
+            fake_db.write_fixture(fixture, fixture_file)
+
+        print(f"\nBenchmarking database mode for {module_sn}, with {args.latency} s latency and {args.error_rate} error rate...")
+
+        results = {"module_sn": module_sn, "latency": args.latency, "error_rate": args.error_rate, "batch_size": args.batch_size, "fetch": {}, "plots": {}}
+
+        for scenario, refresh in [("cold", True), ("warm", False)]:
+            cache_dir = f"{work_dir}/cache"
+            times     = [] #initialize
+
+            for repeat in range(args.repeats):
+                if scenario == "cold":
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                seconds, requests = time_db_fetch(fixture_file, module_sn, cache_dir, refresh, args.latency, args.error_rate, args.batch_size)
+                times.append(seconds)
+
+            results["fetch"][scenario] = {"times": times, "median": statistics.median(times), "requests": requests}
+            print(f"Fetch, {scenario} cache: median {statistics.median(times):.3f} s over {args.repeats} run(s), {sum(requests.values())} requests {requests}")
+
+        if args.plots:
+            for scenario, refresh in [("cold", True), ("warm", False)]:
+                cache_dir = f"{work_dir}/cache"
+                if scenario == "cold":
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+                seconds = time_db_plots(fixture_file, module_sn, cache_dir, refresh, args.latency, args.error_rate, args.plot_args)
+
+                results["plots"][scenario] = seconds
+                print(f"make_TC_plots.py -db, {scenario} cache: {seconds:.3f} s")
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"{GREEN}Results written to {args.output}.{RESET}")
+
+#Every benchmark in the suite, in the order they're run, and what it times. RC is run
+#for both Response Curves, with and without noise_only.
+SUITE_BENCHMARKS = {"IV"                    : "IV.make_plots",
+                    "PT"                    : "PT.make_plots",
+                    "SD"                    : "SD.make_plots",
+                    "3PG"                   : "RC.make_plots (3PG)",
+                    "3PG_noise_only"        : "RC.make_plots (3PG, noise_only)",
+                    "10PG"                  : "RC.make_plots (10PG)",
+                    "10PG_noise_only"       : "RC.make_plots (10PG, noise_only)",
+                    "NO"                    : "NO.make_plots",
+                    "OCS"                   : "OCS.make_plots",
+                    "TC"                    : "TC.make_plots",
+                    "defect_plotting"       : "defect_plotting.make_plots",
+                    "make_pdf"              : "make_pdf",
+                    "import_make_TC_plots"  : "import make_TC_plots",
+                    "import_batch_TC_plots" : "import batch_TC_plots",
+                    "import_tc_report"      : "import tc_report",
+                    "import_ITkPDB_matters" : "import ITkPDB_matters"}
+#Benchmarks timing how long a module takes to import in a fresh interpreter (as every
+#run of a script, and every worker process, starts from nothing), and the module
+IMPORT_BENCHMARKS = {"import_make_TC_plots"  : "make_TC_plots",
+                     "import_batch_TC_plots" : "batch_TC_plots",
+                     "import_tc_report"      : "tc_report",
+                     "import_ITkPDB_matters" : "ITkPDB_matters"}
+#Slow imports to look out for: which of these each import benchmark pulls in is
+#reported alongside its time
+HEAVY_MODULES = ["matplotlib.pyplot", "itkdb", "PIL"]
+#Stages every benchmark is split into
+STAGES = ["import", "load", "analysis", "render"]
+#For each hybrid-level test: a results field with one entry per channel (or chip), the
+#length of the scan name suffix, and whether defects are per chip, as the plotting
+#scripts build their defect masks
+MASK_SETTINGS = {"PT"   : ("trim_away", 18, False),
+                 "SD"   : ("StrobeDelay_away", 17, True),
+                 "3PG"  : ("gain_away", 19, False),
+                 "10PG" : ("gain_away", 19, False),
+                 "NO"   : ("occupancy_mean_away", 7, True),
+                 "OCS"  : ("noise_away", 24, False)}
+#How much slower (or bigger) a result has to be, as a fraction, to count as a
+#regression in a comparison, and the smallest change (in seconds, or MiB) that counts,
+#so timing noise in very quick stages isn't flagged
+REGRESSION_THRESHOLD = 0.1
+MIN_SECONDS_CHANGE   = 0.01
+MIN_MIB_CHANGE       = 1.0
+
+class StageTimer:
+    '''
+    Adds up the wall time of each stage of a benchmark, and, if tracemalloc is
+    running, the most memory each stage needed on top of what was already in use.
+
+    Arguments:
+    memory - Type = boolean. Whether or not tracemalloc is running.
+    '''
+
+    def __init__(self, memory=False):
+
+        self.memory   = memory
+        self.seconds  = {stage: 0.0 for stage in STAGES}
+        self.peak_mib = {stage: 0.0 for stage in STAGES}
+        self.imported = None #for import benchmarks, which of HEAVY_MODULES were imported
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        '''
+        Time (and measure) everything done inside a with block as part of a stage.
+
+        Arguments:
+        name - Type = string. One of STAGES.
+        '''
+
+        if self.memory:
+            tracemalloc.reset_peak()
+            in_use = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+            if self.memory:
+                self.peak_mib[name] = max(self.peak_mib[name], (tracemalloc.get_traced_memory()[1] - in_use) / 2**20)
+
+def time_import(module):
+    '''
+    Time importing a module, and everything it imports, in a fresh interpreter, with
+    python -X importtime.
+
+    Arguments:
+    module - Type = string. The module to import (ie. "make_TC_plots").
+
+    Returns:
+    seconds  - Type = float. How long the import took, not counting starting Python.
+    imported - Type = list of string. Which of HEAVY_MODULES were imported.
+    '''
+
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=PACKAGE_DIR, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        raise RuntimeError(f"Could not import {module}: {result.stderr.strip().splitlines()[-1]}")
+
+    seconds = None
+    names   = set() #initialize, every module imported
+
+    for line in result.stderr.splitlines(): #"import time: self [us] | cumulative | name"
+        if not line.startswith("import time:") or line.count("|") != 2:
+            continue
+        cumulative, name = line.split("|")[1:]
+        names.add(name.strip())
+        if name == f" {module}": #top level, not indented
+            seconds = int(cumulative) / 1e6
+
+    imported = [heavy_module for heavy_module in HEAVY_MODULES if heavy_module in names]
+
+    return seconds, imported
+
+def get_suite_inputs(TC_directory):
+    '''
+    Find a module's files, and everything the benchmarks need to know about them.
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for a
+                   single module.
+
+    Returns:
+    inputs - Type = dict. "TC_directory"; "files", "files_by_type", and "TC_file" (as
+             from get_local_files()); and "hybrid_files", a list of each hybrid's file
+             paths.
+    '''
+
+    from render_units import get_local_files
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        files, files_by_type, TC_file = get_local_files(TC_directory)
+        hybrid_files = sort_files_by_hybrid(unsort_files({file_type: files[file_type] for file_type in ["PT", "SD", "TPG", "RC", "NO", "OCS"]}), TC_directory)
+
+    clear_document_registry() #sorting them by hybrid opened them
+
+    inputs = {"TC_directory" : TC_directory,
+              "files"        : files,
+              "files_by_type": files_by_type,
+              "TC_file"      : TC_file,
+              "hybrid_files" : [[f"{TC_directory}/{file}" for file in hybrid_files[hybrid]] for hybrid in hybrid_files]}
+
+    return inputs
+
+def analyze_file(test_type, data, TC_data):
+    '''
+    Work out everything the plotting scripts derive from a file before plotting it
+    (which scans are warm and cold, the defect index, and the defect mask), so it's
+    timed as analysis rather than rendering. Each is kept with the file, so the
+    plotting scripts use them rather than working them out again.
+
+    Arguments:
+    test_type - Type = string. IV, PT, SD, 3PG, 10PG, NO, or OCS.
+    data      - the contents of a pre-opened JSON file.
+    TC_data   - the contents of a pre-opened ColdJigRun JSON file.
+    '''
+
+    get_timeline(TC_data).sort_scans(get_scans(data))
+
+    if test_type in MASK_SETTINGS:
+        field, suffix_length, chip_level = MASK_SETTINGS[test_type]
+        get_defect_index(data)
+        get_defect_mask(data, suffix_length, len(make_one_list(data["results"][field][0])), chip_level)
+
+def run_benchmark(name, inputs, timer):
+    '''
+    Run a single benchmark once, from nothing loaded, with each stage timed.
+
+    Arguments:
+    name   - Type = string. A key of SUITE_BENCHMARKS.
+    inputs - Type = dict. From get_suite_inputs(), with "plots" (every figure for the
+             module, in page order) for make_pdf.
+    timer  - Type = StageTimer. Where the stages are added up.
+    '''
+
+    if name in IMPORT_BENCHMARKS: #in a fresh interpreter, so nothing's imported already
+        seconds, timer.imported = time_import(IMPORT_BENCHMARKS[name])
+        timer.seconds["import"] += seconds
+        return
+
+    import matplotlib
+    import matplotlib.pyplot as plt
+    import IV, PT, SD, RC, NO, OCS, TC, defect_plotting
+    from render_units import get_failed_tests
+
+    clear_document_registry()
+    test_type  = name.replace("_noise_only", "")
+    noise_only = name.endswith("_noise_only")
+
+    with contextlib.redirect_stdout(io.StringIO()), matplotlib.rc_context(): #no printout, and
+                                                                             #nothing left behind
+        if name == "make_pdf":
+            with tempfile.TemporaryDirectory() as work_dir, timer.stage("render"):
+                cwd = os.getcwd()
+                os.chdir(work_dir) #make_pdf() writes to the current directory
+                try:
+                    make_pdf(inputs["plots"], "BENCHMARK", "DATE", "0")
+                finally:
+                    os.chdir(cwd)
+
+        elif name == "TC": #needs the failed tests from every file, too
+            with timer.stage("load"):
+                TC_data = retrieve_data(inputs["TC_file"], streaming=True)
+                for file in unsort_files({file_type: inputs["files"][file_type] for file_type in inputs["files"] if file_type not in ["TC", "HVS"]}):
+                    retrieve_data(f"{inputs['TC_directory']}/{file}")
+
+            with timer.stage("analysis"):
+                get_timeline(TC_data)
+                failed_tests = get_failed_tests(inputs["files"], inputs["TC_directory"])
+
+            with timer.stage("render"):
+                TC.make_plots(TC_data, failed_tests)
+
+        else:
+            TC_data = retrieve_data(inputs["TC_file"], streaming=True) #not part of the benchmark
+            get_timeline(TC_data)
+
+            if name == "defect_plotting": #one set of histograms per hybrid
+                for hybrid_files in inputs["hybrid_files"]:
+                    with timer.stage("load"):
+                        hybrid_data = [retrieve_data(file) for file in hybrid_files]
+                    with timer.stage("analysis"):
+                        for data in hybrid_data:
+                            get_defect_index(data)
+                    with timer.stage("render"):
+                        defect_plotting.make_plots(hybrid_files, TC_data)
+
+            else: #one set of plots per file
+                modules = {"IV": IV, "PT": PT, "SD": SD, "3PG": RC, "10PG": RC, "NO": NO, "OCS": OCS}
+
+                for data_file in inputs["files_by_type"][test_type]:
+                    with timer.stage("load"):
+                        data = retrieve_data(data_file)
+                    with timer.stage("analysis"):
+                        analyze_file(test_type, data, TC_data)
+                    with timer.stage("render"):
+                        if test_type in ["3PG", "10PG"]:
+                            RC.make_plots(data, TC_data, noise_only)
+                        else:
+                            modules[test_type].make_plots(data, TC_data)
+
+    plt.close('all')
+
+def benchmark_suite(args):
+    '''
+    Time every plotting script, and make_pdf(), on a module (synthetic, unless a
+    directory is given), with load, analysis, and render time reported separately, and
+    measure the peak memory of each stage. Print (and optionally save) the results.
+
+    Arguments:
+    args - Type = argparse namespace. From main().
+    '''
+
+    import numpy
+    import matplotlib
+    import make_synthetic_TC
+    from render_units import ALL_TESTS, get_render_units, render_unit
+
+    names = args.benchmarks or list(SUITE_BENCHMARKS)
+    for name in names:
+        if name not in SUITE_BENCHMARKS:
+            sys.exit(f"{RED}Unknown benchmark {name}. Choose from: {', '.join(SUITE_BENCHMARKS)}.{RESET}")
+
+    work_dir = tempfile.mkdtemp()
+
+    try:
+        if args.TC_directory is not None:
+            TC_directory = args.TC_directory
+            module       = {"directory": os.path.abspath(TC_directory)}
+        else:
+            TC_directory = f"{work_dir}/module"
+            module       = {"hybrids": args.hybrids, "chips": args.chips, "cycles": args.cycles, "defect_rate": args.defect_rate, "env_rate": args.env_rate, "seed": args.seed}
+            print(f"\nMaking a synthetic module ({args.hybrids} hybrids, {args.chips} ABCs per hybrid, {args.cycles} cycles)...")
+            make_synthetic_TC.make_module(TC_directory, args.hybrids, args.chips, args.cycles, args.defect_rate, args.env_rate, seed=args.seed)
+
+        inputs  = get_suite_inputs(TC_directory)
+        results = {"module"      : module,
+                   "repeats"     : args.repeats,
+                   "environment" : {"python": sys.version.split()[0], "numpy": numpy.__version__, "matplotlib": matplotlib.__version__},
+                   "benchmarks"  : {}}
+
+        if "make_pdf" in names: #every figure, made ahead of time
+            with contextlib.redirect_stdout(io.StringIO()):
+                settings        = {"TC_file": inputs["TC_file"], "TC_directory": TC_directory, "files": inputs["files"], "noise_only": False}
+                inputs["plots"] = make_one_list([render_unit(unit_type, data_file, settings) for unit_type, data_file in get_render_units(inputs["files_by_type"], ALL_TESTS, True)])
+
+        print(f"\n{'Benchmark':<34}{'Import (s)':>12}{'Load (s)':>10}{'Analysis (s)':>14}{'Render (s)':>12}{'Total (s)':>11}{'Peak (MiB)':>12}")
+
+        for name in names:
+            times = {stage: [] for stage in STAGES + ["total"]}
+
+            for repeat in range(args.repeats):
+                timer = StageTimer()
+                run_benchmark(name, inputs, timer)
+                for stage in STAGES:
+                    times[stage].append(timer.seconds[stage])
+                times["total"].append(sum(timer.seconds.values()))
+
+            result = {"seconds": {stage: statistics.median(times[stage]) for stage in times}, "times": times}
+
+            if name in IMPORT_BENCHMARKS:
+                result["imported"] = timer.imported
+
+            elif args.memory: #once more, measuring memory, which slows everything down
+                timer = StageTimer(memory=True)
+                tracemalloc.start()
+                try:
+                    run_benchmark(name, inputs, timer)
+                finally:
+                    tracemalloc.stop()
+                result["peak_mib"] = dict(timer.peak_mib, total=max(timer.peak_mib.values()))
+
+            results["benchmarks"][SUITE_BENCHMARKS[name]] = result
+
+            seconds = result["seconds"]
+            peak    = f"{result['peak_mib']['total']:.1f}" if "peak_mib" in result else "-"
+            print(f"{SUITE_BENCHMARKS[name]:<34}{seconds['import']:>12.3f}{seconds['load']:>10.3f}{seconds['analysis']:>14.3f}{seconds['render']:>12.3f}{seconds['total']:>11.3f}{peak:>12}")
+
+        inputs.pop("plots", None)
+        clear_document_registry()
+
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\nMedian of {args.repeats} run(s). Peak memory is the most any stage needed on top of what was already in use.")
+
+    for label, result in results["benchmarks"].items():
+        if "imported" in result:
+            print(f"{label} pulls in {', '.join(result['imported']) if result['imported'] != [] else 'none of ' + ', '.join(HEAVY_MODULES)}.")
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"{GREEN}Results written to {args.output}.{RESET}")
+
+def compare_results(old_results, new_results, threshold=REGRESSION_THRESHOLD):
+    '''
+    Compare two sets of suite results, stage by stage.
+
+    Arguments:
+    old_results, new_results - Type = dict. From benchmark_suite().
+    threshold                - Type = float. How much bigger (as a fraction) a time
+                               or peak memory has to be to count as a regression.
+
+    Returns:
+    rows - Type = list of dict. "benchmark", "stage", "measure" ("seconds" or
+           "peak_mib"), "old", "new", "change" (as a fraction), and "status"
+           ("regression", "improvement", or "same"), for everything in both.
+    '''
+
+    rows = [] #initialize
+
+    for benchmark in new_results["benchmarks"]:
+        if benchmark not in old_results["benchmarks"]:
+            continue
+
+        for measure, min_change in [("seconds", MIN_SECONDS_CHANGE), ("peak_mib", MIN_MIB_CHANGE)]:
+            old_values = old_results["benchmarks"][benchmark].get(measure, {})
+            new_values = new_results["benchmarks"][benchmark].get(measure, {})
+
+            for stage in STAGES + ["total"]:
+                if stage not in old_values or stage not in new_values:
+                    continue #ie. memory wasn't measured
+
+                old, new = old_values[stage], new_values[stage]
+                change   = (new - old) / old if old > 0 else 0.0
+
+                if abs(new - old) < min_change or abs(change) <= threshold:
+                    status = "same"
+                else:
+                    status = "regression" if new > old else "improvement"
+
+                rows.append({"benchmark": benchmark, "stage": stage, "measure": measure, "old": old, "new": new, "change": change, "status": status})
+
+    return rows
+
+def benchmark_compare(args):
+    '''
+    Compare two suite results files, print every stage side by side, and exit with an
+    error if anything got slower (or bigger) by more than the threshold.
+
+    Arguments:
+    args - Type = argparse namespace. From main().
+    '''
+
+    with open(args.old, 'r') as f:
+        old_results = json.load(f)
+    with open(args.new, 'r') as f:
+        new_results = json.load(f)
+
+    if old_results["module"] != new_results["module"]:
+        print(f"{YELLOW}The two results are for different modules, so may not be comparable.{RESET}")
+    if old_results["environment"] != new_results["environment"]:
+        print(f"{YELLOW}The two results were made with different versions: {old_results['environment']} and {new_results['environment']}.{RESET}")
+
+    rows    = compare_results(old_results, new_results, args.threshold)
+    colours = {"regression": RED, "improvement": GREEN, "same": ""}
+    units   = {"seconds": "s", "peak_mib": "MiB"}
+
+    print(f"\n{'Benchmark':<34}{'Stage':<10}{'Old':>10}{'New':>10}{'Change':>9}")
+    for row in rows:
+        if row["status"] == "same" and not args.all:
+            continue
+        print(f"{colours[row['status']]}{row['benchmark']:<34}{row['stage']:<10}{row['old']:>8.3f}{units[row['measure']]:<2}{row['new']:>8.3f}{units[row['measure']]:<2}{row['change']:>+9.0%}{RESET}")
+
+    regressions = [row for row in rows if row["status"] == "regression"]
+
+    if regressions == []:
+        print(f"\n{GREEN}No regressions (over {args.threshold:.0%}).{RESET}")
+    else:
+        print(f"\n{RED}{len(regressions)} regression(s) (over {args.threshold:.0%}).{RESET}")
+        sys.exit(1)
+
+def main():
+    '''
+    Benchmark the plotting scripts.
+    '''
+
+    use_headless_backend() #before anything imports matplotlib
+
+    parser = argparse.ArgumentParser(
+      description="Benchmark the TC plotting scripts.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    db_parser = subparsers.add_parser("db",
+      help="Time the database mode against the stand-in database in fake_db.py, without credentials or a network.")
+    db_input = db_parser.add_mutually_exclusive_group(required=True)
+    db_input.add_argument("-f", "--fixture", help="Fixture file for the stand-in database (see fake_db.py).")
+    db_input.add_argument("-d", "--TC_directory", help="Directory of merged TC results for a single module, to make a fixture from.")
+    db_parser.add_argument("-sn", "--serial_number", help="With -f, the module to fetch. Default is the fixture's only module.")
+    db_parser.add_argument("--latency", help="How long every request takes, in seconds. Default is 0.1.", type=float, default=0.1)
+    db_parser.add_argument("--error_rate", help="The chance (0 to 1) that any request fails with a dropped connection. Default is 0.", type=float, default=0.0)
+    db_parser.add_argument("--batch_size", help="The most test runs asked for in a single request. Default is 20.", type=positive_int, default=20)
+    db_parser.add_argument("-r", "--repeats", help="How many times to time each fetch. Default is 3.", type=int, default=3)
+    db_parser.add_argument("-p", "--plots", help="Also time whole make_TC_plots.py -db runs.", action='store_true')
+    db_parser.add_argument("--plot_args", help="With -p, any other make_TC_plots.py arguments, as one string (ie. \"-hg -j 4\").", type=str.split, default=[])
+    db_parser.add_argument("-o", "--output", help="Write the results to this JSON file.")
+    db_parser.set_defaults(run=benchmark_db)
+
+    suite_parser = subparsers.add_parser("suite",
+      help="Time every plotting script, and make_pdf(), with load, analysis, and render time (and peak memory) reported separately.")
+    suite_parser.add_argument("-d", "--TC_directory", help="Directory of merged TC results for a single module to use. Default is a synthetic module (see make_synthetic_TC.py).")
+    suite_parser.add_argument("--hybrids", help="Without -d, number of hybrids on the synthetic module. Default is 2.", type=int, default=2)
+    suite_parser.add_argument("--chips", help="Without -d, number of ABCs per hybrid. Default is 10.", type=int, default=10)
+    suite_parser.add_argument("--cycles", help="Without -d, number of thermal cycles. Default is 2.", type=int, default=2)
+    suite_parser.add_argument("--defect_rate", help="Without -d, chance of any channel being flagged by each scan. Default is 0.002.", type=float, default=0.002)
+    suite_parser.add_argument("--env_rate", help="Without -d, environmental readings per second. Default is 0.2.", type=float, default=0.2)
+    suite_parser.add_argument("--seed", help="Without -d, random seed for the synthetic module. Default is 0.", type=int, default=0)
+    suite_parser.add_argument("-b", "--benchmarks", help=f"Benchmarks to run. Default is all of them: {', '.join(SUITE_BENCHMARKS)}.", nargs="+")
+    suite_parser.add_argument("-r", "--repeats", help="How many times to time each benchmark. Default is 3.", type=int, default=3)
+    suite_parser.add_argument("--no_memory", help="Don't measure peak memory (which takes one extra, slower, run of each benchmark).", dest="memory", action='store_false')
+    suite_parser.add_argument("-o", "--output", help="Write the results to this JSON file.")
+    suite_parser.set_defaults(run=benchmark_suite)
+
+    compare_parser = subparsers.add_parser("compare",
+      help="Compare two suite results files, and exit with an error if anything got slower or bigger.")
+    compare_parser.add_argument("old", help="Results file to compare against (ie. from before a change).")
+    compare_parser.add_argument("new", help="Results file to compare.")
+    compare_parser.add_argument("--threshold", help=f"How much slower or bigger (as a fraction) counts as a regression. Default is {REGRESSION_THRESHOLD}.", type=float, default=REGRESSION_THRESHOLD)
+    compare_parser.add_argument("-a", "--all", help="Show every stage, not just the ones that changed.", action='store_true')
+    compare_parser.set_defaults(run=benchmark_compare)
+
+    args = parser.parse_args()
+    args.run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#import libraries
+import numpy as np
+
+try: #ijson is optional; without it, ColdJigRun files are read with json.load()
+    import ijson
+except ImportError:
+    ijson = None
+
+#Where the environmental time series live in a ColdJigRun JSON
+ENV_PREFIX = "results.environmental_data"
+
+def stream_TC_data(TC_file):
+    '''
+    Read a ColdJigRun JSON in a single streaming pass. Every environmental_data time
+    series (timestamps, DP*, thermometer*, etc.) is written directly into a float64
+    array as it is parsed, and everything else (ColdJig_History, summary, component,
+    date, runNumber...) is built up as normal in the same pass. The time series never
+    exist as Python lists, so peak memory for multi-day runs is a fraction of what
+    json.load() needs.
+
+    Arguments:
+    TC_file - Type = string. Path to a ColdJigRun JSON.
+
+    Returns:
+    TC_data - Type = dict. The same dictionary json.load() would give, except each
+              environmental_data field is a numpy array.
+    '''
+
+    builder = ijson.ObjectBuilder() #builds everything but the time series
+    series  = {} #initialize, {field: array}
+
+    with open(TC_file, 'rb') as f:
+        events = ijson.parse(f, use_float=True)
+
+        for prefix, event, value in events:
+
+            #If this is the start of an environmental_data time series, read the whole
+            #series into an array, leaving a placeholder in the dictionary.
+            if event == "start_array" and prefix.startswith(f"{ENV_PREFIX}.") and "." not in prefix[len(ENV_PREFIX) + 1:]:
+                field = prefix[len(ENV_PREFIX) + 1:] #ie. timestamps
+                series[field] = np.fromiter(read_numbers(events, prefix), dtype=np.float64)
+                builder.event("null", None)
+
+            else:
+                builder.event(event, value)
+
+    TC_data = builder.value
+
+    for field in series:
+        TC_data["results"]["environmental_data"][field] = series[field]
+
+    return TC_data
+
+def read_numbers(events, prefix):
+    '''
+    Yield the numbers in a flat JSON array from an ijson event stream, stopping at the
+    end of the array. Missing readings (null) become nan.
+
+    Arguments:
+    events - Type = iterator. ijson.parse() events, just after a start_array.
+    prefix - Type = string. The prefix of the array, for error messages.
+
+    Yields:
+    value - Type = float. Each reading in the array.
+    '''
+
+    for item_prefix, event, value in events:
+        if event == "number":
+            yield value
+        elif event == "end_array":
+            return
+        elif event == "null": #missing reading
+            yield np.nan
+        else: #not a flat list of numbers
+            raise ValueError(f"Unexpected {event} in {prefix}!")
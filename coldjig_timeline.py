@@ -0,0 +1,140 @@
+#Words in a section name marking it as warm, cold, relevant to the tests, or not
+WARM_WORDS    = ["WARM", "PRE_TC", "POST_TC", "TC_END", "ROOM_TEMPERATURE", "TC_START"]
+COLD_WORDS    = ["COLD", "COOLDOWN"]
+VALID_WORDS   = ["TEST", "IV", "HV", "OPEN"]
+INVALID_WORDS = ["COOLDOWN", "WARMUP", "TC_START", "ROOM_TEMPERATURE", "TURN_ON", "TC_END"]
+
+def section_is_valid(section):
+    '''
+    Determine if a testing section is associated with electrical tests, from its name.
+
+    Arguments:
+    section - Type = string. Name of a single testing section (such as
+              41_TC_WARM_TEST_4).
+
+    Returns:
+    valid - Type = boolean, or None if the section name isn't recognized.
+    '''
+
+    if any(word in section for word in VALID_WORDS):
+        valid = True
+    elif any(word in section for word in INVALID_WORDS):
+        valid = False
+    else:
+        valid = None #unrecognized
+
+    return valid
+
+class ColdJigTimeline:
+    '''
+    Every testing section in a ColdJigRun file, flagged warm or cold and valid or not,
+    along with the section each scan was taken in. Everything is worked out once when
+    the timeline is made, so sorting scans or sections afterwards is just dictionary
+    and set lookups.
+
+    Arguments:
+    TC_data - the contents of a pre-opened ColdJigRun JSON file.
+    '''
+
+    def __init__(self, TC_data):
+
+        history = TC_data["properties"]["ColdJig_History"] #all test sections
+
+        self.sections      = list(history)
+        self.cold          = {} #initialize, {section: True, False, or None if unknown}
+        self.valid         = {section: section_is_valid(section) for section in history}
+        self.scan_sections = {} #{scan: [sections it was taken in]}
+        self.cold_scans    = [] #cold scans, in the order they were taken
+
+#Because the name of the last cold IV doesn't have a name that is easily identifiable
+#as cold, anything starting within 100 seconds of the end of the final cool down is
+#assumed to be cold.
+        cooldowns    = [section for section in history if "COOLDOWN" in section]
+        cooldown_end = history[cooldowns[-1]]["stop_time"] if cooldowns else None
+
+        for section in history:
+
+            if any(word in section for word in WARM_WORDS):
+                self.cold[section] = False
+            elif any(word in section for word in COLD_WORDS):
+                self.cold[section] = True
+            elif cooldown_end is not None and abs(history[section]["start_time"] - cooldown_end) < 100:
+                self.cold[section] = True #last cold IV
+            else:
+                self.cold[section] = None #could not be flagged
+
+            try:
+                scans = history[section]["itsdaq_test_info"]["all_tests"]
+            except (KeyError, TypeError): #no tests in this section
+                scans = []
+
+            for scan in scans:
+                self.scan_sections.setdefault(scan, []).append(section)
+                if self.cold[section]:
+                    self.cold_scans.append(scan)
+
+    def is_cold(self, section):
+        '''
+        Whether or not a testing section was performed cold.
+
+        Arguments:
+        section - Type = string. The name of the testing section of interest.
+
+        Returns:
+        cold - Type = boolean, or None if the section could not be flagged.
+        '''
+
+        cold = self.cold.get(section)
+
+        return cold
+
+    def unflagged_sections(self, scans):
+        '''
+        Get the sections which could not be flagged warm or cold that each of the
+        given scans was taken in.
+
+        Arguments:
+        scans - Type = list of string. The scans of interest.
+
+        Returns:
+        sections - Type = list of string. One entry per scan, per section it was taken
+                   in, with repeats.
+        '''
+
+        sections = [section for scan in scans for section in self.scan_sections.get(scan, []) if self.cold[section] is None]
+
+        return sections
+
+    def sort_scans(self, scans):
+        '''
+        Sort a list of scans by the temperature at which they were taken. Cold scans
+        are in the order they were taken; anything not cold is warm.
+
+        Arguments:
+        scans - Type = list of string. List of scans to be sorted.
+
+        Returns:
+        warm_scans - Type = list of string. List of warm scans.
+        cold_scans - Type = list of string. List of cold scans.
+        '''
+
+        scan_set   = set(scans)
+        cold_scans = [scan for scan in self.cold_scans if scan in scan_set]
+        cold_set   = set(cold_scans)
+        warm_scans = [scan for scan in scans if scan not in cold_set]
+
+        return warm_scans, cold_scans
+
+    def sort_sections(self):
+        '''
+        Sort the testing sections by temperature, leaving out the irrelevant sections.
+
+        Returns:
+        valid_warm_sections - Type = list of string. All relevent warm testing sections.
+        valid_cold_sections - Type = list of string. All relevent cold testing sections.
+        '''
+
+        valid_warm_sections = [section for section in self.sections if self.valid[section] and not self.cold[section]]
+        valid_cold_sections = [section for section in self.sections if self.valid[section] and self.cold[section]]
+
+        return valid_warm_sections, valid_cold_sections
@@ -0,0 +1,259 @@
+#import libraries
+import numpy as np
+import os
+import json
+import shutil
+import argparse
+
+#Sidecar directory written next to each merged JSON (ie. X.json -> X.npycache/)
+CACHE_SUFFIX = ".npycache"
+#Name of the file inside the sidecar holding everything that isn't an array
+META_NAME    = "meta.json"
+
+def get_cache_path(data_file):
+    '''
+    Get the path of the columnar cache sidecar associated with a merged JSON file.
+
+    Arguments:
+    data_file - Type = string. Path to a merged JSON file.
+
+    Returns:
+    cache_path - Type = string. Path to the sidecar directory.
+    '''
+
+    cache_path = os.path.splitext(os.path.abspath(data_file))[0] + CACHE_SUFFIX
+
+    return cache_path
+
+def cache_is_fresh(data_file):
+    '''
+    Determine whether a merged JSON file has a complete columnar cache which was
+    written after the JSON was last modified.
+
+    Arguments:
+    data_file - Type = string. Path to a merged JSON file.
+
+    Returns:
+    boolean - Whether or not the cache can be used in place of the JSON.
+    '''
+
+    meta_file = f"{get_cache_path(data_file)}/{META_NAME}" #written last, so marks a
+                                                          #complete cache
+    try:
+        return os.path.getmtime(meta_file) >= os.path.getmtime(data_file)
+    except OSError: #no cache (or no JSON)
+        return False
+
+def to_array(value):
+    '''
+    Convert a list from a merged file's results into a float64 array, with one row
+    per scan. Lists of lists with different lengths (ie. IVs which stopped early) are
+    padded with nan. Anything nested deeper than (scan, channel) is flattened per scan,
+    the same way make_one_list() does.
+
+    Arguments:
+    value - Type = any. A single entry from a merged file's results.
+
+    Returns:
+    array - Type = numpy array, or None if the value isn't purely numeric.
+    '''
+
+    if type(value) is np.ndarray: #already an array (ie. streamed environmental data)
+        array = value
+
+    elif type(value) is not list or len(value) == 0:
+        return None #not a list, nothing to gain
+
+    else:
+        array = to_rectangular(value)
+        if array is None:
+            return None
+
+    if array.dtype.kind not in "iuf": #strings, bools, None, etc. stay in the JSON
+        return None
+
+    array = array.astype(np.float64)
+
+    if array.ndim > 2: #one row per scan
+        array = array.reshape(len(array), -1)
+
+    return array
+
+def to_rectangular(value):
+    '''
+    Convert a list to a numpy array, padding ragged lists of lists with nan.
+
+    Arguments:
+    value - Type = list. A single entry from a merged file's results.
+
+    Returns:
+    array - Type = numpy array, or None if the lists can't be padded.
+    '''
+
+    try:
+        array = np.asarray(value)
+
+    except ValueError: #ragged, try padding each scan to the same length
+        if not all(type(row) is list for row in value):
+            return None
+        array = np.full((len(value), max(len(row) for row in value)), np.nan)
+        for n,row in enumerate(value):
+            try:
+                array[n, :len(row)] = row
+            except (TypeError, ValueError): #not numbers
+                return None
+
+    return array
+
+def split_results(results, path, arrays):
+    '''
+    Walk through a results dictionary, moving every numeric list into arrays and
+    leaving None in its place, so the remaining dictionary keeps its key order.
+
+    Arguments:
+    results - Type = dict. A (copy of a) results dictionary, modified in place.
+    path    - Type = list of string. Keys leading to results in the full document.
+    arrays  - Type = dict. Filled with {file name: (path to field, array)}.
+    '''
+
+    for field in results:
+        value = results[field]
+
+        if type(value) is dict: #ie. environmental_data
+            split_results(value, path + [field], arrays)
+            continue
+
+        array = to_array(value)
+
+        if array is not None:
+            field_path = path + [field]
+            file_name  = ".".join(field_path).replace(os.sep, "_") + ".npy"
+            arrays[file_name] = (field_path, array)
+            results[field] = None #placeholder, filled back in when loading
+
+def copy_dicts(results):
+    '''
+    Copy a (possibly nested) results dictionary, without copying the data inside.
+
+    Arguments:
+    results - Type = dict. The dictionary to copy.
+
+    Returns:
+    copied - Type = dict. The copy.
+    '''
+
+    copied = {field: copy_dicts(results[field]) if type(results[field]) is dict else results[field] for field in results}
+
+    return copied
+
+def write_cache(data_file, data=None):
+    '''
+    Write the columnar cache for a merged JSON file. Every numeric list in the file's
+    results becomes its own .npy file in the sidecar directory, and everything else
+    goes into a much smaller JSON alongside them.
+
+    Arguments:
+    data_file - Type = string. Path to a merged JSON file.
+    data      - Type = dict. The contents of data_file, if they are already loaded.
+
+    Returns:
+    cache_path - Type = string. Path to the sidecar directory.
+    '''
+
+    if data is None:
+        with open(data_file, 'r') as f:
+            data = json.load(f)
+
+    meta = dict(data) #shallow copy, so the caller's data is left alone
+    meta["results"] = copy_dicts(data.get("results", {}))
+    arrays = {} #initialize
+    split_results(meta["results"], ["results"], arrays)
+    meta["columnar_fields"] = {file_name: arrays[file_name][0] for file_name in arrays}
+
+#Write to a temporary directory first, then swap it into place, so a reader never
+#sees a half-written cache.
+    cache_path = get_cache_path(data_file)
+    temp_path  = f"{cache_path}.tmp{os.getpid()}"
+    os.makedirs(temp_path, exist_ok=True)
+
+    for file_name in arrays:
+        np.save(f"{temp_path}/{file_name}", arrays[file_name][1])
+
+    with open(f"{temp_path}/{META_NAME}", 'w') as f:
+        json.dump(meta, f)
+
+    if os.path.isdir(cache_path):
+        shutil.rmtree(cache_path, ignore_errors=True)
+    os.replace(temp_path, cache_path)
+
+    return cache_path
+
+def load_cache(data_file):
+    '''
+    Load a merged file from its columnar cache. Numeric results come back as numpy
+    arrays rather than nested lists; everything else is as in the JSON. The arrays are
+    read-only memory maps of the .npy files, so nothing is read from disk until it is
+    used, and indexing a single scan (ie. results["trim_away"][n]) is a view rather
+    than a copy. Memory use therefore scales with the scans being plotted, not with
+    the length of the campaign.
+
+    Arguments:
+    data_file - Type = string. Path to a merged JSON file.
+
+    Returns:
+    data - Type = dict. The data dictionary, or None if there is no up-to-date cache.
+    '''
+
+    if not cache_is_fresh(data_file):
+        return None
+
+    cache_path = get_cache_path(data_file)
+
+    with open(f"{cache_path}/{META_NAME}", 'r') as f:
+        data = json.load(f)
+
+    columnar_fields = data.pop("columnar_fields")
+
+#Put each array back where it came from
+    for file_name in columnar_fields:
+        *parents, field = columnar_fields[file_name]
+        container = data
+        for key in parents:
+            container = container[key]
+        container[field] = np.load(f"{cache_path}/{file_name}", mmap_mode='r')
+
+    return data
+
+def convert_directory(directory):
+    '''
+    Write the columnar cache for every merged file in a TC directory.
+
+    Arguments:
+    directory - Type = string. The directory containing the merged TC files.
+
+    Returns:
+    converted - Type = list of string. The files which were converted.
+    '''
+
+    from common_functions import fetch_files, unsort_files #only needed from the CLI
+
+    converted = [] #initialize
+
+    for file in unsort_files(fetch_files(directory)):
+        data_file = f"{directory}/{file}"
+        if not cache_is_fresh(data_file):
+            write_cache(data_file)
+            converted.append(file)
+
+    return converted
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+      description="Convert merged TC results into columnar numpy caches, so they load faster when plotting.")
+    parser.add_argument("-d", "--TC_directory", required=True,
+      help="Directory containing all merged TC results for a single module.")
+    args = parser.parse_args()
+
+    converted = convert_directory(args.TC_directory)
+    print(f"Converted {len(converted)} file(s).")
@@ -2,8 +2,12 @@
 import numpy as np
 import os
 import json
-from matplotlib.backends.backend_pdf import PdfPages
 import pprint
+import columnar_cache
+import coldjig_stream
+import profiler
+from defect_index import DefectIndex
+from coldjig_timeline import ColdJigTimeline
 
 def get_component(data):
     '''
@@ -39,6 +43,7 @@ def get_scans(data):
 
     return scans
 
+@profiler.profiled("analysis")
 def sort_scan_temp(scans, TC_data):
     '''
     Given a list of scans, sort them based on the temperature at which they were
@@ -53,55 +58,38 @@ def sort_scan_temp(scans, TC_data):
     cold_scans - Type = list of string. List of cold scans.
     '''
 
-    tests = TC_data["properties"]["ColdJig_History"] #all test sections
-    warm_scans = [] #initialize
-    cold_scans = []
+    timeline = get_timeline(TC_data) #every section and scan, flagged warm or cold
 
-#For each test section, get a list of all scans performed. Iterate through the scans,
-#and for each scan, see if it matches an item in the list of scans passed to the
-#function. If it does and is associated with a cold section, append it to cold_scans.
-    for test in tests:
-
-        try:
-            all_scans = tests[test]["itsdaq_test_info"]["all_tests"]
-
-        except:
-            all_scans = []
-
-        for scan in all_scans:
-
-            if scan in scans and test_is_cold(test, tests):
-                cold_scans.append(scan)
+    for test in timeline.unflagged_sections(scans):
+        print(f"{YELLOW}Test {test} could not be flagged as warm or cold!{RESET}")
 
 #If the scan isn't cold, it must be warm
-    for scan in scans:
-
-        if scan not in cold_scans:
-            warm_scans.append(scan)
+    warm_scans, cold_scans = timeline.sort_scans(scans)
 
     return warm_scans, cold_scans
 
-def test_is_cold(test, tests):
+def get_timeline(TC_data):
     '''
-    Determine if a testing section was performed cold.
+    Get the ColdJigTimeline for a ColdJigRun file, building it the first time it is
+    asked for.
 
     Arguments:
-    test  - Type = string. The name of the testing section of interest.
-    tests - Type = list of string. All testing sections from thermal cycling.
+    TC_data - the contents of a pre-opened ColdJigRun JSON file.
 
     Returns:
-    boolean - Whether or not the testing section was performed cold.
+    timeline - Type = ColdJigTimeline. Every testing section, flagged warm or cold and
+               valid or not, and the sections each scan was taken in.
     '''
 
-    if "WARM" in test or "PRE_TC" in test or "POST_TC" in test or "TC_END" in test or "ROOM_TEMPERATURE" in test or "TC_START" in test:
-        return False #test was warm
+    derived = get_derived(TC_data)
 
-    elif "COLD" in test or "COOLDOWN" in test or last_cold_test(test, tests):
-        return True #test was cold
+    if "timeline" not in derived:
+        with profiler.span("ColdJigTimeline", "analysis"):
+            derived["timeline"] = ColdJigTimeline(TC_data)
 
+    timeline = derived["timeline"]
 
-    else:
-        print(f"{YELLOW}Test {test} could not be flagged as warm or cold!{RESET}")
+    return timeline
 
 def fetch_files(directory):
     '''
@@ -121,7 +109,10 @@ def fetch_files(directory):
     valid_files = [] #initialize
 #Filter out any files that are not relevent to make_TC_plots.py
     for file in files:
-        if ("TC" in file or "ColdJigRun" in file or "HVSTABILITY" in file) and file[-4:] == "json":
+        if file.endswith(columnar_cache.CACHE_SUFFIX):
+            continue #columnar cache, not a merged file
+
+        elif ("TC" in file or "ColdJigRun" in file or "HVSTABILITY" in file) and file[-4:] == "json":
             valid_files.append(file) #relevent files
 
         else:
@@ -169,55 +160,19 @@ def fetch_files(directory):
 
     return sorted_files
 
-def last_cold_test(test, tests):
-    '''
-    Because the name of the last cold IV doesn't have a name that is easily
-    identifiable as cold, this function compares the end time of the final cool down
-    with the start time of the IV. If it is less than 100 seconds, it assumes the IV
-    is cold.
-
-    Arguments:
-    test  - Type = string. Testing section of interest.
-    tests - Type = list of string. List of all testing sections from thermal cycling.
-
-    Returns:
-    boolean - Whether or not the given test is the last cold IV.
-    '''
-
-    test_start = tests[test]["start_time"] #start time of the given test section
-
-#Get the name of the last cooldown
-    for test_name in tests:
-        if "COOLDOWN" in test_name:
-            last_cooldown_name = test_name
-
-    cooldown_end = tests[last_cooldown_name]["stop_time"] #end time of last cooldown
-#If the test of interest starts within 100 seconds of the end of the last cooldown,
-#assume this is the last cold IV.
-
-    if abs(test_start - cooldown_end) < 100:
-        return True
-
-    else:
-        return False
-
 def fetch_failed_tests(file):
     '''
     Retrieve a list of all failed tests in a given file.
 
     Arguments:
-    file - Type = string. The name of the JSON file to retrieve failed tests for.
+    file - Type = string or dict. The path to the JSON file to retrieve failed tests
+           for, or a data dictionary from the database.
 
     Returns:
     failed_tests - Type = list of string. A list of all failed tests in that file.
     '''
 
-    if type(file) is dict: #if the file is already opened
-        data = file
-
-    else:
-        with open(file, 'r') as f: #open the file
-            data = json.load(f)
+    data = retrieve_data(file) #shared with the plotting scripts, so parsed only once
 
     try:
         failed_tests = data["properties"]["itsdaq_test_info"]["failed_tests"]
@@ -271,6 +226,170 @@ def get_defects(data):
 
     return defects
 
+@profiler.profiled("analysis")
+def get_defect_mask(data, suffix_length, n_units, chip_level=False):
+    '''
+    Make a boolean mask of which channels (or chips) are associated with a defect, for
+    every scan and stream in a file, at once. Single-channel defects are all set in a
+    single indexing operation, and channel_from/channel_to ranges and whole-chip
+    defects (chip_in_histo, 128 channels per ABC) are each a single slice. The mask is
+    only built once per file; later calls return the same array.
+
+    Arguments:
+    data          - the contents of a pre-opened JSON file.
+    suffix_length - Type = int. How many characters of a scan name follow the
+                    runNumber (ie. 18 for the Pedestal Trim, where the runNumber is
+                    scan[:-18]).
+    n_units       - Type = int. The number of channels (or chips) per stream.
+    chip_level    - Type = boolean. True if the test's results are per chip (SD, NO),
+                    so defects are marked by chip_in_histo alone.
+
+    Returns:
+    mask - Type = numpy array of bool, shape (scan, stream, channel). True where the
+           channel is defective. Streams are ordered as in STREAMS.
+    '''
+
+    key = ("defect_mask", suffix_length, n_units, chip_level)
+    if key in get_derived(data):
+        return get_derived(data)[key]
+
+    scans        = get_scans(data)
+    defect_index = get_defect_index(data)
+    mask         = np.zeros((len(scans), len(STREAMS), n_units), dtype=bool) #initialize
+
+    single_scans   = [] #scan, stream, and channel of every single-channel defect
+    single_streams = []
+    single_units   = []
+
+#Only the defects for each scan and stream are looked at
+    for scan_number, scan in enumerate(scans):
+        for stream_number, stream in enumerate(STREAMS):
+            for defect in defect_index.lookup(run_number=scan[:-suffix_length], stream=stream):
+                mark_defect(mask, defect, scan_number, stream_number, chip_level, single_scans, single_streams, single_units)
+
+    single_units = np.asarray(single_units, dtype=int)
+    in_range     = (single_units >= 0) & (single_units < n_units) #ignore nonsense
+    mask[np.asarray(single_scans, dtype=int)[in_range], np.asarray(single_streams, dtype=int)[in_range], single_units[in_range]] = True
+
+    get_derived(data)[key] = mask
+
+    return mask
+
+def mark_defect(mask, defect, scan_number, stream_number, chip_level, single_scans, single_streams, single_units):
+    '''
+    Mark a single defect in a defect mask. Ranges and whole chips are marked straight
+    away, with a slice; single channels (or chips) are collected, so they can all be
+    marked together.
+
+    Arguments:
+    mask           - Type = numpy array of bool. The defect mask, modified in place.
+    defect         - Type = dict. The defect to mark.
+    scan_number    - Type = int. Index of the scan the defect belongs to.
+    stream_number  - Type = int. Index (in STREAMS) of the defect's stream.
+    chip_level     - Type = boolean. True if the defect is marked by chip alone.
+    single_scans   - Type = list of int. Scan indices of single-channel defects.
+    single_streams - Type = list of int. Stream indices of single-channel defects.
+    single_units   - Type = list of int. Channels (or chips) of single-channel defects.
+    '''
+
+    properties = defect["properties"]
+
+    if chip_level: #the chip is the unit
+        single_scans.append(scan_number)
+        single_streams.append(stream_number)
+        single_units.append(properties["chip_in_histo"])
+
+    elif "channel" in properties: #one channel affected
+        single_scans.append(scan_number)
+        single_streams.append(stream_number)
+        single_units.append(properties["channel"])
+
+    elif "channel_from" in properties: #range of channels affected
+        mask[scan_number, stream_number, properties["channel_from"]:properties["channel_to"] + 1] = True
+
+    else: #whole chip affected
+        chip = properties["chip_in_histo"]
+        mask[scan_number, stream_number, chip * 128:(chip + 1) * 128] = True
+
+def get_defect_index(data):
+    '''
+    Get the DefectIndex for a file, building it the first time it is asked for.
+
+    Arguments:
+    data - the contents of a pre-opened JSON file.
+
+    Returns:
+    defect_index - Type = DefectIndex. The file's defects, indexed by runNumber,
+                   stream, chip, and defect name.
+    '''
+
+    derived = get_derived(data)
+
+    if "defect_index" not in derived:
+        with profiler.span("DefectIndex", "analysis"):
+            derived["defect_index"] = DefectIndex(get_defects(data))
+
+    defect_index = derived["defect_index"]
+
+    return defect_index
+
+def split_by_mask(data, bad):
+    '''
+    Split a single scan's data into good and bad channels (or chips), given a row of a
+    defect mask.
+
+    Arguments:
+    data - Type = list or numpy array. A single scan's data for one stream.
+    bad  - Type = numpy array of bool. True where the channel is defective.
+
+    Returns:
+    good_channels - Type = numpy array of int. Channels not associated with a defect.
+    good_data     - Type = numpy array. Data for those channels.
+    bad_channels  - Type = numpy array of int. Channels associated with a defect.
+    bad_data      - Type = numpy array. Data for those channels.
+    '''
+
+    data     = np.asarray(data)[:len(bad)]
+    bad      = bad[:len(data)]
+    channels = np.arange(len(data))
+
+    return channels[~bad], data[~bad], channels[bad], data[bad]
+
+def get_derived(data):
+    '''
+    Get the dictionary of values derived from a file's contents (defect masks and
+    such), so they are only worked out once per file.
+
+    Arguments:
+    data - the contents of a pre-opened JSON file.
+
+    Returns:
+    derived - Type = dict. Values derived from data, by name.
+    '''
+
+#Keyed by id(), holding on to data itself so the id can't be reused by another file
+    if id(data) not in derived_registry:
+        derived_registry[id(data)] = (data, {})
+
+    derived = derived_registry[id(data)][1]
+
+    return derived
+
+def forget_derived(files):
+    '''
+    Forget the values derived from some data dictionaries (see get_derived()), so
+    they can be freed. Local files are forgotten by retrieve_data() when they change,
+    but data from the database is only forgotten here.
+
+    Arguments:
+    files - Type = dict. Files sorted by type (as from db.get_files_by_type()). Only
+            data dictionaries are forgotten; paths are left alone.
+    '''
+
+    for data in unsort_files(files):
+        if type(data) is dict:
+            derived_registry.pop(id(data), None)
+
 def get_test_type(data):
     '''
     At the moment, only used to distinguish between 3-Point Gain and 10-Point Gain
@@ -304,6 +423,26 @@ def get_test_type(data):
 
     return test_type
 
+def get_scan_results(data, field, scan_numbers):
+    '''
+    Retrieve the results of a single field for only the scans asked for. When the data
+    was loaded from a columnar cache, each scan is a view into the memory-mapped
+    array, so the other scans are never read from disk.
+
+    Arguments:
+    data         - the contents of a pre-opened JSON file.
+    field        - Type = string. The results field (ie. "trim_away").
+    scan_numbers - Type = list of int. Indices of the scans of interest.
+
+    Returns:
+    scan_results - Type = list of list (or numpy array). One entry per scan asked for.
+    '''
+
+    results      = data["results"][field]
+    scan_results = [results[n] for n in scan_numbers]
+
+    return scan_results
+
 def make_one_list(data_list):
     '''
     Given a list of lists, reformat it so it is one list.
@@ -364,9 +503,45 @@ def make_pdf(plots, component, date, run_number):
     run_number - Type = int. The ColdJig runNumber.
     '''
 
-    with PdfPages(f'{component}_{date}_{run_number}_TC_plots.pdf') as pdf:
+    from matplotlib.backends.backend_pdf import PdfPages #only needed when plotting
+
+    with PdfPages(get_pdf_name(component, date, run_number)) as pdf:
         for plot in plots:
-            pdf.savefig(plot, bbox_inches='tight')
+            save_page(pdf, plot)
+
+def get_pdf_name(component, date, run_number):
+    '''
+    Get the file name of the PDF made for a module's TC run.
+
+    Arguments:
+    component  - Type = string. The module serial number.
+    date       - Type = string. The date that TC began.
+    run_number - Type = int. The ColdJig runNumber.
+
+    Returns:
+    pdf_name - Type = string. The name of the PDF.
+    '''
+
+    pdf_name = f'{component}_{date}_{run_number}_TC_plots.pdf'
+
+    return pdf_name
+
+def save_page(pdf, plot):
+    '''
+    Draw a single figure as a page of a PDF. Some parts of a figure (such as most
+    tick labels) are only laid out when it is drawn, so every page is drawn with the
+    same settings (PAGE_RC), no matter which plots were made before it or which
+    process made it.
+
+    Arguments:
+    pdf  - Type = PdfPages. The PDF being written.
+    plot - Type = matplotlib figure. The figure to add.
+    '''
+
+    import matplotlib #only needed when plotting
+
+    with matplotlib.rc_context(PAGE_RC), profiler.span("savefig", "draw"):
+        pdf.savefig(plot, bbox_inches='tight')
 
 def sort_files_by_hybrid(files, TC_directory):
     '''
@@ -386,7 +561,10 @@ def sort_files_by_hybrid(files, TC_directory):
 
     for file in files:
 
-        data = retrieve_data(file)
+        if type(file) is dict: #if querying DB
+            data = retrieve_data(file)
+        else: #if using local files
+            data = retrieve_data(f"{TC_directory}/{file}")
         file_SN = get_component(data) #get the SN from inside the file
 
         if file_SN in sorted_files.keys(): #if SN is already in the dictionary
@@ -446,27 +624,138 @@ def get_index(item, items):
     return index
 
 
-def retrieve_data(data_file):
+#Every local file opened during a run, keyed by absolute path. Each entry is the
+#file's modification time when it was read, and the parsed contents.
+document_registry = {}
+#Whether retrieve_data() should write a columnar cache for files it has to parse.
+write_columnar_cache = False
+#Values worked out from each file's contents (see get_derived()), keyed by id().
+derived_registry = {}
+#Every test type, in the order they're plotted
+ALL_TESTS = ["IV", "PT", "SD", "3PG", "10PG", "NO", "OCS"]
+#Streams, in the order used for the stream axis of defect masks
+STREAMS = ["under", "away"]
+#Settings every PDF page is drawn with. These are the ones the TC summary plots
+#(always made last) leave behind, which is what every page was drawn with when the
+#whole PDF was drawn at the very end.
+PAGE_RC = {'font.size': 7}
+
+def retrieve_data(data_file, streaming=False):
     '''
     Retrieve data from a data file, using a different method for real local files,
     and "files" (data dictionaries) pulled from the ATLAS ITk Production Database.
+    Local files are only decoded the first time they are asked for; after that, the
+    same parsed dictionary is handed to every caller, unless the file has been
+    modified since. If the file has an up-to-date columnar cache (see
+    columnar_cache.py), that is loaded instead of the JSON, and numeric results are
+    numpy arrays rather than lists.
 
     Arguments:
     data_file - type = string or dict. Either a path to a local JSON,
                 or a data dictionary from the database.
+    streaming - type = boolean. Only for ColdJigRun files. If True (and ijson is
+                installed), read the file in a single streaming pass, with the
+                environmental data going straight into numpy arrays.
 
     Returns:
-    data - type = dict. The data dictionary.
+    data - type = dict. The data dictionary. Shared between callers, so it should
+           not be modified.
     '''
     if type(data_file) is dict: #if the data_file was pulled from DB
         data = data_file #do nothing
 
     else: #if it's a path to a local file
-        with open(data_file, 'r') as f: #open the JSON
-            data = json.load(f)
+        path  = os.path.abspath(data_file) #so different spellings share an entry
+        mtime = os.path.getmtime(path)
+
+        if path in document_registry and document_registry[path][0] == mtime:
+            data = document_registry[path][1] #already parsed
+
+        else:
+            if path in document_registry: #modified since, forget what was worked out
+                derived_registry.pop(id(document_registry[path][1]), None)
+
+            with profiler.span("retrieve_data", "load"): #only when it's actually read
+                data = columnar_cache.load_cache(path) #None if there's no fresh cache
+
+                if data is None and streaming and coldjig_stream.ijson is not None:
+                    try:
+                        data = coldjig_stream.stream_TC_data(path)
+                    except (ValueError, KeyError, TypeError, coldjig_stream.ijson.JSONError): #unexpected layout
+                        print(f"{YELLOW}Could not stream {data_file}, reading it normally.{RESET}")
+
+                if data is None:
+                    with open(path, 'r') as f: #open the JSON
+                        data = json.load(f)
+
+                if write_columnar_cache and not columnar_cache.cache_is_fresh(path):
+                    try:
+                        columnar_cache.write_cache(path, data)
+                        data = columnar_cache.load_cache(path) #same types every time
+                    except OSError: #ie. read-only directory, just use the JSON
+                        print(f"{YELLOW}Could not write columnar cache for {data_file}.{RESET}")
+
+            document_registry[path] = (mtime, data)
 
     return data
 
+def positive_int(value):
+    '''
+    Argument type for command line arguments which have to be a whole number, at
+    least 1 (ie. a batch size).
+
+    Arguments:
+    value - Type = string. As given on the command line.
+
+    Returns:
+    number - Type = int.
+    '''
+
+    import argparse #only needed from the command line
+
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a whole number.")
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} must be at least 1.")
+
+    return number
+
+def use_headless_backend():
+    '''
+    Have matplotlib draw with its Agg backend, which only draws to files, unless
+    $MPLBACKEND already says otherwise. Every plot ends up in a PDF, so there's no
+    need for matplotlib to look for a GUI backend (ie. Qt or Tk) the first time pyplot
+    is used, which is slow wherever there's a display. Only takes effect if called
+    before matplotlib is imported, as the scripts do first thing; worker processes
+    inherit it. Doesn't import matplotlib itself.
+    '''
+
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+def set_columnar_caching(enabled):
+    '''
+    Turn on (or off) writing a columnar cache for every local file retrieve_data()
+    has to parse, so later runs can skip the JSON.
+
+    Arguments:
+    enabled - Type = boolean. Whether or not to write caches.
+    '''
+
+    global write_columnar_cache
+    write_columnar_cache = enabled
+
+def clear_document_registry():
+    '''
+    Forget every file opened so far, so the next retrieve_data() call for each file
+    reads it from disk again.
+    '''
+
+    document_registry.clear()
+    derived_registry.clear()
+
 '''
 Sets global variables for colour terminal printout.
 '''
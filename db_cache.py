@@ -0,0 +1,158 @@
+#import libraries
+import os
+import json
+import gzip
+import time
+import hashlib
+import tempfile
+
+#Where database responses are kept, unless $TC_PLOTS_DB_CACHE says otherwise
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tc_summary_plotting", "db")
+#How long a component (module, half-module, or hybrid) is trusted for, in seconds.
+#Test runs never change once uploaded, so they are kept for good.
+COMPONENT_TTL = 60 * 60
+#gzip level for cache files. Level 1 is several times quicker to write than the
+#default (9), and the files are only about a fifth bigger.
+COMPRESSION_LEVEL = 1
+
+class DBCache:
+    '''
+    A local, compressed copy of Production Database responses, so re-plotting a module
+    doesn't fetch everything again. Each response is kept in its own gzipped JSON file,
+    named for a hash of what was asked for (ie. "getComponent" and the serial number),
+    so nothing needs an index. Files are written to a temporary name and moved into
+    place, so several processes can share the cache without ever reading half a file.
+
+    Arguments:
+    directory - Type = string. Where the cache lives (made if needed). If None,
+                $TC_PLOTS_DB_CACHE, or DEFAULT_CACHE_DIR.
+    refresh   - Type = boolean. If True, nothing is read from the cache, but
+                everything fetched is still written to it.
+    '''
+
+    def __init__(self, directory=None, refresh=False):
+
+        self.directory = directory or os.environ.get("TC_PLOTS_DB_CACHE") or DEFAULT_CACHE_DIR
+        self.refresh   = refresh
+
+        os.makedirs(self.directory, mode=0o700, exist_ok=True) #database contents, so
+                                                                #only readable by the user
+
+    def get_path(self, kind, key):
+        '''
+        Get the file a response is kept in.
+
+        Arguments:
+        kind - Type = string. The kind of response (ie. "getComponent").
+        key  - Type = string. What identifies the response (ie. a serial number).
+
+        Returns:
+        path - Type = string. The path of the cache file.
+        '''
+
+        digest = hashlib.sha256(f"{kind}:{key}".encode()).hexdigest()
+        path   = os.path.join(self.directory, digest[:2], f"{digest}.json.gz")
+
+        return path
+
+    def load(self, kind, key, max_age=None):
+        '''
+        Get a response from the cache.
+
+        Arguments:
+        kind    - Type = string. The kind of response (ie. "getComponent").
+        key     - Type = string. What identifies the response (ie. a serial number).
+        max_age - Type = float. The oldest the response can be, in seconds. None for
+                  no limit.
+
+        Returns:
+        value - The response, or None if it isn't cached, is too old, or refresh is on.
+        '''
+
+        if self.refresh:
+            return None
+
+        path = self.get_path(kind, key)
+
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+                return None #expired
+
+            with gzip.open(path, 'rt') as f:
+                value = json.load(f)
+
+        except (OSError, EOFError, ValueError): #not cached, or unreadable
+            return None
+
+        return value
+
+    def store(self, kind, key, value):
+        '''
+        Put a response in the cache, replacing anything already there.
+
+        Arguments:
+        kind  - Type = string. The kind of response (ie. "getComponent").
+        key   - Type = string. What identifies the response (ie. a serial number).
+        value - Type = dict. The response.
+        '''
+
+        path = self.get_path(kind, key)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(gzip.compress(json.dumps(value).encode(), compresslevel=COMPRESSION_LEVEL))
+            os.replace(temp_path, path) #atomic, so readers see all or nothing
+
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+class CachedClient:
+    '''
+    Stands in for an itkdb client, answering getComponent and getTestRunBulk requests
+    from a DBCache where it can. Components are only trusted for COMPONENT_TTL, as new
+    tests are uploaded to them; test runs are kept for good. getTestRunBulk only asks
+    the database for the test runs which aren't cached. Every other request goes
+    straight to the database.
+
+    Arguments:
+    client - Type = class. An itkdb client (or anything with the same get()).
+    cache  - Type = DBCache. Where responses are kept.
+    '''
+
+    def __init__(self, client, cache):
+
+        self.client = client
+        self.cache  = cache
+
+    def __getattr__(self, name): #anything else is the client's
+        return getattr(self.client, name)
+
+    def get(self, endpoint, json=None, **kwargs):
+
+        if endpoint == "getComponent" and kwargs == {}:
+            serial_number = json["component"]
+            component     = self.cache.load(endpoint, serial_number, max_age=COMPONENT_TTL)
+
+            if component is None:
+                component = self.client.get(endpoint, json=json)
+                self.cache.store(endpoint, serial_number, component)
+
+            return component
+
+        if endpoint == "getTestRunBulk" and kwargs == {}:
+            test_IDs  = json["testRun"]
+            test_runs = {test_ID: self.cache.load("getTestRun", test_ID) for test_ID in test_IDs}
+            missing   = [test_ID for test_ID in test_IDs if test_runs[test_ID] is None]
+
+            if missing != []:
+                for test_run in self.client.get(endpoint, json={"testRun": missing}):
+                    self.cache.store("getTestRun", test_run["id"], test_run)
+                    test_runs[test_run["id"]] = test_run
+
+            return [test_runs[test_ID] for test_ID in test_IDs if test_runs[test_ID] is not None]
+
+        return self.client.get(endpoint, json=json, **kwargs)
@@ -0,0 +1,95 @@
+#import libraries
+import itertools
+
+#Stands in for "any value" when looking up defects (None can be a real value)
+ANY = "*"
+
+class DefectIndex:
+    '''
+    All the defects from a single merged file, indexed by runNumber, stream
+    (chip_bank), chip (chip_in_histo), and defect name. Every combination of those is
+    looked up in a single dictionary access, so nothing has to scan through the full
+    list of defects more than once.
+
+    Arguments:
+    defects - Type = list of dict. The defects found in the file.
+    '''
+
+    def __init__(self, defects):
+
+        self.defects     = defects
+        self.index       = {} #initialize, {(runNumber, stream, chip, name): defects}
+        self.name_counts = {} #initialize, {stream: {name: number of defects}}
+
+        for defect in defects:
+            properties = defect["properties"]
+            values = (properties.get("runNumber"), properties.get("chip_bank"), properties.get("chip_in_histo"), defect.get("name"))
+
+#File the defect under every combination of its own values and ANY
+            for key in itertools.product(*[(value, ANY) for value in values]):
+                self.index.setdefault(key, []).append(defect)
+
+#Count defects by name for each stream, in the order each name first appears
+            stream_counts = self.name_counts.setdefault(properties.get("chip_bank"), {})
+            stream_counts[defect.get("name")] = stream_counts.get(defect.get("name"), 0) + 1
+
+    def lookup(self, run_number=ANY, stream=ANY, chip=ANY, name=ANY):
+        '''
+        Get all defects matching the given runNumber, stream, chip, and name. Anything
+        not given matches every defect.
+
+        Arguments:
+        run_number - Type = string. The runNumber (ie. scan[:-18] for a PT scan).
+        stream     - Type = string, "under" or "away". The chip_bank.
+        chip       - Type = int. The chip_in_histo.
+        name       - Type = string. The defect name (ie. "Open channel").
+
+        Returns:
+        defects - Type = list of dict. The matching defects, in file order.
+        '''
+
+        defects = self.index.get((run_number, stream, chip, name), [])
+
+        return defects
+
+    def count(self, run_number=ANY, stream=ANY, chip=ANY, name=ANY):
+        '''
+        Get the number of defects matching the given runNumber, stream, chip, and name.
+        Arguments are as for lookup().
+
+        Returns:
+        n_defects - Type = int. The number of matching defects.
+        '''
+
+        n_defects = len(self.lookup(run_number, stream, chip, name))
+
+        return n_defects
+
+    def chips(self, run_number=ANY, stream=ANY, name=ANY):
+        '''
+        Get the chip of every matching defect (with repeats). Arguments are as for
+        lookup().
+
+        Returns:
+        chips - Type = list of int. The chip_in_histo of each defect.
+        '''
+
+        chips = [defect["properties"]["chip_in_histo"] for defect in self.lookup(run_number, stream, ANY, name)]
+
+        return chips
+
+    def count_by_name(self, stream):
+        '''
+        Get the number of defects of each type for a given stream.
+
+        Arguments:
+        stream - Type = string, "under" or "away". The chip_bank.
+
+        Returns:
+        counts - Type = dict. {defect name: number of defects}, in the order each name
+                 first appears in the file.
+        '''
+
+        counts = self.name_counts.get(stream, {})
+
+        return counts
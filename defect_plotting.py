@@ -36,12 +36,12 @@ def make_plots(files, TC_data):
         elif test_type == "OCS":
             OCS_data = data
 
-    SD_defects    = get_defects(SD_data) #get all the defects for each test type
-    PT_defects    = get_defects(PT_data)
-    TPG_defects   = get_defects(TPG_data)
-    RC_defects    = get_defects(RC_data)
-    NO_defects    = get_defects(NO_data)
-    OCS_defects   = get_defects(OCS_data)
+    SD_defects    = get_defect_index(SD_data) #get all the defects for each test type
+    PT_defects    = get_defect_index(PT_data)
+    TPG_defects   = get_defect_index(TPG_data)
+    RC_defects    = get_defect_index(RC_data)
+    NO_defects    = get_defect_index(NO_data)
+    OCS_defects   = get_defect_index(OCS_data)
 
     defects_plot = plt.figure(figsize=[8,4], dpi=50) #make the figure
     chips        = SD.get_chips(SD_data) #get the chips (using the SD)
@@ -72,8 +72,8 @@ def defects_by_chip(PT_defects, SD_defects, TPG_defects, RC_defects, NO_defects,
     in which the defect occured.
 
     Arguments:
-    PT_defects  - Type = list of dict. A list of all defects that occured during the
-                  Pedestal Trim.
+    PT_defects  - Type = DefectIndex. All defects that occured during the Pedestal
+                  Trim.
     SD_defects  - As above, for the Strobe Delay.
     TPG_defects - As above, for the Three-Point Gain.
     RC_defects  - As above, for the Ten-Point Gain.
@@ -107,8 +107,8 @@ def defects_by_type(PT_defects, SD_defects, TPG_defects, RC_defects, NO_defects,
     thermal cycling.
 
     Arguments:
-    PT_defects  - Type = list of dict. A list of all defects that occured during the
-                  Pedestal Trim.
+    PT_defects  - Type = DefectIndex. All defects that occured during the Pedestal
+                  Trim.
     SD_defects  - As above, for the Strobe Delay.
     TPG_defects - As above, for the Three-Point Gain.
     RC_defects  - As above, for the Ten-Point Gain.
@@ -118,23 +118,18 @@ def defects_by_type(PT_defects, SD_defects, TPG_defects, RC_defects, NO_defects,
     component   - Type = string. The hybrid serial number.
     '''
 
-    total_defects = make_one_list([PT_defects, SD_defects, TPG_defects, RC_defects, NO_defects, OCS_defects]) #all the defects from TC
-    defect_types   = [] #initialize
-    unique_defects = []
+    all_defects    = [PT_defects, SD_defects, TPG_defects, RC_defects, NO_defects, OCS_defects] #all the defects from TC
+    unique_defects = [] #initialize
+    unique_defect_lengths = []
 
-    for defect in total_defects:
-        defect_stream = defect["properties"]["chip_bank"] #under or away
-        if defect_stream == stream.lower(): #does it match the stream being plotted?
-            defect_types.append(defect["name"])
-
-        if defect_stream == stream.lower() and defect["name"] not in unique_defects:
-            unique_defects.append(defect["name"]) #make a list without repeats
-
-    unique_defect_lengths = [] #initialize
-    for unique_defect in unique_defects:
-        matching_defects = [defect for defect in defect_types if defect == unique_defect] #list of all defects matching the unique defect
-        unique_defect_lengths.append(len(matching_defects)) #the number of times that
-                                                            #defect occurs
+#Add up the number of times each defect type occurs in the stream being plotted, over
+#all test types
+    for defect_index in all_defects:
+        for name, n_defects in defect_index.count_by_name(stream.lower()).items():
+            if name not in unique_defects: #make a list without repeats
+                unique_defects.append(name)
+                unique_defect_lengths.append(0)
+            unique_defect_lengths[unique_defects.index(name)] += n_defects
 
     plt.bar(unique_defects, unique_defect_lengths, color='c')
     plt.title(f"{component} Defects by Type, {stream} Stream")
@@ -149,8 +144,8 @@ def defects_by_test(TC_data, PT_defects, SD_defects, TPG_defects, RC_defects, NO
 
     Arguments:
     TC_data     - the contents of a pre-opened ColdJigRun JSON file.
-    PT_defects  - Type = list of dict. A list of all defects that occured during the
-                 Pedestal Trim.
+    PT_defects  - Type = DefectIndex. All defects that occured during the Pedestal
+                  Trim.
     SD_defects  - As above, for the Strobe Delay.
     TPG_defects - As above, for the Three-Point Gain.
     RC_defects  - As above, for the Ten-Point Gain.
@@ -162,14 +157,7 @@ def defects_by_test(TC_data, PT_defects, SD_defects, TPG_defects, RC_defects, NO
     test_sections = TC_data["properties"]["ColdJig_History"] #ie 4_TC_COLD_TEST_0
     ## Filter out sections related to warm-up or cool-down, IVs, and OCS
     valid_sections = [section for section in test_sections if TC.test_is_valid(section)and "IV" not in section and "HV" not in section and "OPEN" not in section]
-    warm_sections, cold_sections = TC.sort_sect_temp(test_sections) #sort 'em by temp
-
-    ## Get defective tests for each test type
-    PT_defect_tests = [defect["properties"]["runNumber"] for defect in PT_defects]
-    SD_defect_tests = [defect["properties"]["runNumber"] for defect in SD_defects]
-    TPG_defect_tests = [defect["properties"]["runNumber"] for defect in TPG_defects]
-    RC_defect_tests = [defect["properties"]["runNumber"] for defect in RC_defects]
-    NO_defect_tests = [defect["properties"]["runNumber"] for defect in NO_defects]
+    warm_sections, cold_sections = TC.sort_sect_temp(TC_data) #sort 'em by temp
 
     warm_bar_heights = [] #initialize
     cold_bar_heights = []
@@ -191,13 +179,13 @@ def defects_by_test(TC_data, PT_defects, SD_defects, TPG_defects, RC_defects, NO
         for test in tests: #for each of the tests taken in a testing section
 
             test = ''.join(i for i in test if i.isdigit() or i == '-') #reformat
-    ## Add one to PT_occurances for every time the test occurs in the list of PT
-    ## defect tests. In other words, add the number of defects in that test.
-            PT_occurances += PT_defect_tests.count(test)
-            SD_occurances += SD_defect_tests.count(test)
-            TPG_occurances += TPG_defect_tests.count(test)
-            RC_occurances += RC_defect_tests.count(test)
-            NO_occurances += NO_defect_tests.count(test)
+    ## Add the number of PT defects in that test to PT_occurances (looked up by
+    ## runNumber in the index).
+            PT_occurances += PT_defects.count(run_number=test)
+            SD_occurances += SD_defects.count(run_number=test)
+            TPG_occurances += TPG_defects.count(run_number=test)
+            RC_occurances += RC_defects.count(run_number=test)
+            NO_occurances += NO_defects.count(run_number=test)
 
         if section in warm_sections: #if this happened warm, use it for the warm plot
            warm_bar_heights.append([PT_occurances, SD_occurances, TPG_occurances, RC_occurances, NO_occurances])
@@ -244,17 +232,14 @@ def get_defect_chips(defects, stream):
     Make a list of the chips corresponding to the defects (with repeats).
 
     Arguments:
-    defects - Type = list of dict. All the defects of interest.
+    defects - Type = DefectIndex. All the defects of interest.
     stream  - Type = string, "Under" or "Away". The stream of interest.
 
     Returns:
     defects_by_chip - Type = list of int. The chips corresponding to each defect.
     '''
-    defects_by_chip = [] #initialize
-    for defect in defects:
-    ## If defect belongs to stream of interest, append the chip to returned list.
-        if defect["properties"]["chip_bank"] == stream.lower():
-            defects_by_chip.append(defect["properties"]["chip_in_histo"])
+    ## The chip of every defect belonging to the stream of interest
+    defects_by_chip = defects.chips(stream=stream.lower())
 
     return defects_by_chip
 
@@ -0,0 +1,257 @@
+#import libraries
+import json
+import gzip
+import copy
+import time
+import random
+import argparse
+import threading
+import requests
+import itkdb
+from common_functions import *
+
+#Where the stand-in pretends to be, for error messages
+FAKE_URL = "https://fake-itkpdb.local/itkdbPrivate/"
+
+#Each local merged file, by the end of its name, as the database test type code (and
+#how long after the start of TC it is dated, in hours, so 3PGs come before 10PGs)
+FILE_TEST_TYPES = {"MODULE_IV_AMAC_TC"      : ("MODULE_IV_AMAC_TC", 0),
+                   "PEDESTAL_TRIM_TC"       : ("PEDESTAL_TRIM_TC", 1),
+                   "STROBE_DELAY_TC"        : ("STROBE_DELAY_TC", 2),
+                   "3PG_TC"                 : ("RESPONSE_CURVE_TC", 3),
+                   "RESPONSE_CURVE_TC"      : ("RESPONSE_CURVE_TC", 4),
+                   "NO_TC"                  : ("NO_TC", 5),
+                   "OPEN_CHANNEL_SEARCH_TC" : ("OPEN_CHANNEL_SEARCH_TC", 6),
+                   "HVSTABILITY"            : ("HVSTABILITY", 7),
+                   "ColdJigRun"             : ("MODULE_TC", 0)}
+
+class FakeClient:
+    '''
+    Stands in for an itkdb client, answering getComponent and getTestRunBulk requests
+    from a fixture file instead of the Production Database, so the database mode can be
+    run (and timed) without credentials or a network. Every request waits for the
+    given latency first, without holding anything up, so concurrent requests overlap
+    the way real ones do. Requests can also be made to fail at random, the way a
+    flaky connection does.
+
+    A fixture file is JSON (optionally gzipped): {"components": {serial number:
+    component}, "testRuns": {test ID: test run}}, in the shapes the database returns.
+    Make one from local merged files with make_fixture(), or from the database with
+    RecordingClient.
+
+    Arguments:
+    fixture_file - Type = string. Path to the fixture file.
+    latency      - Type = float. How long every request takes, in seconds.
+    error_rate   - Type = float. The chance (0 to 1) that any request fails with a
+                   dropped connection.
+    seed         - Type = int. Seed for the failures, so they can be repeated.
+    '''
+
+    def __init__(self, fixture_file, latency=0.0, error_rate=0.0, seed=None):
+
+        self.fixture    = read_fixture(fixture_file)
+        self.latency    = latency
+        self.error_rate = error_rate
+        self.random     = random.Random(seed)
+        self.lock       = threading.Lock() #requests come from several threads
+        self.requests   = {} #{endpoint: number of requests}, for benchmarking
+
+    def get(self, endpoint, json=None, **kwargs):
+
+        with self.lock:
+            self.requests[endpoint] = self.requests.get(endpoint, 0) + 1
+            failed = self.random.random() < self.error_rate
+
+        time.sleep(self.latency)
+
+        if failed:
+            raise requests.exceptions.ConnectionError(f"Injected failure for {endpoint}")
+
+        if endpoint == "getComponent":
+            serial_number = json["component"]
+            if serial_number not in self.fixture["components"]:
+                raise itkdb.exceptions.NotFound(make_response(endpoint, json, 404))
+            return copy.deepcopy(self.fixture["components"][serial_number])
+
+        if endpoint == "getTestRunBulk":
+            return [copy.deepcopy(self.fixture["testRuns"][test_ID]) for test_ID in json["testRun"] if test_ID in self.fixture["testRuns"]]
+
+        raise itkdb.exceptions.BadRequest(make_response(endpoint, json, 400))
+
+class RecordingClient:
+    '''
+    Wraps a real itkdb client, keeping a copy of every getComponent and getTestRunBulk
+    response, so they can be saved as a fixture file for FakeClient.
+
+    Arguments:
+    client - Type = class. An itkdb client.
+    '''
+
+    def __init__(self, client):
+
+        self.client  = client
+        self.fixture = {"components": {}, "testRuns": {}} #initialize
+        self.lock    = threading.Lock()
+
+    def __getattr__(self, name): #anything else is the client's
+        return getattr(self.client, name)
+
+    def get(self, endpoint, json=None, **kwargs):
+
+        response = self.client.get(endpoint, json=json, **kwargs)
+
+        with self.lock:
+            if endpoint == "getComponent":
+                self.fixture["components"][json["component"]] = copy.deepcopy(response)
+            elif endpoint == "getTestRunBulk":
+                response = list(response)
+                for test_run in response:
+                    self.fixture["testRuns"][test_run["id"]] = copy.deepcopy(test_run)
+
+        return response
+
+    def save(self, fixture_file):
+        '''
+        Write everything recorded so far to a fixture file.
+
+        Arguments:
+        fixture_file - Type = string. Where to write it (gzipped if it ends in .gz).
+        '''
+
+        write_fixture(self.fixture, fixture_file)
+
+def make_response(endpoint, payload, status_code):
+    '''
+    Make a stand-in HTTP response, for raising the same exceptions itkdb does.
+
+    Arguments:
+    endpoint    - Type = string. The endpoint asked for.
+    payload     - Type = dict. What was sent.
+    status_code - Type = int. The HTTP status code.
+
+    Returns:
+    response - Type = requests.Response.
+    '''
+
+    response             = requests.Response()
+    response.status_code = status_code
+    response.url         = f"{FAKE_URL}{endpoint}"
+    response.request     = requests.Request("POST", response.url, json=payload).prepare()
+    response._content    = json.dumps({"uuAppErrorMap": {endpoint: {"message": f"{status_code} from the fake database"}}}).encode()
+
+    return response
+
+def read_fixture(fixture_file):
+    '''
+    Read a fixture file.
+
+    Arguments:
+    fixture_file - Type = string. Path to the fixture file (gzipped if it ends in .gz).
+
+    Returns:
+    fixture - Type = dict. {"components": {...}, "testRuns": {...}}.
+    '''
+
+    opener = gzip.open if fixture_file.endswith(".gz") else open
+
+    with opener(fixture_file, 'rt') as f:
+        fixture = json.load(f)
+
+    return fixture
+
+def write_fixture(fixture, fixture_file):
+    '''
+    Write a fixture file.
+
+    Arguments:
+    fixture      - Type = dict. {"components": {...}, "testRuns": {...}}.
+    fixture_file - Type = string. Where to write it (gzipped if it ends in .gz).
+    '''
+
+    opener = gzip.open if fixture_file.endswith(".gz") else open
+
+    with opener(fixture_file, 'wt') as f:
+        json.dump(fixture, f)
+
+def make_fixture(TC_directory, institute="TEST"):
+    '''
+    Turn a directory of local merged files for a single (non-split) module into a
+    fixture, as if the files had been uploaded to the database: one component for the
+    module and one for each hybrid, and one test run for each file.
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for a
+                   single module.
+    institute    - Type = string. Institute code to upload the tests from.
+
+    Returns:
+    fixture   - Type = dict. {"components": {...}, "testRuns": {...}}.
+    module_sn - Type = string. The module serial number.
+    '''
+
+    TC_data   = retrieve_data(f'{TC_directory}/{fetch_files(TC_directory)["TC"]}')
+    module_sn = get_component(TC_data)
+    date      = TC_data["date"][:10] #date that TC was run
+    fixture   = {"components": {}, "testRuns": {}} #initialize
+    tests     = {} #{serial number: {test type code: [test run summaries]}}
+
+    for file in sorted(unsort_files(fetch_files(TC_directory))):
+        data      = retrieve_data(f'{TC_directory}/{file}')
+        component = data["component"]
+        file_type = [key for key in FILE_TEST_TYPES if file.endswith(f"_{key}.json")][0]
+        code, hours = FILE_TEST_TYPES[file_type]
+
+        if code == "MODULE_TC":
+            run_number = str(data["runNumber"]) #ColdJig runNumber
+        else:
+            scans      = data["properties"].get("itsdaq_test_info", {}).get("all_tests", [])
+            run_number = scans[0].split("-")[0] if scans != [] else "0" #ITSDAQ runNumber
+
+        test_ID  = f"{component}_{file_type}"
+        run_date = f"{date}T{hours:02d}:00:00.000Z"
+        summary  = {"id": test_ID, "date": run_date, "cts": run_date, "institution": {"code": institute}, "runNumber": run_number}
+        test_run = dict(summary,
+                        testType   = {"code": code},
+                        components = [{"serialNumber": module_sn}] + ([{"serialNumber": component}] if component != module_sn else []),
+                        results    = [{"code": name, "value": value} for name, value in data.get("results", {}).items()],
+                        properties = [{"code": name, "value": value} for name, value in data["properties"].items()],
+                        defects    = data.get("defects", []))
+
+        fixture["testRuns"][test_ID] = json.loads(json.dumps(test_run, default=lambda value: value.tolist())) #arrays to lists
+        tests.setdefault(component, {}).setdefault(code, []).append(summary)
+
+    for serial_number in tests:
+        children = [{"component": {"serialNumber": hybrid_sn}} for hybrid_sn in tests if hybrid_sn != module_sn] if serial_number == module_sn else []
+        fixture["components"][serial_number] = {"serialNumber": serial_number,
+                                                "children"    : children,
+                                                "tests"       : [{"code": code, "testRuns": runs} for code, runs in tests[serial_number].items()]}
+
+    return fixture, module_sn
+
+def main():
+    '''
+    Make a fixture file for FakeClient, from local merged files or the database.
+    '''
+
+    parser = argparse.ArgumentParser(
+      description="Make a fixture file for the stand-in ITk Production Database, from local merged files (-d) or the real database (-db).")
+    parser.add_argument("fixture_file", help="Where to write the fixture (gzipped if it ends in .gz).")
+    parser.add_argument("-d", "--TC_directory", help="Directory containing all merged TC results for a single module.")
+    parser.add_argument("-db", "--database", help="Record the responses to a real database run instead (asks for the usual values).", action='store_true')
+    parser.add_argument("--institute", help="With -d, the institute code to upload the tests from. Default is TEST.", default="TEST")
+    args = parser.parse_args()
+
+    if args.database:
+        import ITkPDB_matters as db
+        options = db.load_db_options()
+        client  = RecordingClient(db.establish_db_client(options, cache=False))
+        db.get_files(options, client=client)
+        client.save(args.fixture_file)
+
+    else:
+        fixture, module_sn = make_fixture(args.TC_directory, args.institute)
+        write_fixture(fixture, args.fixture_file)
+        print(f"{GREEN}Wrote fixture for module {module_sn} to {args.fixture_file}.{RESET}")
+
+if __name__ == "__main__":
+    main()
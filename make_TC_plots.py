@@ -1,184 +1,222 @@
 #Import standard libraries
-import numpy as np
-import matplotlib.pyplot as plt
+import sys
 import json
 import argparse
-from PIL import Image
-#Import TC plotting scripts
-import IV
-import PT
-import SD
-import RC
-import NO
-import OCS
-import TC
-import defect_plotting
-from common_functions import *
-import ITkPDB_matters as db
-
-#Parse arguments
-parser = argparse.ArgumentParser(
-  description="Create plots summarizing the results of module Thermal Cycling.")
-parser.add_argument("-d", "--TC_directory",
-  help="Directory containing all merged TC results for a single module, including ColdJigRun file and HV Stability file.")
-parser.add_argument("-db", "--database",
-  help="Queries ATLAS ITk Production Database, instead of local files.", action='store_true')
-parser.add_argument("-t", "--tests",
-  help="Test types to be plotted (IV, PT, SD, 3PG, 10PG, NO, OCS). If not specified, all will be plotted.", nargs="+", default = ["IV", "PT", "SD", "3PG", "10PG", "NO", "OCS"])
-parser.add_argument("-n", "--noise_only", help="When making the 3PG/10PG plots, only make plots for the noise, not the gain or VT50", action='store_true')
-parser.add_argument("-hg", "--histograms", help="Make histograms with module defect information", action='store_true')
-args = parser.parse_args()
-
-TC_directory = args.TC_directory
-test_types   = args.tests
-noise_only   = args.noise_only
-histos       = args.histograms
-query_db     = args.database
-
-
-#Define file variables
-
-if not query_db: #if using local files
-
-    #Get files
-    files = fetch_files(TC_directory)
-    IV_file    = f'{TC_directory}/{files["IV"]}'
-    PT_files   = [f'{TC_directory}/{PT_file}' for PT_file in files["PT"]]
-    SD_files   = [f'{TC_directory}/{SD_file}' for SD_file in files["SD"]]
-    TPG_files  = [f'{TC_directory}/{TPG_file}' for TPG_file in files["TPG"]]
-    RC_files   = [f'{TC_directory}/{RC_file}' for RC_file in files["RC"]]
-    NO_files   = [f'{TC_directory}/{NO_file}' for NO_file in files["NO"]]
-    OCS_files  = [f'{TC_directory}/{OCS_file}' for OCS_file in files["OCS"]]
-    TC_file    = f'{TC_directory}/{files["TC"]}'
-
-if query_db: #if getting data from the database
-
-    IV_file, PT_files, SD_files, TPG_files, RC_files, NO_files, OCS_files, TC_file = db.get_files()
-    files = {'IV' : IV_file,
-             'PT': PT_files,
-             'SD': SD_files,
-             '3PG': TPG_files,
-             '10PG': RC_files,
-             'NO': NO_files,
-             'OCS': OCS_files,
-             'TC': TC_file} #files sorted by type
-
-IV_plots    = [] #initialize
-PT_plots    = []
-SD_plots    = []
-TPG_plots   = []
-RC_plots    = []
-NO_plots    = []
-OCS_plots   = []
-TC_plots    = []
-histo_plots = []
-
-#Define TC data
-
-TC_data = retrieve_data(TC_file)
-
-#Make IV plots
-if "IV" in test_types:
-    print("\nMaking IV plots...")
-    IV_data = retrieve_data(IV_file)
-    IV_plots.append(IV.make_plots(IV_data, TC_data))
-    print(f"\n{GREEN}IV plots complete!{RESET}")
-
-#Make PT plots
-if "PT" in test_types:
-    print("\nMaking Pedestal Trim plots...")
-
-    for PT_file in PT_files:
-        PT_data = retrieve_data(PT_file)
-        PT_plots.append(PT.make_plots(PT_data, TC_data))
-    print(f"\n{GREEN}Pedestal Trim plots complete!{RESET}")
-
-#Make SD plots
-if "SD" in test_types:
-    print("\nMaking Strobe Delay plots...")
-
-    for SD_file in SD_files:
-        SD_data = retrieve_data(SD_file)
-        SD_plots.append(SD.make_plots(SD_data, TC_data))
-    print(f"\n{GREEN}Strobe Delay plots complete!{RESET}")
-
-#Make 3PG plots
-if "3PG" in test_types:
-    print("\nMaking 3-Point Gain plots...")
-
-    for TPG_file in TPG_files:
-        TPG_data = retrieve_data(TPG_file)
-        TPG_plots.append(RC.make_plots(TPG_data, TC_data, noise_only))
-    print(f"\n{GREEN}3-Point Gain plots complete!{RESET}")
-
-#Make 10PG plots
-if "10PG" in test_types:
-    print("\nMaking 10-Point Gain plots...")
-
-    for RC_file in RC_files:
-        RC_data = retrieve_data(RC_file)
-        RC_plots.append(RC.make_plots(RC_data, TC_data, noise_only))
-    print(f"\n{GREEN}10-Point Gain plots complete!{RESET}")
-
-#Make NO plots
-if "NO" in test_types:
-    print("\nMaking Noise Occupancy plots...")
-
-    for NO_file in NO_files:
-        NO_data = retrieve_data(NO_file)
-        NO_plots.append(NO.make_plots(NO_data, TC_data))
-    print(f"\n{GREEN}Noise Occupancy plots complete!{RESET}")
-
-#Make OCS plots
-if "OCS" in test_types:
-    print("\nMaking Open Channel Search plots...")
-
-    for OCS_file in OCS_files:
-        OCS_data = retrieve_data(OCS_file)
-        OCS_plots.append(OCS.make_plots(OCS_data, TC_data))
-    print(f"\n{GREEN}Open Channel Search plots complete!{RESET}")
-
-#Make defect histograms
-if histos:
-    print("\nMaking Defect Histograms...")
-    hybrid_files = sort_files_by_hybrid(unsort_files(files), TC_directory)
-
-    for hybrid in hybrid_files:
-        if type(hybrid_files[hybrid][0]) is not dict:
-            files_to_plot = [f"{TC_directory}/{file}" for file in hybrid_files[hybrid]]
-        else:
-            files_to_plot = hybrid_files[hybrid]
-        histo_plots.append(defect_plotting.make_plots(files_to_plot, TC_data))
-    print(f"\n{GREEN}Defect Histograms complete!{RESET}")
-#Make TC summary plots
-print("\nMaking Thermal Cycling summary plots...")
-
-failed_tests = []
-
-unsorted_files = unsort_files(files)
-
-for file in unsorted_files:
-
-    if "HV" not in file and type(file) is not dict: #if using local files
-        failed_tests.append(fetch_failed_tests(f'{TC_directory}/{file}'))
-
-    elif type(file) is dict and "HV" not in file['testType']['code']: #if querying DB
-        failed_tests.append(fetch_failed_tests(file))
-
-TC_plots.append(TC.make_plots(TC_data, failed_tests))
-print(f"\n{GREEN}Thermal Cycling summary plots complete!{RESET}")
-
-#Make single PDF from all made plots
-print("\nMaking PDF...")
-all_plots0 = IV_plots + PT_plots + SD_plots + make_one_list(TPG_plots) + make_one_list(RC_plots) + NO_plots + OCS_plots + make_one_list(histo_plots) + make_one_list(TC_plots) #all plots made
-all_plots  = (make_one_list(all_plots0)) #reformat
-component  = get_component(TC_data) #module serial number
-date       = TC_data["date"][:10] #date that TC was run
-run_number = TC_data["runNumber"] #ColdJig run number
-make_pdf(all_plots, component, date, run_number) #put the plots into a single PDF
-
-plt.close('all')
-print(f"\n{GREEN}Plotting complete!{RESET}")
-
-
-
+import cProfile
+import contextlib
+#Import TC plotting scripts. The plotting itself is only imported when plots are
+#made, so the summary never imports matplotlib, and the database functions (and
+#itkdb) only with -db.
+from common_functions import * #including ALL_TESTS
+from tc_summary import make_summary
+import profiler
+
+def main():
+    '''
+    Make the TC plots for a single module, from local files or the database, and put
+    them into a single PDF. Worker processes (see --jobs) import the plotting scripts
+    but never run this.
+    '''
+
+    use_headless_backend() #before anything imports matplotlib
+
+    #Parse arguments
+    parser = argparse.ArgumentParser(
+      description="Create plots summarizing the results of module Thermal Cycling.")
+    parser.add_argument("-d", "--TC_directory",
+      help="Directory containing all merged TC results for a single module, including ColdJigRun file and HV Stability file.")
+    parser.add_argument("-db", "--database",
+      help="Queries ATLAS ITk Production Database, instead of local files.", action='store_true')
+    parser.add_argument("-t", "--tests",
+      help="Test types to be plotted (IV, PT, SD, 3PG, 10PG, NO, OCS). If not specified, all will be plotted.", nargs="+", default = ALL_TESTS)
+    parser.add_argument("-n", "--noise_only", help="When making the 3PG/10PG plots, only make plots for the noise, not the gain or VT50", action='store_true')
+    parser.add_argument("-hg", "--histograms", help="Make histograms with module defect information", action='store_true')
+    parser.add_argument("-c", "--cache", help="Write a columnar numpy cache next to each merged file, so re-plotting the module skips JSON parsing", action='store_true')
+    parser.add_argument("-pc", "--page_cache", "--page-cache", help="Keep each set of plots' pages in a cache (~/.cache/tc_summary_plotting/pages, or $TC_PLOTS_PAGE_CACHE), keyed by a hash of the files, ColdJigRun history, options, and plotting code they're made from. Re-plotting only remakes the pages whose inputs changed, and stitches the PDF together from the rest. Needs pypdf.", action='store_true')
+    parser.add_argument("-j", "--jobs", help="Number of processes to make plots with. Each test type's file for each hybrid is made separately. Default is 1 (no extra processes).", type=int, default=1)
+    parser.add_argument("-w", "--watch", help="With -d, keep watching the directory after plotting, and whenever a file changes, remake only the plots that depend on it and update the PDF. Stop with Ctrl+C.", action='store_true')
+    parser.add_argument("-sn", "--serial_number", help="With -db, the module serial number (for R3s, the half-module serial number). Otherwise taken from a job file, $TC_PLOTS_MODULE_SN, or asked for.")
+    parser.add_argument("--institute", help="With -db, the institute code TC was run at, if multiple TC runs were uploaded. Otherwise taken from a job file, $TC_PLOTS_INSTITUTE, or asked for.")
+    parser.add_argument("--itsdaq_run", help="With -db, the ITSDAQ runNumber, if multiple TC runs were uploaded. Otherwise taken from a job file, $TC_PLOTS_ITSDAQ_RUN_NUMBER, or asked for.")
+    parser.add_argument("--coldjig_run", help="With -db, the ColdJig runNumber, if it can't be worked out. Otherwise taken from a job file, $TC_PLOTS_COLDJIG_RUN_NUMBER, or asked for.")
+    parser.add_argument("--access_code1", help="With -db, database access code 1. Safer to set $ITKDB_ACCESS_CODE1 instead; asked for if neither is given.")
+    parser.add_argument("--access_code2", help="With -db, database access code 2. Safer to set $ITKDB_ACCESS_CODE2 instead; asked for if neither is given.")
+    parser.add_argument("--job_file", help="With -db, a JSON file with any of module_sn, institute, itsdaq_run_number, coldjig_run_number, access_code1, and access_code2. Command line arguments take precedence.")
+    parser.add_argument("--no_prompt", help="With -db, never ask for anything; stop with an error if a needed value wasn't given. For unattended runs.", action='store_true')
+    parser.add_argument("--refresh", help="With -db, fetch everything from the database again, instead of using the local cache of earlier responses.", action='store_true')
+    parser.add_argument("--export_dir", "--export-dir", help="With -db, also write everything fetched to this directory as merged files, so it can be plotted with -d afterwards without querying the database. With -c, columnar caches are written too.")
+    parser.add_argument("--batch_size", help="With -db, the most test runs to ask the database for in a single request. Default is 20.", type=positive_int)
+    parser.add_argument("-s", "--summary_only", "--summary-only", help="Only print the TC overview, results summary, and failed tests, without making any plots (or importing matplotlib). Much quicker, for triaging modules.", action='store_true')
+    parser.add_argument("--summary_json", "--summary-json", help="Also write the overview, results summary, and failed tests to this JSON file. If -, only the JSON is printed.")
+    parser.add_argument("--profile", help="Record the wall time, CPU time, and peak memory of every stage, unit of plots (test type and hybrid), file read, and page drawn, and print a table of where the time went.", action='store_true')
+    parser.add_argument("--profile_stats", "--profile-stats", help="With --profile, also write a cProfile (pstats) dump of the main process to this file.")
+    parser.add_argument("--profile_trace", "--profile-trace", help="With --profile, also write a Chrome trace (JSON) to this file, for chrome://tracing or Perfetto.")
+    args = parser.parse_args()
+
+    if not args.profile and (args.profile_stats is not None or args.profile_trace is not None):
+        parser.error("--profile_stats and --profile_trace need --profile.")
+
+    if args.profile:
+        profile = profiler.start_profiling()
+        stats   = cProfile.Profile() if args.profile_stats is not None else None
+        if stats is not None:
+            stats.enable()
+
+    try:
+        make_plots(args)
+
+    finally:
+        if args.profile:
+            if stats is not None:
+                stats.disable()
+            profiler.stop_profiling()
+            profiler.print_report(profile)
+
+            if stats is not None:
+                stats.dump_stats(args.profile_stats)
+                print(f"{GREEN}cProfile stats written to {args.profile_stats}.{RESET}")
+            if args.profile_trace is not None:
+                profiler.write_trace(profile, args.profile_trace)
+                print(f"{GREEN}Chrome trace written to {args.profile_trace}.{RESET}")
+
+def make_plots(args):
+    '''
+    Make the plots main() was asked for.
+
+    Arguments:
+    args - Type = argparse namespace. From main().
+    '''
+
+    db_options = None #local files
+
+    if args.database: #if getting data from the database
+        import ITkPDB_matters as db #only needed here
+
+        cli_options = {"module_sn"          : args.serial_number,
+                       "institute"          : args.institute,
+                       "itsdaq_run_number"  : args.itsdaq_run,
+                       "coldjig_run_number" : args.coldjig_run,
+                       "access_code1"       : args.access_code1,
+                       "access_code2"       : args.access_code2}
+        db_options  = db.load_db_options(cli_options, args.job_file, prompt=not args.no_prompt, refresh=args.refresh, batch_size=args.batch_size if args.batch_size is not None else db.TEST_RUN_BATCH_SIZE)
+
+    if args.summary_only or args.summary_json == "-": #no plots
+        make_module_summary(args.TC_directory, db_options, args.summary_json)
+        return
+
+    if args.watch and not args.database:
+        from watch_plots import watch_module #only needed here
+
+        if args.summary_json is not None: #printed with the plots
+            make_module_summary(args.TC_directory, json_file=args.summary_json, printout=False)
+
+        watch_module(args.TC_directory, args.tests, args.noise_only, args.histograms, args.cache)
+    else:
+        make_module_plots(args.TC_directory, args.tests, args.noise_only, args.histograms, args.cache, args.jobs, db_options, args.export_dir, page_cache=args.page_cache, summary_json=args.summary_json)
+
+def make_module_plots(TC_directory=None, test_types=ALL_TESTS, noise_only=False, histos=False, caching=False, jobs=1, db_options=None, export_dir=None, output_dir=".", page_cache=False, summary_json=None):
+    '''
+    Make the TC plots for a single module, and put them into a single PDF.
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for the
+                   module (ignored if db_options is given).
+    test_types   - Type = list of string. Test types to be plotted.
+    noise_only   - Type = boolean. Whether or not to only plot the noise for 3PG/10PG.
+    histos       - Type = boolean. Whether or not to make the defect histograms.
+    caching      - Type = boolean. Whether or not to write columnar caches.
+    jobs         - Type = int. Number of processes to make plots with.
+    db_options   - Type = dict. From db.load_db_options(), to get the data from the
+                   database instead of local files. None for local files.
+    export_dir   - Type = string. With db_options, where to also write everything
+                   fetched as merged files. None to not export.
+    output_dir   - Type = string. The directory to write the PDF in.
+    page_cache   - Type = boolean. Whether or not to take unchanged pages from (and
+                   add new ones to) the page cache.
+    summary_json - Type = string. Where to also write the summary as JSON (see
+                   make_module_summary()), from the same files. None to not write it.
+
+    Returns:
+    pdf_name - Type = string. The path of the PDF.
+    '''
+
+    from tc_report import TCReport #imports the plotting scripts
+    from page_cache import PageCache
+
+    set_columnar_caching(caching)
+
+    if db_options is None: #if using local files
+        report = TCReport(TC_directory, test_types=test_types, noise_only=noise_only, histos=histos)
+
+    else: #if getting data from the database
+        report = TCReport.from_database(db_options, test_types=test_types, noise_only=noise_only, histos=histos)
+
+    with report: #so nothing worked out from database data is kept afterwards
+        if summary_json is not None: #the overview and results summary are printed with the plots
+            make_module_summary(TC_directory, db_options, summary_json, printout=False, files=report.discover()[0])
+
+        if db_options is not None and export_dir is not None:
+            import ITkPDB_matters as db #only needed here
+
+            with profiler.span("export", "stage"):
+                db.export_files(report.discover()[0], export_dir, caching)
+
+        #Write each unit's pages into the PDF as soon as they're made
+        pdf_name = report.assemble(output_dir, jobs, caching, PageCache() if page_cache else None)
+
+    print(f"\n{GREEN}Plotting complete!{RESET}")
+
+    return pdf_name
+
+def make_module_summary(TC_directory=None, db_options=None, json_file=None, printout=True, files=None):
+    '''
+    Print the TC overview, results summary, and failed tests for a single module,
+    without making any plots, and optionally write them to a JSON file.
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for the
+                   module (ignored if db_options is given).
+    db_options   - Type = dict. From db.load_db_options(), to get the data from the
+                   database instead of local files. None for local files.
+    json_file    - Type = string. Where to write the summary as JSON. If "-", the
+                   JSON is printed instead of the usual printout. None to not write it.
+    printout     - Type = boolean. Whether or not to print the overview and results
+                   summary (False if they're printed with the plots).
+    files        - Type = dict. All files, sorted by test type, if they've already
+                   been found or fetched (ie. by a TCReport, which forgets them
+                   afterwards). None to find or fetch them here.
+
+    Returns:
+    summary - Type = dict. From make_summary().
+    '''
+
+    json_only = json_file == "-"
+    printout  = printout and not json_only
+
+    #With only JSON going to the terminal, everything else (ie. warnings) goes to stderr
+    with contextlib.redirect_stdout(sys.stderr) if json_only else contextlib.nullcontext():
+        if db_options is None: #if using local files
+            summary = make_summary(files if files is not None else fetch_files(TC_directory), TC_directory, printout=printout)
+        elif files is not None: #already fetched
+            summary = make_summary(files, printout=printout)
+        else: #if getting data from the database
+            import ITkPDB_matters as db #only needed here
+
+            files = db.get_files_by_type(db_options)
+            try:
+                summary = make_summary(files, printout=printout)
+            finally:
+                forget_derived(files) #so it can be freed
+
+    if json_only:
+        print(json.dumps(summary, indent=2))
+
+    elif json_file is not None:
+        with open(json_file, 'w') as f:
+            json.dump(summary, f, indent=2)
+        print(f"{GREEN}Summary written to {json_file}.{RESET}")
+
+    return summary
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,362 @@
+#import libraries
+import numpy as np
+import json
+import os
+import argparse
+
+#What ITSDAQ appends to its runNumber to name each test. The plotting scripts slice
+#these off again (ie. scan[:-18] for the Pedestal Trim), so the lengths matter.
+SUFFIXES = {"IV"   : "_MODULE_IV_AMAC",
+            "PT"   : "_PEDESTAL_TRIM_PPA",
+            "SD"   : "_STROBE_DELAY_PPA",
+            "3PG"  : "_RESPONSE_CURVE_PPA",
+            "10PG" : "_RESPONSE_CURVE_PPA",
+            "NO"   : "_NO_PPA",
+            "OCS"  : "_OPEN_CHANNEL_SEARCH_PPA",
+            "HVS"  : "_HVSTABILITY"}
+
+#The end of each merged file's name, as fetch_files() expects
+FILE_NAMES = {"IV"   : "MODULE_IV_AMAC_TC",
+              "PT"   : "PEDESTAL_TRIM_TC",
+              "SD"   : "STROBE_DELAY_TC",
+              "3PG"  : "3PG_TC",
+              "10PG" : "RESPONSE_CURVE_TC",
+              "NO"   : "NO_TC",
+              "OCS"  : "OPEN_CHANNEL_SEARCH_TC",
+              "HVS"  : "HVSTABILITY"}
+
+#Defects each test can flag
+DEFECT_NAMES = {"PT"   : ["Untrimmable", "Trim range"],
+                "SD"   : ["Bad strobe delay"],
+                "3PG"  : ["High noise", "Low gain", "Dead channel"],
+                "10PG" : ["High noise", "Low gain", "Unbonded"],
+                "NO"   : ["High occupancy"],
+                "OCS"  : ["Open channel"]}
+
+CHANNELS_PER_CHIP = 128
+#ITSDAQ and ColdJig runNumbers, and the date TC started, for every generated module
+ITSDAQ_RUN_NUMBER  = "1234"
+COLDJIG_RUN_NUMBER = "77"
+TC_DATE            = "2025-03-01T12:00:00"
+
+def make_module(directory, n_hybrids=2, n_chips=10, n_cycles=2, defect_rate=0.002, env_rate=0.2, fail_rate=0.1, module_sn="20USEM00000001", seed=0):
+    '''
+    Write a full set of synthetic merged TC files for a single module: a ColdJigRun,
+    MODULE_IV_AMAC_TC and HVSTABILITY file for the module, and PEDESTAL_TRIM_TC,
+    STROBE_DELAY_TC, 3PG_TC, RESPONSE_CURVE_TC, NO_TC and OPEN_CHANNEL_SEARCH_TC files
+    for each hybrid. The same arguments always give the same files.
+
+    Arguments:
+    directory   - Type = string. The directory to write the files to (made if needed).
+    n_hybrids   - Type = int. Number of hybrids on the module.
+    n_chips     - Type = int. Number of ABCs per hybrid.
+    n_cycles    - Type = int. Number of thermal cycles (each with a cold and a warm
+                  IV and full test).
+    defect_rate - Type = float. The chance of any channel being flagged by any
+                  channel-level test, per scan (ten times this for any chip, in
+                  chip-level tests).
+    env_rate    - Type = float. Environmental readings per second.
+    fail_rate   - Type = float. The chance of any test failing.
+    module_sn   - Type = string. The module serial number.
+    seed        - Type = int. Seed for the random number generator.
+
+    Returns:
+    files - Type = list of string. The paths of the files written.
+    '''
+
+    rng        = np.random.default_rng(seed)
+    hybrid_sns = [f"20USEH{n % 2}{n:07d}" for n in range(n_hybrids)]
+    files      = [] #initialize
+
+    os.makedirs(directory, exist_ok=True)
+
+    history, scans_by_type, failed_scans = make_history(n_cycles, fail_rate, rng)
+
+    for test_type in ["PT", "SD", "3PG", "10PG", "NO", "OCS"]:
+        for hybrid_sn in hybrid_sns:
+            data = make_hybrid_file(test_type, hybrid_sn, scans_by_type[test_type], failed_scans, n_chips, defect_rate, rng)
+            files.append(write(data, f"{directory}/{hybrid_sn}_{FILE_NAMES[test_type]}.json"))
+
+    files.append(write(make_IV_file(module_sn, scans_by_type["IV"], failed_scans, rng), f"{directory}/{module_sn}_{FILE_NAMES['IV']}.json"))
+    files.append(write(make_HVS_file(module_sn, scans_by_type["HVS"], rng), f"{directory}/{module_sn}_{FILE_NAMES['HVS']}.json"))
+    files.append(write(make_TC_file(module_sn, history, n_cycles, env_rate, rng), f"{directory}/{module_sn}_ColdJigRun.json"))
+
+    return files
+
+def make_history(n_cycles, fail_rate, rng):
+    '''
+    Make a ColdJig_History, with section names that flag each one warm or cold, and
+    valid or not, the way the ColdJig does, and pick which tests fail.
+
+    Arguments:
+    n_cycles  - Type = int. Number of thermal cycles.
+    fail_rate - Type = float. The chance of any test failing.
+    rng       - Type = numpy random Generator.
+
+    Returns:
+    history       - Type = dict. The ColdJig_History, {section: {"start_time",
+                    "stop_time", and "itsdaq_test_info" if tests were run}}.
+    scans_by_type - Type = dict. {test type: [scans, in the order they were taken]}.
+    failed_scans  - Type = list of string. The scans which failed.
+    '''
+
+    history       = {} #initialize
+    scans_by_type = {test_type: [] for test_type in SUFFIXES}
+    failed_scans  = []
+    time          = 1.7e9 #start time, in seconds since the epoch
+    full_test     = ["PT", "SD", "3PG", "10PG", "NO"]
+
+    def add_section(name, test_types, duration):
+        nonlocal time
+
+        scans = [] #initialize
+        for test_type in test_types:
+            scan = f"{ITSDAQ_RUN_NUMBER}-{sum(len(type_scans) for type_scans in scans_by_type.values()) + 1}{SUFFIXES[test_type]}"
+            scans.append(scan)
+            scans_by_type[test_type].append(scan)
+            if rng.random() < fail_rate:
+                failed_scans.append(scan)
+
+        section = {"start_time": time, "stop_time": time + duration}
+        if scans != []:
+            section["itsdaq_test_info"] = {"all_tests": scans}
+
+        history[f"{len(history)}_{name}"] = section
+        time += duration
+
+    add_section("TURN_ON", [], 60)
+    add_section("TC_START", [], 60)
+    add_section("ROOM_TEMPERATURE_IV", ["IV"], 600)
+    add_section("TC_WARM_OPEN_CHANNEL_SEARCH", ["OCS"], 600)
+
+    for cycle in range(n_cycles):
+        add_section(f"COOLDOWN_{cycle}", [], 1800)
+        add_section(f"TC_COLD_IV_{cycle}", ["IV"], 600)
+        add_section(f"TC_COLD_TEST_{cycle}", full_test, 1200)
+        add_section(f"WARMUP_{cycle}", [], 1800)
+        add_section(f"TC_WARM_IV_{cycle}", ["IV"], 600)
+        add_section(f"TC_WARM_TEST_{cycle}", full_test, 1200)
+
+    add_section("TC_WARM_OPEN_CHANNEL_SEARCH_END", ["OCS"], 600)
+    add_section("TC_END_HVSTABILITY", ["HVS"], 600)
+
+    return history, scans_by_type, failed_scans
+
+def make_hybrid_file(test_type, hybrid_sn, scans, failed_scans, n_chips, defect_rate, rng):
+    '''
+    Make the merged file for a single hybrid-level test type.
+
+    Arguments:
+    test_type    - Type = string. PT, SD, 3PG, 10PG, NO, or OCS.
+    hybrid_sn    - Type = string. The hybrid serial number.
+    scans        - Type = list of string. The scans of this type, in order.
+    failed_scans - Type = list of string. Every scan which failed.
+    n_chips      - Type = int. Number of ABCs on the hybrid.
+    defect_rate  - Type = float. As for make_module().
+    rng          - Type = numpy random Generator.
+
+    Returns:
+    data - Type = dict. The merged file's contents.
+    '''
+
+    n_scans    = len(scans)
+    n_channels = n_chips * CHANNELS_PER_CHIP
+    results    = {} #initialize
+    properties = {"itsdaq_test_info": {"all_tests": scans, "failed_tests": [scan for scan in scans if scan in failed_scans]},
+                  "det_info": {"name": hybrid_sn}}
+
+    if test_type == "PT":
+        for stream in ["under", "away"]:
+            results[f"trim_{stream}"] = rng.integers(0, 32, (n_scans, n_channels)).tolist()
+
+    elif test_type == "SD":
+        for stream in ["away", "under"]:
+            strobe_delays = rng.integers(20, 40, (n_scans, max(n_chips, 12)))
+            strobe_delays[:, n_chips:] = -1 #no chip
+            results[f"StrobeDelay_{stream}"] = strobe_delays.tolist()
+
+    elif test_type in ["3PG", "10PG"]:
+        properties["fit_type_code"] = 4 if test_type == "3PG" else 3
+        for stream in ["under", "away"]:
+            results[f"gain_{stream}"]  = rng.normal(100, 5, (n_scans, n_channels)).round(3).tolist()
+            results[f"innse_{stream}"] = rng.normal(600, 30, (n_scans, n_channels)).round(3).tolist()
+            results[f"vt50_{stream}"]  = rng.normal(50, 3, (n_scans, n_channels)).round(3).tolist()
+
+    elif test_type == "NO":
+        for stream in ["under", "away"]:
+            results[f"occupancy_mean_{stream}"] = rng.exponential(1e-6, (n_scans, n_chips)).tolist()
+        for stream in ["under", "away"]:
+            results[f"enc_est_{stream}"] = rng.normal(600, 30, (n_scans, n_chips)).round(3).tolist()
+
+    elif test_type == "OCS":
+        for stream in ["under", "away"]:
+            results[f"noise_{stream}"] = rng.normal(20, 2, (n_scans, n_channels)).round(3).tolist()
+
+    data = {"component"  : hybrid_sn,
+            "properties" : properties,
+            "results"    : results,
+            "defects"    : make_defects(test_type, scans, n_chips, defect_rate, rng)}
+
+    return data
+
+def make_defects(test_type, scans, n_chips, defect_rate, rng):
+    '''
+    Make the defects for a single hybrid-level test type. Channel-level tests flag
+    single channels, and (for Response Curves) the odd range of channels; chip-level
+    tests flag whole chips.
+
+    Arguments:
+    test_type   - Type = string. PT, SD, 3PG, 10PG, NO, or OCS.
+    scans       - Type = list of string. The scans of this type, in order.
+    n_chips     - Type = int. Number of ABCs on the hybrid.
+    defect_rate - Type = float. As for make_module().
+    rng         - Type = numpy random Generator.
+
+    Returns:
+    defects - Type = list of dict. The defects, as in a merged file.
+    '''
+
+    chip_level = test_type in ["SD", "NO"]
+    n_units    = n_chips if chip_level else n_chips * CHANNELS_PER_CHIP
+    unit_rate  = min(defect_rate * 10, 1) if chip_level else defect_rate
+    defects    = [] #initialize
+
+    for scan in scans:
+        run_number = scan[:-len(SUFFIXES[test_type])] #ie. 1234-6
+
+        for stream in ["under", "away"]:
+
+            for unit in rng.choice(n_units, rng.binomial(n_units, unit_rate), replace=False):
+                defect_properties = {"chip_bank": stream, "runNumber": run_number, "chip_in_histo": int(unit) if chip_level else int(unit) // CHANNELS_PER_CHIP}
+                if not chip_level:
+                    defect_properties["channel"] = int(unit)
+                defects.append({"name": str(rng.choice(DEFECT_NAMES[test_type])), "properties": defect_properties})
+
+            if test_type in ["3PG", "10PG"] and rng.random() < 0.3: #a range of channels
+                first_channel = int(rng.integers(0, n_units - 8))
+                defects.append({"name": "Dead channel", "properties": {"chip_bank": stream, "runNumber": run_number, "chip_in_histo": first_channel // CHANNELS_PER_CHIP, "channel_from": first_channel, "channel_to": first_channel + 4}})
+
+    return defects
+
+def make_IV_file(module_sn, scans, failed_scans, rng):
+    '''
+    Make the module's MODULE_IV_AMAC_TC merged file.
+
+    Arguments:
+    module_sn    - Type = string. The module serial number.
+    scans        - Type = list of string. The IV scans, in order.
+    failed_scans - Type = list of string. Every scan which failed.
+    rng          - Type = numpy random Generator.
+
+    Returns:
+    data - Type = dict. The merged file's contents.
+    '''
+
+    voltages = np.tile(np.arange(0, -550, -10), (len(scans), 1))
+    currents = rng.normal(10, 1, (len(scans), 1)) + 0.01 * np.abs(voltages)
+
+    data = {"component"  : module_sn,
+            "properties" : {"itsdaq_test_info": {"all_tests": scans, "failed_tests": [scan for scan in scans if scan in failed_scans]}},
+            "results"    : {"VOLTAGE": voltages.tolist(), "CURRENT": currents.tolist(), "VBD": rng.choice([600., 520.], len(scans)).tolist()},
+            "defects"    : []}
+
+    return data
+
+def make_HVS_file(module_sn, scans, rng):
+    '''
+    Make the module's HVSTABILITY merged file.
+
+    Arguments:
+    module_sn - Type = string. The module serial number.
+    scans     - Type = list of string. The HV stability scans.
+    rng       - Type = numpy random Generator.
+
+    Returns:
+    data - Type = dict. The merged file's contents.
+    '''
+
+    data = {"component"  : module_sn,
+            "properties" : {"itsdaq_test_info": {"all_tests": scans, "failed_tests": []}},
+            "results"    : {"CURRENT": rng.normal(1e-8, 1e-9, 100).tolist()},
+            "defects"    : []}
+
+    return data
+
+def make_TC_file(module_sn, history, n_cycles, env_rate, rng):
+    '''
+    Make the module's ColdJigRun file, with environmental readings over the whole run.
+
+    Arguments:
+    module_sn - Type = string. The module serial number.
+    history   - Type = dict. The ColdJig_History, from make_history().
+    n_cycles  - Type = int. Number of thermal cycles.
+    env_rate  - Type = float. Environmental readings per second.
+    rng       - Type = numpy random Generator.
+
+    Returns:
+    data - Type = dict. The ColdJigRun file's contents.
+    '''
+
+    start       = min(section["start_time"] for section in history.values())
+    stop        = max(section["stop_time"] for section in history.values())
+    timestamps  = np.arange(start, stop, 1 / env_rate)
+    temperature = 20 - 25 * (np.sin((timestamps - start) / 3600) > 0) #cycling between 20 and -5
+
+    environmental_data = {"timestamps": timestamps.tolist()}
+    for chuck in range(1, 3):
+        environmental_data[f"DP{chuck}"]          = (-50 + rng.normal(0, 1, len(timestamps))).round(2).tolist()
+        environmental_data[f"thermometer{chuck}"] = (temperature + rng.normal(0, 0.2, len(timestamps))).round(2).tolist()
+
+    summary = {"max_temperature"    : "21.0",
+               "min_temperature"    : "-35.0",
+               "max_humidity"       : "1.2",
+               "min_humidity"       : "0.1",
+               "cold_tests"         : n_cycles,
+               "warm_tests"         : n_cycles,
+               "cold_shunted_tests" : 0,
+               "duration_hours"     : f"{(stop - start) / 3600:.2f}",
+               "coldjig_runNumbers" : [COLDJIG_RUN_NUMBER],
+               "itsdaq_runNumbers"  : [ITSDAQ_RUN_NUMBER]}
+
+    data = {"component"  : module_sn,
+            "date"       : TC_DATE,
+            "runNumber"  : COLDJIG_RUN_NUMBER,
+            "properties" : {"ColdJig_History": history},
+            "results"    : {"environmental_data": environmental_data, "summary": summary}}
+
+    return data
+
+def write(data, path):
+    '''
+    Write a merged file.
+
+    Arguments:
+    data - Type = dict. The file's contents.
+    path - Type = string. Where to write it.
+
+    Returns:
+    path - Type = string. The same path.
+    '''
+
+    with open(path, 'w') as f:
+        json.dump(data, f)
+
+    return path
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+      description="Write a full set of synthetic merged TC files for a single module, for testing and benchmarking the plotting scripts.")
+    parser.add_argument("directory", help="Directory to write the merged files to.")
+    parser.add_argument("--hybrids", help="Number of hybrids. Default is 2.", type=int, default=2)
+    parser.add_argument("--chips", help="Number of ABCs per hybrid. Default is 10.", type=int, default=10)
+    parser.add_argument("--cycles", help="Number of thermal cycles. Default is 2.", type=int, default=2)
+    parser.add_argument("--defect_rate", help="Chance of any channel being flagged by each scan (ten times this for chips, in chip-level tests). Default is 0.002.", type=float, default=0.002)
+    parser.add_argument("--env_rate", help="Environmental readings per second. Default is 0.2.", type=float, default=0.2)
+    parser.add_argument("--fail_rate", help="Chance of any test failing. Default is 0.1.", type=float, default=0.1)
+    parser.add_argument("--module_sn", help="Module serial number. Default is 20USEM00000001.", default="20USEM00000001")
+    parser.add_argument("--seed", help="Random seed. The same arguments and seed always give the same files. Default is 0.", type=int, default=0)
+    args = parser.parse_args()
+
+    files = make_module(args.directory, args.hybrids, args.chips, args.cycles, args.defect_rate, args.env_rate, args.fail_rate, args.module_sn, args.seed)
+    print(f"Wrote {len(files)} files to {args.directory}.")
@@ -0,0 +1,363 @@
+#import libraries
+import os
+import io
+import sys
+import json
+import hashlib
+import tempfile
+import contextlib
+import profiler
+from common_functions import *
+
+#Where rendered pages are kept, unless $TC_PLOTS_PAGE_CACHE says otherwise
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "tc_summary_plotting", "pages")
+#Every module that has a say in what a page looks like. If any of them change, every
+#page is made again.
+PLOTTING_MODULES = ["common_functions", "coldjig_timeline", "coldjig_stream", "columnar_cache", "defect_index", "scan_scatter",
+                    "tc_summary", "IV", "PT", "SD", "RC", "NO", "OCS", "TC", "defect_plotting", "render_units", "page_writer", "page_cache"]
+#Unit types whose pages depend on --noise_only
+NOISE_ONLY_UNITS = ["3PG", "10PG"]
+
+#Hashes of local files, {absolute path: (modification time (ns), size, digest)}, so
+#each file is only read once per run unless it changes
+file_digests = {}
+#The hash of the plotting code, worked out the first time it's needed
+code_version = None
+
+class PageCache:
+    '''
+    A local copy of the pages made for each unit of work (ie. one hybrid's PT plots),
+    so re-plotting a module only makes the pages whose inputs have changed, and the
+    rest of the PDF is stitched together from the cache. Each unit's pages are kept as
+    a PDF of their own, named for a hash of everything they're made from (see
+    get_unit_keys()), alongside whatever was printed while they were made, so the
+    terminal printout is the same whether or not they came from the cache. Files are
+    written to a temporary name and moved into place, so several processes can share
+    the cache. Anything in it can be deleted at any time; it's just made again.
+
+    Arguments:
+    directory - Type = string. Where the cache lives (made if needed). If None,
+                $TC_PLOTS_PAGE_CACHE, or DEFAULT_CACHE_DIR.
+    '''
+
+    def __init__(self, directory=None):
+
+        self.directory = directory or os.environ.get("TC_PLOTS_PAGE_CACHE") or DEFAULT_CACHE_DIR
+
+        os.makedirs(self.directory, mode=0o700, exist_ok=True) #module results, so only
+                                                                #readable by the user
+
+    def get_path(self, key, extension):
+        '''
+        Get the file something is kept in.
+
+        Arguments:
+        key       - Type = string. A hash, from get_unit_keys() or get_file_digest().
+        extension - Type = string. What's kept (".pdf" for pages, ".txt" for their
+                    printout, ".scans.json" for a file's scans).
+
+        Returns:
+        path - Type = string. The path of the cache file.
+        '''
+
+        path = os.path.join(self.directory, key[:2], f"{key}{extension}")
+
+        return path
+
+    def write(self, path, contents):
+        '''
+        Write a cache file, replacing anything already there.
+
+        Arguments:
+        path     - Type = string. From get_path().
+        contents - Type = bytes. What to write.
+        '''
+
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                f.write(contents)
+            os.replace(temp_path, path) #atomic, so readers see all or nothing
+
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    @profiler.profiled("load")
+    def load(self, key):
+        '''
+        Get a unit's pages from the cache.
+
+        Arguments:
+        key - Type = string. The unit's key, from get_unit_keys().
+
+        Returns:
+        pages    - Type = bytes. A PDF of the unit's pages, or None if they aren't cached.
+        printout - Type = string. What was printed while they were made (None if they
+                   aren't cached).
+        '''
+
+        try:
+            with open(self.get_path(key, ".txt"), 'r') as f: #written last, so marks
+                printout = f.read()                           #complete pages
+            with open(self.get_path(key, ".pdf"), 'rb') as f:
+                pages = f.read()
+
+        except OSError: #not cached
+            return None, None
+
+        return pages, printout
+
+    def store(self, key, pages, printout):
+        '''
+        Put a unit's pages in the cache.
+
+        Arguments:
+        key      - Type = string. The unit's key, from get_unit_keys().
+        pages    - Type = bytes. A PDF of the unit's pages, from render_pages().
+        printout - Type = string. What was printed while they were made.
+        '''
+
+        try:
+            self.write(self.get_path(key, ".pdf"), pages)
+            self.write(self.get_path(key, ".txt"), printout.encode())
+
+        except OSError: #ie. out of space, the PDF is still written
+            print(f"{YELLOW}Could not add pages to the page cache in {self.directory}.{RESET}")
+
+    def get_scans(self, digest, data_file):
+        '''
+        Get the scans in a file, without reading the whole file if they've been looked
+        up before.
+
+        Arguments:
+        digest    - Type = string. The file's hash, from get_file_digest().
+        data_file - Type = string or dict. The file (or its data, if from the DB).
+
+        Returns:
+        scans - Type = list of string. As from get_scans().
+        '''
+
+        if type(data_file) is dict: #already loaded
+            return get_scans(data_file)
+
+        path = self.get_path(digest, ".scans.json")
+
+        try:
+            with open(path, 'r') as f:
+                scans = json.load(f)
+
+        except (OSError, ValueError): #not looked up yet
+            scans = list(get_scans(retrieve_data(data_file)))
+            try:
+                self.write(path, json.dumps(scans).encode())
+            except OSError:
+                pass #looked up again next time
+
+        return scans
+
+def encode_value(value):
+    '''
+    Make anything json can't write (ie. numpy arrays from a columnar cache, or a
+    streamed ColdJigRun file) into something it can, for hashing.
+
+    Arguments:
+    value - Type = any. What json couldn't write.
+
+    Returns:
+    encoded - Type = list or string.
+    '''
+
+    encoded = value.tolist() if hasattr(value, "tolist") else str(value)
+
+    return encoded
+
+def get_hash(value):
+    '''
+    Hash anything json can write.
+
+    Arguments:
+    value - Type = any. What to hash.
+
+    Returns:
+    digest - Type = string. The SHA-256 hash, in hex.
+    '''
+
+    digest = hashlib.sha256(json.dumps(value, sort_keys=True, default=encode_value).encode()).hexdigest()
+
+    return digest
+
+def get_file_digest(data_file):
+    '''
+    Hash a file's contents. Local files are hashed as they are on disk, so renaming
+    or touching a file doesn't change its hash, but re-merging it does.
+
+    Arguments:
+    data_file - Type = string or dict. A path to a local file, or a data dictionary
+                from the database.
+
+    Returns:
+    digest - Type = string. The SHA-256 hash, in hex.
+    '''
+
+    if type(data_file) is dict: #if the data_file was pulled from DB
+        derived = get_derived(data_file)
+        if "digest" not in derived:
+            derived["digest"] = get_hash(data_file)
+        return derived["digest"]
+
+    path = os.path.abspath(data_file)
+    stat = os.stat(path)
+
+    if path in file_digests and file_digests[path][:2] == (stat.st_mtime_ns, stat.st_size):
+        return file_digests[path][2] #already hashed
+
+    file_hash = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(2**20), b''):
+            file_hash.update(chunk)
+
+    digest = file_hash.hexdigest()
+    file_digests[path] = (stat.st_mtime_ns, stat.st_size, digest)
+
+    return digest
+
+def get_code_version():
+    '''
+    Hash the plotting code, and everything else that changes how a page is drawn
+    (matplotlib's version, and PAGE_RC).
+
+    Returns:
+    code_version - Type = string. The SHA-256 hash, in hex.
+    '''
+
+    global code_version
+
+    if code_version is None:
+        import matplotlib #only needed when plotting
+
+        code_hash = hashlib.sha256(f"{matplotlib.__version__}:{sorted(PAGE_RC.items())}".encode())
+        directory = os.path.dirname(os.path.abspath(__file__))
+
+        for module in PLOTTING_MODULES:
+            with open(os.path.join(directory, f"{module}.py"), 'rb') as f:
+                code_hash.update(f.read())
+
+        code_version = code_hash.hexdigest()
+
+    return code_version
+
+def get_history_slice(scans, TC_data):
+    '''
+    Get the part of the ColdJig_History a per-hybrid unit's pages depend on: the
+    sections each of its scans was taken in, whether each was cold, and the order its
+    scans are plotted in. Anything else in the ColdJigRun file (ie. the environmental
+    data, or another hybrid's scans) can change without the pages changing.
+
+    Arguments:
+    scans   - Type = list of string. The unit's scans.
+    TC_data - the contents of a pre-opened ColdJigRun JSON file.
+
+    Returns:
+    history_slice - Type = dict. {"sections": [[scan, [[section, cold], ...]], ...],
+                    "sorted": [warm scans, cold scans]}.
+    '''
+
+    timeline = get_timeline(TC_data)
+
+    history_slice = {"sections" : [[scan, [[section, timeline.is_cold(section)] for section in timeline.scan_sections.get(scan, [])]] for scan in scans],
+                     "sorted"   : list(timeline.sort_scans(scans))}
+
+    return history_slice
+
+@profiler.profiled("analysis")
+def get_unit_keys(units, settings, cache):
+    '''
+    Work out the key of each unit's pages: a hash of everything they're made from.
+    For a per-hybrid unit, that's its file, its slice of the ColdJig_History (see
+    get_history_slice()), and --noise_only (3PG/10PG only). The defect histograms
+    depend on every file and the whole ColdJig_History, and the TC summary on every
+    file, the ColdJigRun file included. Every key also has the plotting code version
+    in it. Which units are made at all (-t, -hg) only decides which pages are stitched
+    together, so plotting fewer test types afterwards uses the same cached pages.
+
+    Arguments:
+    units    - Type = list of tuple. From get_render_units().
+    settings - Type = dict. As for render_unit().
+    cache    - Type = PageCache. Where each file's scans are looked up.
+
+    Returns:
+    keys - Type = list of string. One per unit, in the same order.
+    '''
+
+    TC_data = retrieve_data(settings["TC_file"], streaming=True)
+    code    = get_code_version()
+    keys    = [] #initialize
+
+    for unit_type, data_file in units:
+
+        if data_file is not None: #per-hybrid
+            digest = get_file_digest(data_file)
+            inputs = {"file"    : digest,
+                      "history" : get_history_slice(cache.get_scans(digest, data_file), TC_data),
+                      "options" : {"noise_only": settings["noise_only"]} if unit_type in NOISE_ONLY_UNITS else {}}
+
+        else: #every file (but the histograms only need the history from the ColdJigRun file)
+            files = unsort_files({file_type: settings["files"][file_type] for file_type in settings["files"] if unit_type == "TC" or file_type != "TC"})
+            if settings["TC_directory"] is not None: #if using local files
+                files = [f'{settings["TC_directory"]}/{file}' for file in files]
+            inputs = {"files": [get_file_digest(file) for file in files]}
+            if unit_type == "histograms":
+                inputs["history"] = TC_data["properties"]["ColdJig_History"]
+
+        keys.append(get_hash({"unit": unit_type, "inputs": inputs, "code": code}))
+
+    return keys
+
+class Tee:
+    '''
+    Writes everything to several streams at once.
+
+    Arguments:
+    streams - Type = file-like objects. Where everything goes.
+    '''
+
+    def __init__(self, *streams):
+
+        self.streams = streams
+
+    def write(self, text):
+
+        for stream in self.streams:
+            stream.write(text)
+
+        return len(text)
+
+    def flush(self):
+
+        for stream in self.streams:
+            stream.flush()
+
+def record_printout(function, *args):
+    '''
+    Call a function, keeping a copy of everything it prints (which is still printed
+    as usual).
+
+    Arguments:
+    function - Type = function. What to call.
+    Everything else is passed on to function.
+
+    Returns:
+    result   - What function returns.
+    printout - Type = string. Everything it printed.
+    '''
+
+    printout = io.StringIO()
+
+    with contextlib.redirect_stdout(Tee(sys.stdout, printout)):
+        result = function(*args)
+
+    return result, printout.getvalue()
@@ -0,0 +1,125 @@
+#import libraries
+import io
+import os
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_pdf import PdfPages
+from common_functions import *
+import profiler
+
+try: #pypdf is optional; without it, worker processes hand back figures, not pages
+    import pypdf
+except ImportError:
+    pypdf = None
+
+class PageWriter:
+    '''
+    Writes the PDF as the plots are made, instead of holding on to every figure until
+    the end. Pages are handed over one unit of work (ie. one hybrid's PT plots) at a
+    time, possibly out of order when units are made in parallel. Units which turn up
+    early wait in a small reorder buffer until every unit before them has been written,
+    so the page order never changes. Each figure is closed as soon as it has been
+    written, so memory use doesn't grow with the number of pages. The PDF is written to
+    a temporary file, which is only moved into place once it's finished, so a run that
+    fails partway leaves any earlier PDF as it was.
+
+    Arguments:
+    pdf_name - Type = string. The name of the PDF to write.
+    joined   - Type = boolean. If True, units are handed over as PDFs of their own
+               (bytes), which are joined with pypdf. Otherwise, they are handed over as
+               lists of matplotlib figures, which are drawn here.
+    '''
+
+    def __init__(self, pdf_name, joined=False):
+
+        self.pdf_name  = pdf_name
+        self.joined    = joined
+        self.pending   = {} #initialize, {unit number: pages}, units made early
+        self.next_unit = 0  #the next unit to be written
+
+        self.temp_name = f"{pdf_name}.tmp{os.getpid()}" #same directory, so it can be
+                                                       #moved into place
+
+        if joined:
+            self.pdf = pypdf.PdfWriter()
+        else:
+            self.pdf = PdfPages(self.temp_name) #written to as pages come in
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.close()
+        else: #something went wrong, so the PDF would be missing pages
+            self.discard()
+
+    def add(self, unit_number, pages):
+        '''
+        Hand over the pages of a single unit, and write everything that is now in order.
+
+        Arguments:
+        unit_number - Type = int. The unit's position in page order (starting at 0).
+        pages       - Type = list of matplotlib figures, or bytes (a PDF).
+        '''
+
+        self.pending[unit_number] = pages
+
+        while self.next_unit in self.pending:
+            self.write(self.pending.pop(self.next_unit))
+            self.next_unit += 1
+
+    def write(self, pages):
+        '''
+        Write a unit's pages to the PDF, then let them go.
+
+        Arguments:
+        pages - Type = list of matplotlib figures, or bytes (a PDF).
+        '''
+
+        if self.joined:
+            with profiler.span("join pages", "draw"):
+                self.pdf.append(io.BytesIO(pages))
+
+        else:
+            for plot in pages:
+                save_page(self.pdf, plot)
+                plt.close(plot) #free the figure
+
+    def close(self):
+        '''
+        Finish writing the PDF. Any unit that never turned up (ie. its worker failed)
+        leaves everything after it unwritten.
+        '''
+
+        if self.pending != {}:
+            print(f"{YELLOW}Units {sorted(self.pending)} were made, but not written, as unit {self.next_unit} is missing.{RESET}")
+
+        try:
+            with profiler.span("write PDF", "draw"):
+                if self.joined:
+                    with open(self.temp_name, 'wb') as f:
+                        self.pdf.write(f)
+                else:
+                    self.pdf.close()
+            os.replace(self.temp_name, self.pdf_name) #atomic, so readers see all or nothing
+
+        except BaseException:
+            self.discard()
+            raise
+
+    def discard(self):
+        '''
+        Stop writing the PDF without finishing it, leaving any earlier PDF of the same
+        name as it was.
+        '''
+
+        if not self.joined:
+            try:
+                self.pdf.close()
+            except Exception: #ie. nothing written yet
+                pass
+
+        try:
+            os.remove(self.temp_name)
+        except OSError: #already gone
+            pass
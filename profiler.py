@@ -0,0 +1,320 @@
+#import libraries
+import os
+import sys
+import json
+import time
+import threading
+import functools
+import contextlib
+
+try: #resource is Unix-only; without it, peak RSS isn't recorded
+    import resource
+except ImportError:
+    resource = None
+
+#The profile being recorded, or None when profiling is off. Everything instrumented
+#checks this first, so profiling costs next to nothing when it's off.
+active_profile = None
+#What span() hands back when profiling is off. Reusable, so nothing is made per call.
+NO_SPAN = contextlib.nullcontext()
+#How many rows of the ranked table to print
+REPORT_ROWS = 30
+
+def get_peak_rss():
+    '''
+    Get the most memory this process has held at once, so far.
+
+    Returns:
+    peak_rss - Type = float. Peak resident set size in MiB, or None if it can't be
+               found on this platform.
+    '''
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss = peak_rss / 2**20 if sys.platform == "darwin" else peak_rss / 2**10 #bytes
+                                                                                   #on macOS, KiB otherwise
+    return peak_rss
+
+class Profile:
+    '''
+    A record of every span of work (a stage, a unit of plots, a file being read, a
+    figure being drawn, ...) timed while profiling is on. Each span has its wall time,
+    the process's CPU time over the span, and the process's peak RSS when it ended.
+    Spans can be nested; each thread keeps its own stack, so spans in database worker
+    threads don't get mixed up with the main thread's.
+    '''
+
+    def __init__(self):
+
+        self.records = [] #initialize, every span in the order they started
+        self.start   = time.perf_counter()
+        self.lock    = threading.Lock()
+        self.local   = threading.local() #each thread's stack of open spans
+
+    @contextlib.contextmanager
+    def span(self, name, category):
+        '''
+        Time everything done inside a with block.
+
+        Arguments:
+        name     - Type = string. What's being done (ie. "savefig", or "PT 20USEH...").
+        category - Type = string. What kind of work it is (ie. "stage", "unit",
+                   "load", "analysis", "draw", or "database").
+
+        Returns (yields):
+        record - Type = dict. The span's record, so its name can be filled in once
+                 it's known.
+        '''
+
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+
+        record = {"name"     : name,
+                  "category" : category,
+                  "pid"      : os.getpid(),
+                  "tid"      : threading.get_ident(),
+                  "parent"   : stack[-1] if stack != [] else None,
+                  "start"    : time.perf_counter()}
+
+        with self.lock:
+            index = len(self.records)
+            self.records.append(record)
+
+        stack.append(index)
+        cpu_start = time.process_time()
+
+        try:
+            yield record
+        finally:
+            record["wall"]     = time.perf_counter() - record["start"]
+            record["cpu"]      = time.process_time() - cpu_start
+            record["peak_rss"] = get_peak_rss()
+            stack.pop()
+
+    def add_records(self, records):
+        '''
+        Add the spans recorded by another process (ie. a worker making plots).
+
+        Arguments:
+        records - Type = list of dict. The other profile's records.
+        '''
+
+        with self.lock:
+            offset = len(self.records)
+            for record in records:
+                record = dict(record, parent=None if record["parent"] is None else record["parent"] + offset)
+                self.records.append(record)
+
+def start_profiling():
+    '''
+    Start recording a profile. While it's on, matplotlib's tight_layout is timed too.
+
+    Returns:
+    profile - Type = Profile. The profile being recorded.
+    '''
+
+    global active_profile
+    import matplotlib.figure
+
+    active_profile = Profile()
+
+    #Only wrapped while profiling, so it costs nothing otherwise
+    tight_layout = matplotlib.figure.Figure.tight_layout
+    if not hasattr(tight_layout, "unwrapped"):
+
+        @functools.wraps(tight_layout)
+        def timed_tight_layout(*args, **kwargs):
+            return timed_call(tight_layout, "tight_layout", "draw", *args, **kwargs)
+
+        timed_tight_layout.unwrapped = tight_layout
+        matplotlib.figure.Figure.tight_layout = timed_tight_layout
+
+    return active_profile
+
+def stop_profiling():
+    '''
+    Stop recording the profile.
+
+    Returns:
+    profile - Type = Profile. The profile that was being recorded (None if there
+              wasn't one).
+    '''
+
+    global active_profile
+    import matplotlib.figure
+
+    tight_layout = getattr(matplotlib.figure.Figure.tight_layout, "unwrapped", None)
+    if tight_layout is not None:
+        matplotlib.figure.Figure.tight_layout = tight_layout
+
+    profile, active_profile = active_profile, None
+
+    return profile
+
+def span(name, category):
+    '''
+    Time everything done inside a with block, if profiling is on. Otherwise, does
+    nothing.
+
+    Arguments:
+    name     - Type = string. What's being done.
+    category - Type = string. What kind of work it is (see Profile.span()).
+
+    Returns:
+    context - The span (which yields its record), or NO_SPAN (which yields None).
+    '''
+
+    if active_profile is None:
+        return NO_SPAN
+
+    return active_profile.span(name, category)
+
+def timed_call(function, name, category, *args, **kwargs):
+    '''
+    Call a function inside a span, if profiling is on.
+
+    Arguments:
+    function - Type = function. What to call.
+    name     - Type = string. The span's name.
+    category - Type = string. The span's category.
+    Everything else is passed on to function.
+
+    Returns:
+    What function returns.
+    '''
+
+    if active_profile is None:
+        return function(*args, **kwargs)
+
+    with active_profile.span(name, category):
+        return function(*args, **kwargs)
+
+def profiled(category):
+    '''
+    Decorator, timing every call of a function as a span named for the function, if
+    profiling is on.
+
+    Arguments:
+    category - Type = string. The span's category.
+
+    Returns:
+    decorator - Type = function.
+    '''
+
+    def decorator(function):
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            return timed_call(function, function.__name__, category, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+def summarize(profile):
+    '''
+    Add up the spans of a profile by category and name. Self time is the wall time
+    not spent in any span inside it, so adding up self times never counts anything
+    twice.
+
+    Arguments:
+    profile - Type = Profile.
+
+    Returns:
+    rows - Type = list of dict. "category", "name", "calls", "wall", "self", "cpu",
+           and "peak_rss" (the highest, in MiB), ranked by self time.
+    '''
+
+    records  = [record for record in profile.records if "wall" in record] #finished
+    children = {} #initialize, {record index: total wall time of the spans inside it}
+
+    for record in records:
+        if record["parent"] is not None:
+            children[record["parent"]] = children.get(record["parent"], 0.0) + record["wall"]
+
+    rows = {} #initialize, {(category, name): row}
+    for index, record in enumerate(profile.records):
+        if "wall" not in record:
+            continue
+
+        key = (record["category"], record["name"])
+        if key not in rows:
+            rows[key] = {"category": record["category"], "name": record["name"], "calls": 0, "wall": 0.0, "self": 0.0, "cpu": 0.0, "peak_rss": None}
+
+        row = rows[key]
+        row["calls"] += 1
+        row["wall"]  += record["wall"]
+        row["self"]  += max(record["wall"] - children.get(index, 0.0), 0.0)
+        row["cpu"]   += record["cpu"]
+        if record["peak_rss"] is not None:
+            row["peak_rss"] = max(row["peak_rss"] or 0.0, record["peak_rss"])
+
+    rows = sorted(rows.values(), key=lambda row: row["self"], reverse=True)
+
+    return rows
+
+def print_report(profile):
+    '''
+    Print a table of where the time went, ranked by self time, and the time taken by
+    each test type (every hybrid's plots added up).
+
+    Arguments:
+    profile - Type = Profile.
+    '''
+
+    rows  = summarize(profile)
+    total = time.perf_counter() - profile.start
+
+    print(f"\n{'Category':<10}{'Name':<40}{'Calls':>7}{'Self (s)':>10}{'Total (s)':>11}{'CPU (s)':>9}{'Peak RSS (MiB)':>16}")
+    for row in rows[:REPORT_ROWS]:
+        peak_rss = "-" if row["peak_rss"] is None else f"{row['peak_rss']:.0f}"
+        print(f"{row['category']:<10}{row['name'][:39]:<40}{row['calls']:>7}{row['self']:>10.3f}{row['wall']:>11.3f}{row['cpu']:>9.3f}{peak_rss:>16}")
+    if len(rows) > REPORT_ROWS:
+        print(f"... and {len(rows) - REPORT_ROWS} more.")
+
+    #Every hybrid's units of the same type, added up
+    by_type = {} #initialize, {test type: [wall, cpu, peak RSS]}
+    for row in rows:
+        if row["category"] == "unit":
+            test_type = row["name"].split()[0]
+            totals    = by_type.setdefault(test_type, [0.0, 0.0, None])
+            totals[0] += row["wall"]
+            totals[1] += row["cpu"]
+            if row["peak_rss"] is not None:
+                totals[2] = max(totals[2] or 0.0, row["peak_rss"])
+
+    if by_type != {}:
+        print(f"\n{'Test type':<12}{'Total (s)':>11}{'CPU (s)':>9}{'Peak RSS (MiB)':>16}")
+        for test_type, (wall, cpu, peak_rss) in sorted(by_type.items(), key=lambda item: item[1][0], reverse=True):
+            print(f"{test_type:<12}{wall:>11.3f}{cpu:>9.3f}{'-' if peak_rss is None else f'{peak_rss:.0f}':>16}")
+
+    print(f"\nProfiled {total:.3f} s. Self time is time not spent in any other span; units made by worker processes (-j) overlap.")
+
+def write_trace(profile, trace_file):
+    '''
+    Write a profile as a Chrome trace (JSON), to be opened in chrome://tracing or
+    Perfetto, with a row for each process and thread.
+
+    Arguments:
+    profile    - Type = Profile.
+    trace_file - Type = string. Where to write it.
+    '''
+
+    events = [] #initialize
+    for record in profile.records:
+        if "wall" not in record:
+            continue
+        events.append({"name" : record["name"],
+                       "cat"  : record["category"],
+                       "ph"   : "X", #a complete event, with a duration
+                       "ts"   : (record["start"] - profile.start) * 1e6, #microseconds
+                       "dur"  : record["wall"] * 1e6,
+                       "pid"  : record["pid"],
+                       "tid"  : record["tid"],
+                       "args" : {"cpu_s": record["cpu"], "peak_rss_mib": record["peak_rss"]}})
+
+    with open(trace_file, 'w') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,377 @@
+#import libraries
+import io
+import matplotlib
+import matplotlib.pyplot as plt
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from matplotlib.backends.backend_pdf import PdfPages
+#Import TC plotting scripts
+import IV
+import PT
+import SD
+import RC
+import NO
+import OCS
+import TC
+import defect_plotting
+import profiler
+from common_functions import * #including ALL_TESTS
+from tc_summary import get_failed_tests
+from page_writer import * #PageWriter, and pypdf (or None)
+from page_cache import record_printout
+
+#What each kind of unit is called in the terminal printout, in PDF page order
+UNIT_NAMES = {"IV"         : "IV plots",
+              "PT"         : "Pedestal Trim plots",
+              "SD"         : "Strobe Delay plots",
+              "3PG"        : "3-Point Gain plots",
+              "10PG"       : "10-Point Gain plots",
+              "NO"         : "Noise Occupancy plots",
+              "OCS"        : "Open Channel Search plots",
+              "histograms" : "Defect Histograms",
+              "TC"         : "Thermal Cycling summary plots"}
+
+def get_local_files(TC_directory):
+    '''
+    Find every local merged file for a module, and sort them for plotting.
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for a
+                   single module.
+
+    Returns:
+    files         - Type = dict. All file names, sorted by test type (as from
+                    fetch_files()).
+    files_by_type - Type = dict. {"IV": [IV file], "PT": [PT files], ..., "OCS": [OCS
+                    files]}, as paths, for get_render_units().
+    TC_file       - Type = string. Path to the ColdJigRun file.
+    '''
+
+    files = fetch_files(TC_directory)
+
+    files_by_type = {"IV"  : [f'{TC_directory}/{files["IV"]}'],
+                     "PT"  : [f'{TC_directory}/{PT_file}' for PT_file in files["PT"]],
+                     "SD"  : [f'{TC_directory}/{SD_file}' for SD_file in files["SD"]],
+                     "3PG" : [f'{TC_directory}/{TPG_file}' for TPG_file in files["TPG"]],
+                     "10PG": [f'{TC_directory}/{RC_file}' for RC_file in files["RC"]],
+                     "NO"  : [f'{TC_directory}/{NO_file}' for NO_file in files["NO"]],
+                     "OCS" : [f'{TC_directory}/{OCS_file}' for OCS_file in files["OCS"]]}
+    TC_file       = f'{TC_directory}/{files["TC"]}'
+
+    return files, files_by_type, TC_file
+
+def get_render_units(files_by_type, test_types, histos):
+    '''
+    Split everything to be plotted into independent units of work, in the order their
+    pages appear in the PDF. Each per-hybrid file is its own unit; the defect
+    histograms and the TC summary plots are one unit each.
+
+    Arguments:
+    files_by_type - Type = dict. {"IV": [IV file], "PT": [PT files], ..., "OCS": [OCS
+                    files]}, where each file is a path or a DB data dictionary.
+    test_types    - Type = list of string. Test types to be plotted.
+    histos        - Type = boolean. Whether or not to make the defect histograms.
+
+    Returns:
+    units - Type = list of tuple. (unit type, file) for each unit, in page order. The
+            file is None for the histograms and TC summary.
+    '''
+
+    units = [] #initialize
+
+    for test_type in ALL_TESTS:
+        if test_type in test_types:
+            units += [(test_type, data_file) for data_file in files_by_type[test_type]]
+
+    if histos:
+        units.append(("histograms", None))
+
+    units.append(("TC", None)) #always made
+
+    return units
+
+def render_unit(unit_type, data_file, settings):
+    '''
+    Make the figures for a single unit of work.
+
+    Arguments:
+    unit_type - Type = string. A key of UNIT_NAMES.
+    data_file - Type = string or dict. The unit's file (None for the histograms and TC
+                summary).
+    settings  - Type = dict. "TC_file", "TC_directory", "files" (as from
+                fetch_files() or db.get_files()), and "noise_only".
+
+    Returns:
+    plots - Type = list of matplotlib figures. The unit's pages, in order.
+    '''
+
+    TC_data = retrieve_data(settings["TC_file"], streaming=True) #parsed once per process
+
+#Keep anything a unit changes in rcParams (like the TC table removing the plot box)
+#from leaking into the next unit made by the same process
+    with matplotlib.rc_context(), profiler.span(unit_type, "unit") as record:
+
+        if record is not None and data_file is not None: #profiling, name it for the hybrid
+            record["name"] = f"{unit_type} {get_component(retrieve_data(data_file))}"
+
+        if unit_type == "IV":
+            plots = IV.make_plots(retrieve_data(data_file), TC_data)
+        elif unit_type == "PT":
+            plots = PT.make_plots(retrieve_data(data_file), TC_data)
+        elif unit_type == "SD":
+            plots = SD.make_plots(retrieve_data(data_file), TC_data)
+        elif unit_type in ["3PG", "10PG"]:
+            plots = RC.make_plots(retrieve_data(data_file), TC_data, settings["noise_only"])
+        elif unit_type == "NO":
+            plots = NO.make_plots(retrieve_data(data_file), TC_data)
+        elif unit_type == "OCS":
+            plots = OCS.make_plots(retrieve_data(data_file), TC_data)
+        elif unit_type == "histograms":
+            plots = make_histograms(settings["files"], settings["TC_directory"], TC_data)
+        elif unit_type == "TC":
+            plots = TC.make_plots(TC_data, get_failed_tests(settings["files"], settings["TC_directory"]))
+
+    if type(plots) is not list: #single figure, or a tuple of figures
+        plots = list(plots) if type(plots) is tuple else [plots]
+
+    return plots
+
+#The units and settings of the parallel run a worker process is part of, given once
+#when it starts (see init_worker()), so each task only has to say which unit to make,
+#rather than sending every file from the database with it
+worker_units    = None
+worker_settings = None
+
+def make_histograms(files, TC_directory, TC_data):
+    '''
+    Make the defect histograms for every hybrid on the module.
+
+    Arguments:
+    files        - Type = dict. All files, sorted by test type.
+    TC_directory - Type = string. The directory the files are in (None for DB files).
+    TC_data      - the contents of a pre-opened ColdJigRun JSON file.
+
+    Returns:
+    plots - Type = list of matplotlib figures. Two per hybrid.
+    '''
+
+    hybrid_files = sort_files_by_hybrid(unsort_files(files), TC_directory)
+    plots = [] #initialize
+
+    for hybrid in hybrid_files:
+        if type(hybrid_files[hybrid][0]) is not dict:
+            files_to_plot = [f"{TC_directory}/{file}" for file in hybrid_files[hybrid]]
+        else:
+            files_to_plot = hybrid_files[hybrid]
+        plots += list(defect_plotting.make_plots(files_to_plot, TC_data))
+
+    return plots
+
+def render_pages(unit_type, data_file, settings):
+    '''
+    Worker process entry point. Make a unit's figures, and, if pypdf is installed,
+    draw them into a PDF of their own, so drawing happens in parallel too. Otherwise,
+    the figures themselves are sent back (pickled) to be drawn by the main process.
+    Anything derived from the unit's data is forgotten once it's done, as a worker
+    keeps the data itself for every unit it makes.
+
+    Arguments:
+    As for render_unit().
+
+    Returns:
+    pages - Type = bytes (a PDF of the unit's pages), or list of matplotlib figures.
+    '''
+
+    try:
+        plots = render_unit(unit_type, data_file, settings)
+
+        if pypdf is None:
+            return plots
+
+        buffer = io.BytesIO()
+        with PdfPages(buffer) as pdf:
+            for plot in plots:
+                save_page(pdf, plot)
+        plt.close('all')
+
+    finally: #the histograms and TC summary use every file
+        forget_derived(settings["files"] if data_file is None else {unit_type: data_file})
+        forget_derived({"TC": settings["TC_file"]})
+
+    pages = buffer.getvalue()
+
+    return pages
+
+def render_pages_profiled(unit_type, data_file, settings):
+    '''
+    Worker process entry point when profiling. As for render_pages(), but the unit is
+    profiled in the worker, and the profile sent back with the pages.
+
+    Arguments:
+    As for render_unit().
+
+    Returns:
+    pages   - As from render_pages().
+    records - Type = list of dict. The worker's profile records.
+    '''
+
+    profiler.start_profiling()
+    try:
+        pages = render_pages(unit_type, data_file, settings)
+    finally:
+        profile = profiler.stop_profiling()
+
+    return pages, profile.records
+
+def render_pages_recorded(worker, unit_type, data_file, settings):
+    '''
+    Worker process entry point with the page cache. As for worker, but everything
+    printed while the unit is made is sent back too, to be kept with its pages.
+
+    Arguments:
+    worker - Type = function. render_pages() or render_pages_profiled().
+    Everything else is as for render_unit().
+
+    Returns:
+    result   - What worker returns.
+    printout - Type = string. Everything printed while the unit was made.
+    '''
+
+    result, printout = record_printout(worker, unit_type, data_file, settings)
+
+    return result, printout
+
+def render_cached_unit(unit_type, data_file, settings, page_cache, key):
+    '''
+    Get a unit's pages from the page cache, or, if they aren't there, make them and
+    add them to it. Pages from the cache have their printout shown again, as if they
+    had just been made.
+
+    Arguments:
+    page_cache - Type = PageCache. Where pages are kept.
+    key        - Type = string. The unit's key, from get_unit_keys().
+    Everything else is as for render_unit().
+
+    Returns:
+    pages - Type = bytes. A PDF of the unit's pages.
+    '''
+
+    pages, printout = page_cache.load(key)
+
+    if pages is None: #not cached, make them
+        pages, printout = record_printout(render_pages, unit_type, data_file, settings)
+        page_cache.store(key, pages, printout)
+
+    else:
+        print(printout, end="")
+
+    return pages
+
+def render_worker_unit(worker, n, recorded=False):
+    '''
+    Worker process entry point. Make one of the units the worker was given when it
+    started (see init_worker()).
+
+    Arguments:
+    worker   - Type = function. render_pages() or render_pages_profiled().
+    n        - Type = int. The unit's place in the units.
+    recorded - Type = boolean. Whether or not to send back everything printed while
+               the unit is made too (see render_pages_recorded()), for the page cache.
+
+    Returns:
+    result - What worker (or render_pages_recorded()) returns.
+    '''
+
+    unit_type, data_file = worker_units[n]
+
+    if recorded:
+        return render_pages_recorded(worker, unit_type, data_file, worker_settings)
+
+    return worker(unit_type, data_file, worker_settings)
+
+def init_worker(caching, units=None, settings=None):
+    '''
+    Set up a worker process the same way as the main one, and give it the units it
+    could be asked to make.
+
+    Arguments:
+    caching  - Type = boolean. Whether or not to write columnar caches.
+    units    - Type = list of tuple. From get_render_units().
+    settings - Type = dict. As for render_unit().
+    '''
+
+    global worker_units, worker_settings
+
+    set_columnar_caching(caching)
+    worker_units, worker_settings = units, settings
+
+def render_in_parallel(units, settings, jobs, caching, writer, page_cache=None, keys=None):
+    '''
+    Render every unit in a pool of worker processes, handing each one to the PDF
+    writer as soon as it's done, and printing each unit type as it finishes. With a
+    page cache, units already in it are written straight away, and only the rest are
+    made (and added to it).
+
+    Arguments:
+    units      - Type = list of tuple. From get_render_units().
+    settings   - Type = dict. As for render_unit().
+    jobs       - Type = int. Number of worker processes.
+    caching    - Type = boolean. Whether or not to write columnar caches.
+    writer     - Type = PageWriter. Where the pages go (joined, if pypdf is installed).
+    page_cache - Type = PageCache. Where pages are kept, or None to make every unit.
+    keys       - Type = list of string. With page_cache, each unit's key, from
+                 get_unit_keys().
+    '''
+
+    unit_types = [unit[0] for unit in units]
+    remaining  = {unit_type: unit_types.count(unit_type) for unit_type in unit_types}
+
+#The TC summary is the only unit with printout of its own, so start it first. Every
+#other unit goes in page order.
+    order = sorted(range(len(units)), key=lambda n: units[n][0] != "TC")
+    done  = [] #initialize, units taken from the page cache
+
+    if page_cache is not None:
+        for n in order:
+            pages, printout = page_cache.load(keys[n])
+            if pages is not None:
+                print(printout, end="")
+                writer.add(n, pages)
+                done.append(n)
+
+        print(f"\nMaking {len(units) - len(done)} of {len(units)} sets of plots with {jobs} processes ({len(done)} from the page cache)...")
+
+    else:
+        print(f"\nMaking {len(units)} sets of plots with {jobs} processes...")
+
+    for n in done:
+        remaining[units[n][0]] -= 1
+    for unit_type in remaining:
+        if remaining[unit_type] == 0:
+            print(f"\n{GREEN}{UNIT_NAMES[unit_type]} complete!{RESET}")
+
+    profile = profiler.active_profile #if profiling, the workers profile themselves too
+    worker  = render_pages if profile is None else render_pages_profiled
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(caching, units, settings)) as pool:
+        futures = {pool.submit(render_worker_unit, worker, n, page_cache is not None): n for n in order if n not in done}
+
+        for future in as_completed(futures):
+            n     = futures.pop(future) #so the pages aren't held on to once written
+            pages = future.result()
+
+            if page_cache is not None:
+                pages, printout = pages
+
+            if profile is not None:
+                pages, records = pages
+                profile.add_records(records)
+
+            if page_cache is not None:
+                page_cache.store(keys[n], pages, printout)
+
+            writer.add(n, pages)
+
+            unit_type = units[n][0]
+            remaining[unit_type] -= 1
+            if remaining[unit_type] == 0:
+                print(f"\n{GREEN}{UNIT_NAMES[unit_type]} complete!{RESET}")
@@ -0,0 +1,96 @@
+#import libraries
+import numpy as np
+import matplotlib
+from matplotlib.collections import PathCollection
+from matplotlib.markers import MarkerStyle
+from matplotlib.transforms import IdentityTransform
+
+class ScanCollection(PathCollection):
+    '''
+    A scatter of every scan in an all-scans plot, as a single artist. The points of
+    all the scans are stacked into one array, with each scan's points next to each
+    other, and drawn one scan (so one colour) at a time. That way, there is only one
+    artist to lay out and autoscale, but backends still use their fast single-colour
+    marker drawing, and the result looks exactly like one scatter per scan.
+
+    Arguments:
+    counts  - Type = list of int. The number of points in each scan, in order.
+    colours - Type = list of tuple. The colour of each scan, in order.
+    Everything else is passed on to PathCollection.
+    '''
+
+    def __init__(self, counts, colours, *args, **kwargs):
+
+        super().__init__(*args, **kwargs)
+        self.counts  = counts
+        self.colours = colours
+
+    def draw(self, renderer):
+
+        offsets = self.get_offsets() #every scan's points
+        start   = 0
+
+        for count, colour in zip(self.counts, self.colours):
+            if count > 0:
+                self.set_offsets(offsets[start:start + count]) #just this scan
+                self.set_facecolor(colour)
+                super().draw(renderer)
+            start += count
+
+        self.set_offsets(offsets) #put everything back
+        self.stale = False
+
+def scatter_scans(ax, series, good_size, bad_size):
+    '''
+    Plot every scan of an all-scans plot at once: one ScanCollection for the good
+    points of every scan, and one (with triangle markers) for the defective points,
+    instead of two scatters per scan. Nothing plotted here is labelled; instead, a
+    legend proxy is made for each label, looking just like the per-scan scatter would
+    have.
+
+    Arguments:
+    ax        - Type = matplotlib axes. The axes to plot on.
+    series    - Type = list of tuple. For each scan, in plotting order: (good x, good
+                y, bad x, bad y, colour, label, defect label). Either label may be None.
+    good_size - Type = float. Marker size for the good points.
+    bad_size  - Type = float. Marker size for the defective points.
+
+    Returns:
+    proxies - Type = list of matplotlib PathCollection. Legend handles for every
+              label, in plotting order (pass to legend() after any other labelled
+              artists).
+    '''
+
+    proxies = [] #initialize
+
+    if series == []:
+        return proxies
+
+    colours = [scan[4] for scan in series]
+
+#Stack each marker group's points from every scan, leaving out missing values (as
+#scatter does)
+    for x_index, y_index, marker, size in [(0, 1, "o", good_size), (2, 3, "^", bad_size)]:
+        points = [] #initialize
+        for scan in series:
+            scan_points = np.column_stack([np.ravel(scan[x_index]), np.ravel(scan[y_index])]).astype(float)
+            points.append(scan_points[np.isfinite(scan_points).all(axis=1)])
+
+        marker_style = MarkerStyle(marker)
+        path         = marker_style.get_path().transformed(marker_style.get_transform())
+        collection   = ScanCollection([len(scan_points) for scan_points in points], colours, (path,), sizes=[size], offsets=np.concatenate(points), offset_transform=ax.transData, facecolors=colours[0], edgecolors='face', linewidths=[matplotlib.rcParams['patch.linewidth']]) #as scatter draws filled markers
+        collection.set_transform(IdentityTransform()) #marker sizes are in points
+        ax.add_collection(collection)
+
+    ax.autoscale_view()
+
+#Make a stand-in for each labelled scatter, then take it off the axes so it's only
+#used by the legend
+    for scan in series:
+        for label, marker, size in [(scan[5], "o", good_size), (scan[6], "^", bad_size)]:
+            if label is not None:
+                proxy = ax.scatter([], [], s=size, marker=marker, color=scan[4], label=label)
+                proxy.remove()
+                proxies.append(proxy)
+
+    return proxies
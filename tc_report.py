@@ -0,0 +1,299 @@
+#import libraries
+import os
+import matplotlib.pyplot as plt
+from common_functions import *
+import profiler
+from render_units import * #ALL_TESTS, UNIT_NAMES, the unit functions, and PageWriter
+from page_cache import get_unit_keys
+
+class TCReport:
+    '''
+    The whole TC plotting pipeline for a single module, for use from Python (ie. a
+    notebook, or another script) as well as by make_TC_plots.py. Each stage is run the
+    first time it's needed and remembered after that, so asking for the analysis and
+    then the PDF only loads the files once:
+
+    discover() - find the module's files.
+    load()     - read them.
+    analyze()  - work out the scans, failed tests, and defects in each file.
+    render()   - make every figure.
+    assemble() - write the PDF.
+
+        report = TCReport("path/to/module")
+        print(report.analyze()["failed_tests"])
+        report.assemble()
+
+    Data that's already been loaded (or fetched from the database) can be given instead
+    of a directory, sorted by type like db.get_files() returns it: {"IV": IV data,
+    "PT": [PT data], "SD": [...], "3PG": [...], "10PG": [...], "NO": [...], "OCS":
+    [...], "HVS": HVS data, "TC": ColdJigRun data}. Whatever is worked out from that
+    data (defect masks and such) is kept until close() is called, so call it (or use
+    the report in a with block) when done with the report:
+
+        with TCReport.from_database(options) as report:
+            report.assemble()
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for a
+                   single module. None if files is given.
+    files        - Type = dict. The module's data, sorted by type, as above.
+    test_types   - Type = list of string. Test types to be plotted.
+    noise_only   - Type = boolean. Whether or not to only plot the noise for 3PG/10PG.
+    histos       - Type = boolean. Whether or not to make the defect histograms.
+    '''
+
+    def __init__(self, TC_directory=None, files=None, test_types=ALL_TESTS, noise_only=False, histos=False):
+
+        if (TC_directory is None) == (files is None):
+            raise ValueError("Give either a directory or the files themselves, not both.")
+
+        self.TC_directory = TC_directory
+        self.given_files  = files
+        self.test_types   = test_types
+        self.noise_only   = noise_only
+        self.histos       = histos
+        self.stages       = {} #initialize, {stage: result}, filled in as they're run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        '''
+        Forget everything worked out from the data given to the report, so it can be
+        freed once the report is. (Local files are forgotten when they change, or with
+        clear_document_registry().) The report can still be used afterwards; anything
+        needed is worked out again.
+        '''
+
+        if self.given_files is not None:
+            forget_derived(self.given_files)
+
+    @classmethod
+    def from_database(cls, options=None, **kwargs):
+        '''
+        Make a report from the database, instead of local files.
+
+        Arguments:
+        options - Type = dict. From db.load_db_options(). Anything not given there is
+                  asked for.
+        Everything else is as for TCReport().
+
+        Returns:
+        report - Type = TCReport.
+        '''
+
+        import ITkPDB_matters as db #only needed here
+
+        with profiler.span("database fetch", "stage"):
+            files = db.get_files_by_type(options)
+
+        report = cls(files=files, **kwargs)
+
+        return report
+
+    @profiler.profiled("stage")
+    def discover(self):
+        '''
+        Find the module's files.
+
+        Returns:
+        files         - Type = dict. All files, sorted by test type.
+        files_by_type - Type = dict. {"IV": [IV file], "PT": [PT files], ..., "OCS":
+                        [OCS files]}, for get_render_units().
+        TC_file       - Type = string or dict. The ColdJigRun file (or its data).
+        '''
+
+        if "discover" not in self.stages:
+
+            if self.given_files is None:
+                self.stages["discover"] = get_local_files(self.TC_directory)
+
+            else:
+                files         = self.given_files
+                files_by_type = {test_type: files[test_type] if type(files[test_type]) is list else [files[test_type]] for test_type in ALL_TESTS}
+                self.stages["discover"] = (files, files_by_type, files["TC"])
+
+        return self.stages["discover"]
+
+    @profiler.profiled("stage")
+    def load(self):
+        '''
+        Read every file.
+
+        Returns:
+        data - Type = dict. {"TC": ColdJigRun data, "IV": [IV data], "PT": [PT data],
+               ..., "OCS": [OCS data]}.
+        '''
+
+        if "load" not in self.stages:
+            files, files_by_type, TC_file = self.discover()
+
+            data = {"TC": retrieve_data(TC_file, streaming=True)}
+            for test_type in files_by_type:
+                data[test_type] = [retrieve_data(data_file) for data_file in files_by_type[test_type]]
+
+            self.stages["load"] = data
+
+        return self.stages["load"]
+
+    @profiler.profiled("stage")
+    def analyze(self):
+        '''
+        Work out the scans, failed tests, and defects in each file, without plotting
+        anything.
+
+        Returns:
+        analysis - Type = dict. "component", "date", and "run_number" (from the
+                   ColdJigRun file); "failed_tests" (the failed tests from every file,
+                   as used by the TC summary); and "tests", with an entry for each file:
+                   {"test_type", "component", "warm_scans", "cold_scans",
+                   "failed_tests", "defects"}, where "defects" is the number of defects
+                   by name, for each stream.
+        '''
+
+        if "analyze" not in self.stages:
+            files, files_by_type, TC_file = self.discover()
+            data     = self.load()
+            TC_data  = data["TC"]
+            timeline = get_timeline(TC_data)
+
+            tests = [] #initialize
+            for test_type in ALL_TESTS:
+                for test_data in data[test_type]:
+                    warm_scans, cold_scans = timeline.sort_scans(get_scans(test_data))
+                    tests.append({"test_type"    : test_type,
+                                  "component"    : get_component(test_data),
+                                  "warm_scans"   : warm_scans,
+                                  "cold_scans"   : cold_scans,
+                                  "failed_tests" : fetch_failed_tests(test_data),
+                                  "defects"      : {stream: get_defect_index(test_data).count_by_name(stream) for stream in STREAMS}})
+
+            self.stages["analyze"] = {"component"    : get_component(TC_data),
+                                      "date"         : TC_data["date"][:10],
+                                      "run_number"   : TC_data["runNumber"],
+                                      "failed_tests" : get_failed_tests(files, self.TC_directory),
+                                      "tests"        : tests}
+
+        return self.stages["analyze"]
+
+    def get_units(self):
+        '''
+        Split everything to be plotted into independent units of work.
+
+        Returns:
+        units    - Type = list of tuple. From get_render_units(), in page order.
+        settings - Type = dict. What every unit needs to know (see render_unit()).
+        '''
+
+        files, files_by_type, TC_file = self.discover()
+
+        units    = get_render_units(files_by_type, self.test_types, self.histos)
+        settings = {"TC_file"      : TC_file,
+                    "TC_directory" : self.TC_directory,
+                    "files"        : files,
+                    "noise_only"   : self.noise_only}
+
+        return units, settings
+
+    @profiler.profiled("stage")
+    def render(self):
+        '''
+        Make every figure, and keep them. (To write a PDF without keeping every figure
+        in memory, call assemble() without calling this first.)
+
+        Returns:
+        plots - Type = list of list of matplotlib figures. Each unit's pages, in page
+                order.
+        '''
+
+        if "render" not in self.stages:
+            units, settings = self.get_units()
+            self.load() #so files are only read once
+
+            self.stages["render"] = [render_unit(unit_type, data_file, settings) for unit_type, data_file in units]
+
+        return self.stages["render"]
+
+    def get_pdf_name(self):
+        '''
+        Get the name of the module's PDF.
+
+        Returns:
+        pdf_name - Type = string. The name of the PDF.
+        '''
+
+        TC_data  = self.load()["TC"]
+        pdf_name = get_pdf_name(get_component(TC_data), TC_data["date"][:10], TC_data["runNumber"])
+
+        return pdf_name
+
+    @profiler.profiled("stage")
+    def assemble(self, output_dir=".", jobs=1, caching=False, page_cache=None):
+        '''
+        Write the PDF. If render() has already been called, its figures are used;
+        otherwise each unit is made and written straight away (in parallel, with jobs),
+        so only one unit's figures are held at a time. With a page cache, only the
+        units whose inputs have changed since they were cached are made, and the PDF
+        is stitched together from their pages and the cached ones.
+
+        Arguments:
+        output_dir - Type = string. The directory to write the PDF in.
+        jobs       - Type = int. Number of processes to make plots with.
+        caching    - Type = boolean. Whether or not worker processes write columnar
+                     caches.
+        page_cache - Type = PageCache. Where each unit's pages are kept (needs pypdf).
+                     None to make every unit.
+
+        Returns:
+        pdf_name - Type = string. The path of the PDF.
+        '''
+
+        if "assemble" in self.stages and self.stages["assemble"] == os.path.join(output_dir, self.get_pdf_name()):
+            return self.stages["assemble"]
+
+        units, settings = self.get_units()
+        pdf_name        = os.path.join(output_dir, self.get_pdf_name())
+        rendered        = self.stages.get("render")
+        keys            = None
+
+        if page_cache is not None and rendered is None:
+            if pypdf is None:
+                print(f"{YELLOW}pypdf is not installed, so pages can't be cached. Making every page.{RESET}")
+                page_cache = None
+            else:
+                keys = get_unit_keys(units, settings, page_cache)
+
+        #Write each unit's pages into the PDF as soon as they're made
+        with PageWriter(pdf_name, joined=(rendered is None and (jobs > 1 or keys is not None) and pypdf is not None)) as writer:
+
+            if rendered is not None: #already made
+                for n, plots in enumerate(rendered):
+                    writer.add(n, plots) #figures are closed, but can be drawn again
+
+            elif jobs > 1: #make the units in parallel, in worker processes
+                render_in_parallel(units, settings, jobs, caching, writer, page_cache, keys)
+
+            else: #make them one after another
+                unit_types = [unit[0] for unit in units]
+
+                for n, (unit_type, data_file) in enumerate(units):
+                    if n == unit_types.index(unit_type): #first unit of this type
+                        print(f"\nMaking {UNIT_NAMES[unit_type]}...")
+
+                    if keys is None:
+                        writer.add(n, render_unit(unit_type, data_file, settings))
+                    else: #as pages, from the page cache if they're there
+                        writer.add(n, render_cached_unit(unit_type, data_file, settings, page_cache, keys[n]))
+
+                    if n == len(unit_types) - 1 - unit_types[::-1].index(unit_type): #last one
+                        print(f"\n{GREEN}{UNIT_NAMES[unit_type]} complete!{RESET}")
+
+            print("\nMaking PDF...") #finish off the PDF
+
+        plt.close('all')
+        self.stages["assemble"] = pdf_name
+
+        return pdf_name
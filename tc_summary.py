@@ -0,0 +1,361 @@
+#import libraries
+from common_functions import *
+from coldjig_timeline import section_is_valid
+
+#Test types in the results summary, what each is called there, and what identifies
+#its tests. Both Response Curves (3PG and 10PG) are counted together.
+SUMMARY_TYPES = {"IV"  : ("IVs", "MODULE_IV_AMAC"),
+                 "PT"  : ("Pedestal Trims", "PEDESTAL_TRIM"),
+                 "SD"  : ("Strobe Delays", "STROBE_DELAY"),
+                 "RC"  : ("Response Curves", "RESPONSE_CURVE"),
+                 "NO"  : ("Noise Occupancy tests", "_NO"),
+                 "OCS" : ("Open Channel Searches", "OPEN_CHANNEL_SEARCH"),
+                 "HVS" : ("HV Stability tests", "HVSTABILITY")}
+
+def get_environmental_overview(TC_data):
+    '''
+    Get the environmental summary of a TC run: maximum and minimum chuck temperatures
+    and humidity, the number of cold, warm, and cold shunted tests performed, the
+    duration of the cycling, and the ColdJig and ITSDAQ run numbers.
+
+    Arguments:
+    TC_data - the contents of a pre-opened ColdJigRun JSON file.
+
+    Returns:
+    overview - Type = dict. "max_temperature", "min_temperature", "max_humidity",
+               "min_humidity", "duration_hours" (as floats), "cold_tests",
+               "warm_tests", "cold_shunted_tests", "coldjig_runNumbers", and
+               "itsdaq_runNumbers".
+    '''
+
+    TC_summary = TC_data["results"]["summary"] #Where this info is stored
+
+    overview = {"max_temperature"    : float(TC_summary["max_temperature"]), #max chuck temperature
+                "min_temperature"    : float(TC_summary["min_temperature"]), #min chuck temperature
+                "max_humidity"       : float(TC_summary["max_humidity"]), #max chuck humidity
+                "min_humidity"       : float(TC_summary["min_humidity"]), #min chuck humidity
+                "cold_tests"         : TC_summary["cold_tests"], #number of cold tests
+                "warm_tests"         : TC_summary["warm_tests"], #number of warm tests
+                "cold_shunted_tests" : TC_summary["cold_shunted_tests"], #number of cold shunted
+                "duration_hours"     : float(TC_summary["duration_hours"]), #TC duration
+                "coldjig_runNumbers" : TC_summary["coldjig_runNumbers"], #ColdJig run numbers
+                "itsdaq_runNumbers"  : TC_summary["itsdaq_runNumbers"]} #ITSDAQ run numbers
+
+    return overview
+
+def environmental_summary(TC_data):
+    '''
+    Prints out enviromental summary data to the terminal, including information on
+    maximum and minimum chuck temperatures and humidity, the number of cold, warm, and
+    cold shunted tests performed, the duration of the cycling, and the ColdJig and
+    ITSDAQ run numbers.
+
+    Arguments:
+    TC_data - the contents of a pre-opened ColdJigRun JSON file.
+    '''
+
+    print_environmental_overview(get_environmental_overview(TC_data))
+
+def print_environmental_overview(overview):
+    '''
+    Print an environmental summary to the terminal.
+
+    Arguments:
+    overview - Type = dict. From get_environmental_overview().
+    '''
+
+    text = f"{BLUE}The maximum chuck temperature was {overview['max_temperature']:.3}C.\nThe minimum chuck temperature was {overview['min_temperature']:.3}C.\nThe maximum humidity was {overview['max_humidity']:.3}%.\nThe minimum humidty was {overview['min_humidity']:.3}%.\nThere were {overview['cold_tests']} cold tests, {overview['cold_shunted_tests']} of them shunted.\nThere were {overview['warm_tests']} warm tests.\nTC took {overview['duration_hours']} hours, with ColdJig run number(s) {overview['coldjig_runNumbers']}, and ITSDAQ run number(s) {overview['itsdaq_runNumbers']}.{RESET}" #text to print
+
+    print(f"\nTC Overview:\n{text}\n") #print to terminal
+
+def get_results_overview(TC_data, failed_tests):
+    '''
+    Sort every test taken during TC by temperature and test type, and find which of
+    them failed.
+
+    Arguments:
+    TC_data      - the contents of a pre-opened ColdJigRun JSON file.
+    failed_tests - Type = list of string. List of all failed tests from cycling.
+
+    Returns:
+    overview - Type = dict. {test type (a key of SUMMARY_TYPES): {"warm": {"tests":
+               [tests], "failed": [failed tests]}, "cold": {...}}}.
+    '''
+
+    test_sections                = TC_data["properties"]["ColdJig_History"]
+    warm_sections, cold_sections = sort_sect_temp(TC_data) #sort by temp
+    #relevant sections
+    valid_sections = [section for section in test_sections if test_is_valid(section)]
+    warm_tests = [] #initialize
+    cold_tests = []
+
+#Get a list of tests from each test section. Append tests to either warm_tests or
+#cold_tests, as appropriate
+    for section in valid_sections:
+        try:
+            tests = TC_data["properties"]["ColdJig_History"][section]["itsdaq_test_info"]["all_tests"] #get tests for section, if they exist
+        except:
+            tests = []
+            print(f"{YELLOW}Tests for {section} could not be found! Discarding.{RESET}")
+
+        if section in warm_sections:
+            warm_tests += tests
+        elif section in cold_sections:
+            cold_tests += tests
+        else:
+            print(f"{YELLOW}Testing section {section} could not be labelled warm or cold!{RESET}")
+
+    overview = {test_type: {"warm": {"tests": [], "failed": []}, "cold": {"tests": [], "failed": []}} for test_type in SUMMARY_TYPES} #initialize
+
+#Sort tests by test type, and pick out the failed ones
+    for temperature, tests in [("warm", warm_tests), ("cold", cold_tests)]:
+        for test in tests:
+            test_type = get_summary_type(test)
+
+            if test_type is None or (temperature == "cold" and test_type in ["OCS", "HVS"]): #only run warm
+                print(f"{YELLOW}Could not identify test type for {test}!{RESET}")
+                continue
+
+            overview[test_type][temperature]["tests"].append(test)
+            if test in failed_tests:
+                overview[test_type][temperature]["failed"].append(test)
+
+    return overview
+
+def get_summary_type(test):
+    '''
+    Get the type of a test, as counted in the results summary.
+
+    Arguments:
+    test - Type = string. The test name (ie. 1234-5_PEDESTAL_TRIM_PPA).
+
+    Returns:
+    test_type - Type = string. A key of SUMMARY_TYPES, or None if it isn't recognized.
+    '''
+
+    for test_type in SUMMARY_TYPES:
+        if SUMMARY_TYPES[test_type][1] in test:
+            return test_type
+
+    return None
+
+def get_failure_rate(results):
+    '''
+    Get the percentage of tests that failed.
+
+    Arguments:
+    results - Type = dict. {"tests": [tests], "failed": [failed tests]}, as in
+              get_results_overview().
+
+    Returns:
+    failure_rate - Type = float. The percentage failed, or None if there were no tests.
+    '''
+
+    if results["tests"] == []:
+        return None
+
+    failure_rate = len(results["failed"]) / len(results["tests"]) * 100
+
+    return failure_rate
+
+def format_failure_rate(results):
+    '''
+    Describe how many tests failed, for the results summary.
+
+    Arguments:
+    results - Type = dict. As for get_failure_rate().
+
+    Returns:
+    text - Type = string. ie. "2 failed (20.0%)".
+    '''
+
+    failure_rate = get_failure_rate(results)
+    text         = f"{len(results['failed'])} failed ({'no tests' if failure_rate is None else f'{failure_rate:.3}%'})"
+
+    return text
+
+def results_summary(TC_data, failed_tests):
+    '''
+    Prints out the rate of failure to the terminal (failed tests / total tests * 100%)
+    for each test type, and a list of all failed tests.
+
+    Arguments:
+    TC_data      - the contents of a pre-opened ColdJigRun JSON file.
+    failed_tests - Type = list of string. List of all failed tests from cycling.
+    '''
+
+    print_results_overview(get_results_overview(TC_data, failed_tests), failed_tests)
+
+def print_results_overview(overview, failed_tests):
+    '''
+    Print the rate of failure for each test type, and a list of all failed tests, to
+    the terminal.
+
+    Arguments:
+    overview     - Type = dict. From get_results_overview().
+    failed_tests - Type = list of string. List of all failed tests from cycling.
+    '''
+
+    total_text = "" #initialize
+
+    for test_type in ["IV", "PT", "SD", "RC", "NO"]:
+        name      = SUMMARY_TYPES[test_type][0]
+        warm_name = f"{name} (10PG and 3PG)" if test_type == "RC" else name
+        warm, cold = overview[test_type]["warm"], overview[test_type]["cold"]
+
+        total_text += f"{printout_color(warm['failed'])}Out of {len(warm['tests'])} warm {warm_name}, {format_failure_rate(warm)}.\n{printout_color(cold['failed'])}Out of {len(cold['tests'])} cold {name}, {format_failure_rate(cold)}.{RESET}\n"
+
+    OCSs = overview["OCS"]["warm"]
+    total_text += f"{printout_color(OCSs['failed'])}Out of {len(OCSs['tests'])} Open Channel Searches (all warm), {format_failure_rate(OCSs)}.{RESET}"
+
+    print(f"\nResults Summary:\n{total_text}\n") #print to terminal
+#Print out every failed test during TC
+    if failed_tests != []:
+        print(f"\n{RED}Failed Tests:{RESET}\n\n")
+        for test in failed_tests:
+            print(f"{RED}{test}{RESET}\n")
+    else:
+        print(f"{GREEN}All tests passed!{RESET}")
+
+def sort_sect_temp(TC_data):
+    '''
+    Take the testing sections from TC, sort them by temperature, and filter out the
+    irrelevant sections.
+
+    Arguments:
+    TC_data - the contents of a pre-opened ColdJigRun JSON file.
+
+    Returns:
+    valid_warm_sections - Type = list of string. All relevent warm testing sections.
+    valid_cold_sections - Type = list of string. All relevent cold testing sections.
+    '''
+
+    timeline = get_timeline(TC_data) #every section, flagged warm/cold and valid or not
+
+    for section in timeline.sections:
+        if timeline.is_cold(section) is None:
+            print(f"{YELLOW}Test {section} could not be flagged as warm or cold!{RESET}")
+        test_is_valid(section) #warn about unrecognized sections
+
+    valid_warm_sections, valid_cold_sections = timeline.sort_sections()
+
+    return valid_warm_sections, valid_cold_sections
+
+def test_is_valid(section):
+    '''
+    For the purposes of this script, we only care about sections associated with
+    tests.Sections associated with temperature changes, initialization, or turning on
+    the module do not correspond to any tests, and are therefore "not valid" in the
+    context of this script. Uses the same rules as the ColdJigTimeline.
+
+    Arguments:
+    section - Type = string. Name of a single testing section, as it appears in the
+              ColdJigRun JSON file (such as 41_TC_WARm_TEST_4).
+
+    Returns:
+    Type = boolean. Whether or not the section is valid.
+    '''
+
+    valid = section_is_valid(section) #None if the section is not recognized
+
+    if valid is None:
+        print(f"{YELLOW}Unrecognized test section: {section}. Discarding.{RESET}")
+        return False #section is not recognized
+
+    return valid
+
+def printout_color(failed_test_list):
+    '''
+    Determine the colour of the terminal printout for the line in results summary
+    pertaining to the given failed_test_list.
+
+    Arguments:
+    failed_test_list - Type = list of string. A list of failed test names.
+
+    Returns:
+    print_color - Type = string. Either RED (if some tests fail), or GREEN (if all
+                  tests pass). These correspond to global variables assosciated with
+                  colour terminal printout, declared in common_functions.py.
+    '''
+
+    if len(failed_test_list) > 0: #if some tests fail
+        print_color = RED
+    else: #if all tests pass
+        print_color = GREEN
+
+    return print_color
+
+def get_failed_tests(files, TC_directory):
+    '''
+    Get the failed tests from every file (except the HV Stability), for the TC
+    summary.
+
+    Arguments:
+    files        - Type = dict. All files, sorted by test type.
+    TC_directory - Type = string. The directory the files are in (None for DB files,
+                   or data already loaded).
+
+    Returns:
+    failed_tests - Type = list of list of string. The failed tests from each file.
+    '''
+
+    failed_tests = [] #initialize
+
+    for file in unsort_files({file_type: files[file_type] for file_type in files if file_type != "HVS"}):
+
+        if type(file) is not dict: #if using local files
+            failed_tests.append(fetch_failed_tests(f'{TC_directory}/{file}'))
+
+        else: #if querying DB
+            failed_tests.append(fetch_failed_tests(file))
+
+    return failed_tests
+
+def make_summary(files, TC_directory=None, printout=True):
+    '''
+    Make the TC overview, results summary, and list of failed tests for a module,
+    without making any plots.
+
+    Arguments:
+    files        - Type = dict. All files, sorted by test type (as from fetch_files(),
+                   or the database).
+    TC_directory - Type = string. The directory the files are in (None for DB files).
+    printout     - Type = boolean. Whether or not to print the overview and results
+                   summary to the terminal, as when plotting.
+
+    Returns:
+    summary - Type = dict. "component", "date", and "run_number" (from the ColdJigRun
+              file); "environment" (from get_environmental_overview()); "results",
+              {test type: {"warm": {"tests", "failed", "failure_rate"}, "cold":
+              {...}}}, with the number of tests, the failed tests, and the
+              percentage failed (None if there were no tests); and "failed_tests".
+    '''
+
+    TC_file      = files["TC"] if TC_directory is None else f'{TC_directory}/{files["TC"]}'
+    TC_data      = retrieve_data(TC_file, streaming=True)
+    failed_tests = make_one_list(get_failed_tests(files, TC_directory))
+    environment  = get_environmental_overview(TC_data)
+
+    if printout:
+        print_environmental_overview(environment)
+
+    overview = get_results_overview(TC_data, failed_tests)
+
+    if printout:
+        print_results_overview(overview, failed_tests)
+
+    results = {} #initialize
+    for test_type in overview:
+        results[test_type] = {temperature: {"tests"        : len(overview[test_type][temperature]["tests"]),
+                                            "failed"       : overview[test_type][temperature]["failed"],
+                                            "failure_rate" : get_failure_rate(overview[test_type][temperature])}
+                              for temperature in ["warm", "cold"]}
+
+    summary = {"component"    : get_component(TC_data),
+               "date"         : TC_data["date"][:10],
+               "run_number"   : TC_data["runNumber"],
+               "environment"  : environment,
+               "results"      : results,
+               "failed_tests" : failed_tests}
+
+    return summary
@@ -0,0 +1,214 @@
+#import libraries
+import os
+import time
+import matplotlib.pyplot as plt
+from common_functions import *
+from render_units import * #render_pages, PageWriter, and pypdf (or None)
+
+try: #inotify_simple is optional; without it, the directory is polled instead
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+#How often to look at the directory when polling, in seconds
+WATCH_INTERVAL = 2.0
+#How long the directory has to be left alone before re-plotting, in seconds, so a
+#file which is still being written (or several files being copied in) only triggers
+#one update
+SETTLE_TIME = 1.0
+
+def get_file_state(TC_directory):
+    '''
+    Get the modification time of every merged file in a directory.
+
+    Arguments:
+    TC_directory - Type = string. The module directory.
+
+    Returns:
+    state - Type = dict. {absolute path: modification time (ns)}.
+    '''
+
+    state = {} #initialize
+
+    for file in os.listdir(TC_directory):
+        path = os.path.abspath(f"{TC_directory}/{file}")
+        if file.endswith(".json") and ("TC" in file or "ColdJigRun" in file or "HVSTABILITY" in file):
+            try:
+                state[path] = os.stat(path).st_mtime_ns
+            except OSError: #removed in the meantime
+                continue
+
+    return state
+
+def get_changes(old_state, new_state):
+    '''
+    Compare two file states.
+
+    Arguments:
+    old_state, new_state - Type = dict. From get_file_state().
+
+    Returns:
+    changed - Type = set of string, or None. The paths of the files which were
+              modified, or None if files were added or removed (so the plots
+              themselves change).
+    '''
+
+    if set(old_state) != set(new_state):
+        return None
+
+    changed = {path for path in new_state if new_state[path] != old_state[path]}
+
+    return changed
+
+def wait_for_changes(TC_directory, state, interval=WATCH_INTERVAL):
+    '''
+    Wait until any merged file in a directory is modified, added, or removed, then
+    until the directory has settled. Uses inotify (if inotify_simple is installed) to
+    be woken up as soon as something happens, and polls every interval otherwise.
+
+    Arguments:
+    TC_directory - Type = string. The module directory.
+    state        - Type = dict. From get_file_state(), before waiting.
+    interval     - Type = float. How often to poll, in seconds.
+
+    Returns:
+    new_state - Type = dict. The state once it has settled.
+    changed   - Type = set of string, or None. As from get_changes().
+    '''
+
+    inotify = None
+    if inotify_simple is not None:
+        inotify = inotify_simple.INotify()
+        watch_flags = inotify_simple.flags.CLOSE_WRITE | inotify_simple.flags.MOVED_TO | inotify_simple.flags.MOVED_FROM | inotify_simple.flags.CREATE | inotify_simple.flags.DELETE
+        inotify.add_watch(TC_directory, watch_flags)
+
+    try:
+        new_state = state
+        changed   = set()
+
+        while changed == set():
+
+            if inotify is not None:
+                inotify.read(timeout=int(interval * 1000)) #wakes up as soon as anything happens
+            else:
+                time.sleep(interval)
+
+            new_state = get_file_state(TC_directory)
+
+            if get_changes(state, new_state) == set():
+                continue #nothing relevant (ie. a cache, or the PDF)
+
+            #Wait for the directory to settle
+            settled_state = None
+            while settled_state != new_state:
+                settled_state = new_state
+                time.sleep(SETTLE_TIME)
+                new_state = get_file_state(TC_directory)
+
+            changed = get_changes(state, new_state)
+
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+    return new_state, changed
+
+def get_affected_units(units, changed, TC_file):
+    '''
+    Work out which units have to be made again after files change. A per-hybrid
+    unit only depends on its own file (and the ColdJigRun file), but the histograms and
+    TC summary depend on every file.
+
+    Arguments:
+    units   - Type = list of tuple. From get_render_units().
+    changed - Type = set of string, or None. From wait_for_changes().
+    TC_file - Type = string. Path to the ColdJigRun file.
+
+    Returns:
+    affected - Type = set of tuple. The units to make again, or None for all of them.
+    '''
+
+    if changed is None or os.path.abspath(TC_file) in changed:
+        return None #everything
+
+    affected = {unit for unit in units if unit[1] is None or os.path.abspath(unit[1]) in changed}
+
+    return affected
+
+def write_pdf(pdf_name, units, pages_by_unit):
+    '''
+    Write the PDF from every unit's pages. PageWriter writes to a temporary file which
+    is then moved over the old PDF, so a viewer never sees a half-written one.
+
+    Arguments:
+    pdf_name      - Type = string. The name of the PDF.
+    units         - Type = list of tuple. From get_render_units(), in page order.
+    pages_by_unit - Type = dict. {unit: pages, from render_pages()}.
+    '''
+
+    with PageWriter(pdf_name, joined=(pypdf is not None)) as writer:
+        for n, unit in enumerate(units):
+            writer.add(n, pages_by_unit[unit]) #figures are closed, but can be drawn again
+
+def watch_module(TC_directory, test_types, noise_only=False, histos=False, caching=False, interval=WATCH_INTERVAL):
+    '''
+    Make the TC plots for a single module from local files, then keep watching the
+    directory, and whenever a file changes, make only the plots that depend on it
+    again and update the PDF. Runs until interrupted (ie. Ctrl+C).
+
+    Arguments:
+    TC_directory - Type = string. Directory containing all merged TC results for a
+                   single module.
+    test_types   - Type = list of string. Test types to be plotted.
+    noise_only   - Type = boolean. Whether or not to only plot the noise for 3PG/10PG.
+    histos       - Type = boolean. Whether or not to make the defect histograms.
+    caching      - Type = boolean. Whether or not to write columnar caches.
+    interval     - Type = float. How often to poll, in seconds, without inotify.
+    '''
+
+    set_columnar_caching(caching)
+
+    state         = get_file_state(TC_directory)
+    pages_by_unit = {} #initialize, {unit: pages}, kept so unchanged plots aren't remade
+    affected      = None #everything, to start with
+
+    try:
+        while True:
+            try:
+                files, files_by_type, TC_file = get_local_files(TC_directory)
+                settings = {"TC_file"      : TC_file,
+                            "TC_directory" : TC_directory,
+                            "files"        : files,
+                            "noise_only"   : noise_only}
+                units    = get_render_units(files_by_type, test_types, histos)
+                TC_data  = retrieve_data(TC_file, streaming=True)
+                pdf_name = get_pdf_name(get_component(TC_data), TC_data["date"][:10], TC_data["runNumber"])
+
+                to_make = [unit for unit in units if affected is None or unit in affected or unit not in pages_by_unit]
+                print(f"\nMaking {len(to_make)} of {len(units)} sets of plots...")
+
+                start = time.perf_counter()
+                for unit in to_make:
+                    print(f"\nMaking {UNIT_NAMES[unit[0]]}{'' if unit[1] is None else ' for ' + os.path.basename(unit[1])}...")
+                    pages_by_unit[unit] = render_pages(*unit, settings)
+
+                pages_by_unit = {unit: pages_by_unit[unit] for unit in units} #forget removed files
+                write_pdf(pdf_name, units, pages_by_unit)
+
+                print(f"\n{GREEN}{pdf_name} updated in {time.perf_counter() - start:.1f} s.{RESET}")
+
+            except Exception as error: #ie. a file caught half-written, try again next time
+                print(f"{RED}\nCould not update the plots ({type(error).__name__}: {error}).{RESET}")
+                pages_by_unit = {} #start from scratch next time
+                TC_file       = None
+
+            finally:
+                plt.close('all')
+
+            print(f"{BLUE}\nWatching {TC_directory} for changes{'' if inotify_simple is not None else ' (polling)'}. Press Ctrl+C to stop.{RESET}")
+
+            state, changed = wait_for_changes(TC_directory, state, interval)
+            affected = None if TC_file is None else get_affected_units(units, changed, TC_file)
+
+    except KeyboardInterrupt:
+        print(f"\n{GREEN}Stopped watching.{RESET}")